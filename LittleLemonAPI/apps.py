@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class LittlelemonapiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'LittleLemonAPI'
+
+    def ready(self):
+        from . import roles, menu_cache, authentication  # noqa: F401 registers the cache invalidation signals
+        from . import profiling
+        if profiling.profiling_enabled():
+            profiling.install()
@@ -0,0 +1,96 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import DateTimeField, Value
+from django.utils import timezone
+
+from .models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem
+
+# Hot/cold split of the orders.
+# Delivered orders older than ARCHIVE_AFTER_DAYS are moved from Order/OrderItem to ArchivedOrder/ArchivedOrderItem,
+# keeping their ids, so the order lists and the indexes of the hot tables only carry the orders still in progress
+# and the recent ones. The API reads the archive when asked for history (?history=true on the order list, order
+# details by id, the export).
+# The sales rollups are not touched: an archived order is still a sale. rebuild_rollups() reads both tables.
+
+# used when settings.ARCHIVE_AFTER_DAYS / settings.ARCHIVE_BATCH_SIZE are not set, both are read on every call.
+# Orders moved per transaction: small batches keep the write lock short so checkouts are not held up
+DEFAULT_AFTER_DAYS = 90
+DEFAULT_BATCH_SIZE = 500
+
+ORDER_FIELDS = ['id', 'user_id', 'delivery_crew_id', 'status', 'total', 'date']
+ITEM_FIELDS = ['id', 'order_id', 'menuitem_id', 'quantity', 'unit_price', 'price']
+
+
+def _copy(queryset, model, fields):
+    """
+    INSERT INTO <model table> (fields) SELECT fields FROM <queryset>: one query whatever the number of rows, where
+    bulk_create splits the rows to stay under the bind parameter limit of the database (999 on SQLite).
+    """
+    connection = connections[queryset.db]
+    sql, params = queryset.values_list(*fields).query.get_compiler(queryset.db).as_sql()
+    columns = ', '.join(connection.ops.quote_name(model._meta.get_field(field).column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {connection.ops.quote_name(model._meta.db_table)} ({columns}) {sql}', params)
+
+
+def archive_batch(cutoff, batch_size=None):
+    """
+    Moves up to `batch_size` delivered orders placed before `cutoff`, oldest first, with their items, in one
+    transaction. Five queries whatever the batch size: the order ids, two INSERT ... SELECT into the archive and
+    two DELETE.
+    :param batch_size: defaults to settings.ARCHIVE_BATCH_SIZE
+    :return: number of orders archived
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, 'ARCHIVE_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    with transaction.atomic():
+        # walks the (status, date) index. Rows locked by a concurrent archiver are skipped where supported
+        order_ids = list(
+            Order.objects.select_for_update(skip_locked=True)
+            .filter(status=True, date__lt=cutoff)
+            .order_by('date', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not order_ids:
+            return 0
+        orders = Order.objects.filter(pk__in=order_ids)
+        items = OrderItem.objects.filter(order_id__in=order_ids)
+
+        # archived_at is set here, auto_now_add only applies to save() and bulk_create()
+        archived_at = Value(timezone.now(), output_field=DateTimeField())
+        _copy(orders.annotate(archived_at=archived_at), ArchivedOrder, [*ORDER_FIELDS, 'archived_at'])
+        _copy(items, ArchivedOrderItem, ITEM_FIELDS)
+        # raw DELETEs: delete() would fetch the orders and their items to run the cascade in Python, in batches.
+        # Nothing else references an order and no signal is hooked on these models. Rollups are left as they are
+        items._raw_delete(items.db)
+        orders._raw_delete(orders.db)
+    return len(order_ids)
+
+
+def archive_orders(days=None, batch_size=None, pause=0, max_batches=None):
+    """
+    Archives every delivered order older than `days`, one batch per transaction.
+    :param days: defaults to settings.ARCHIVE_AFTER_DAYS
+    :param batch_size: defaults to settings.ARCHIVE_BATCH_SIZE
+    :param pause: seconds to sleep between batches, leaves the db to the requests on a busy server
+    :param max_batches: stop after that many batches, None to run until nothing is left
+    :return: number of orders archived
+    """
+    if days is None:
+        days = getattr(settings, 'ARCHIVE_AFTER_DAYS', DEFAULT_AFTER_DAYS)
+    if batch_size is None:
+        batch_size = getattr(settings, 'ARCHIVE_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    cutoff = timezone.now() - timedelta(days=days)
+    archived = batches = 0
+    while max_batches is None or batches < max_batches:
+        count = archive_batch(cutoff, batch_size)
+        archived += count
+        batches += 1
+        if count < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return archived
@@ -0,0 +1,226 @@
+# Async versions of the read heavy endpoints, served under /api/async/ when running on an ASGI server
+# (e.g. uvicorn LittleLemonAPI_Final_Project.asgi:application).
+# DRF views are sync only, so these are plain django async views. Authentication, permissions and throttling follow
+# the same rules as the DRF views in views.py and the responses have the same shape.
+import functools
+import math
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user
+from django.db import router
+from django.db.models import Sum
+from django.http import Http404, HttpResponse
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+from rest_framework.permissions import IsAuthenticated
+
+from .authentication import get_cached_token, cache_token, token_generation
+from .filters import filter_menu_items
+from .menu_cache import menu_cache, amenu_cache_key
+from .models import MenuItem, Cart, Order, ArchivedOrder
+from .pagination import KeysetPaginator, MAX_PAGE_SIZE
+from .renderers import FastJSONRenderer
+from .permissions import IsCustomer
+from .routers import read_from_replica, CATALOG_PIN
+from .roles import arequest_roles, is_manager, is_delivery_crew
+from .search import fts_available
+from .throttling import MenuRateThrottle, OrderRateThrottle
+from .serializers import (
+    MenuItemSerializer,
+    CartSerializer,
+    CartSummarySerializer,
+    OrderDetailSerializer,
+)
+
+
+def json_response(data, status=200, headers=None):
+    # the renderer of the DRF views, so decimals, dates and lazy strings come out the same
+    return HttpResponse(FastJSONRenderer().render(data), status=status, headers=headers,
+                        content_type=FastJSONRenderer.media_type)
+
+
+async def aauthenticate(request):
+    """
+    TokenAuthentication then SessionAuthentication, as configured in REST_FRAMEWORK, without blocking the event
+    loop on the token lookup.
+    :return: User or AnonymousUser
+    :raises AuthenticationFailed: an Authorization: Token header with an unknown key or an inactive user
+    """
+    auth = request.headers.get('Authorization', '').split()
+    if auth and auth[0].lower() == 'token':
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+        # shared with CachedTokenAuthentication. The generation check reads the shared state file, sync only
+        cached = await sync_to_async(get_cached_token)(auth[1])
+        if cached is not None:
+            return cached[0]
+        generation = await sync_to_async(token_generation)()
+        try:
+            token = await Token.objects.select_related('user').aget(key=auth[1])
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        cache_token(token, generation)
+        return token.user
+    # session: only GET requests get here so there is no CSRF check to do
+    return await sync_to_async(get_user)(request)
+
+
+def async_api_view(permission_classes=(IsAuthenticated,), throttle_classes=()):
+    """
+    Turns an async function into a GET only endpoint: authentication, permission classes and throttles run before
+    the view, APIException and Http404 are turned into the usual DRF error responses.
+    Roles are resolved once with the async ORM so the existing permission classes run without db access.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return json_response({'detail': f'Method "{request.method}" not allowed.'}, status=405,
+                                     headers={'Allow': 'GET'})
+            try:
+                request.user = await aauthenticate(request)
+                await arequest_roles(request)
+
+                for permission_class in permission_classes:
+                    if not permission_class().has_permission(request, None):
+                        if not request.user.is_authenticated:
+                            raise exceptions.NotAuthenticated()
+                        raise exceptions.PermissionDenied()
+
+                for throttle_class in throttle_classes:
+                    throttle = throttle_class()
+                    if not await sync_to_async(throttle.allow_request)(request, None):
+                        raise exceptions.Throttled(throttle.wait())
+
+                return await view(request, *args, **kwargs)
+            except Http404:
+                return json_response({'detail': 'Not found.'}, status=404)
+            except exceptions.APIException as exc:
+                headers = {}
+                if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                    headers['WWW-Authenticate'] = 'Token'
+                if getattr(exc, 'wait', None) is not None:
+                    headers['Retry-After'] = str(math.ceil(exc.wait))
+                data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+                return json_response(data, status=exc.status_code, headers=headers)
+        return wrapper
+    return decorator
+
+
+@read_from_replica(unless_pinned=CATALOG_PIN)
+@async_api_view(throttle_classes=[MenuRateThrottle])
+async def menu_items(request):
+    """
+    Endpoint: /api/async/menu-items/
+    GET: same query params and responses as /api/menu-items/ (filters, search, ordering, page/perpage or cursor).
+    :param request:
+    :return: JSON() and Status Codes.
+    """
+    cursor = request.GET.get('pagination') == 'cursor' or 'cursor' in request.GET
+    # page responses are shared with the DRF view. Cursor pages embed links to this endpoint, keyed on the path too
+    cache_key = await (amenu_cache_key('list', request.GET, path=request.path) if cursor
+                       else amenu_cache_key('list', request.GET))
+    data = menu_cache.get(cache_key)
+    if data is not None:
+        return json_response(data)
+
+    # the alias is chosen once so the FTS check, sync only introspection cached for the process, is made on the
+    # database the query runs on
+    alias = router.db_for_read(MenuItem)
+    await sync_to_async(fts_available)(alias)
+    menuitems = MenuItem.objects.using(alias).select_related('category').all()
+    menuitems, filterset, ranked = filter_menu_items(menuitems, request.GET)
+
+    try:
+        perpage = min(max(int(request.GET.get('perpage', 2)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return json_response({'error': 'perpage must be a number.'}, status=400)
+
+    if cursor:
+        paginator = KeysetPaginator(ordering=filterset.get_ordering(), page_size=perpage)
+        page = await paginator.apaginate(menuitems, request)
+        data = paginator.get_paginated_data(list(MenuItemSerializer(page, many=True).data))
+        menu_cache.set(cache_key, data)
+        return json_response(data)
+
+    menuitems = menuitems.order_by(*filterset.get_ordering(default=('search_rank', 'id') if ranked else None))
+
+    # page pagination, django's Paginator counts synchronously so the COUNT(*) and the page are fetched here
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        return json_response({'error': 'page must be a number.'}, status=400)
+    num_pages = max(math.ceil(await menuitems.acount() / perpage), 1)
+    if not 1 <= page <= num_pages:
+        raise exceptions.NotFound(f'Invalid page. There are {num_pages} pages.')
+    offset = (page - 1) * perpage
+    page = [menuitem async for menuitem in menuitems[offset:offset + perpage]]
+
+    data = list(MenuItemSerializer(page, many=True).data)
+    menu_cache.set(cache_key, data)
+    return json_response(data)
+
+
+@async_api_view()
+async def single_menu_item(request, pk):
+    """
+    Endpoint: /api/async/menu-items/{pk}
+    GET: details of a single menu item. Writes go to /api/menu-items/{pk}
+    :param request:
+    :return: JSON() and Status Codes.
+    """
+    cache_key = await amenu_cache_key('item', pk=pk)
+    data = menu_cache.get(cache_key)
+    if data is None:
+        try:
+            menu_item = await MenuItem.objects.select_related('category').aget(pk=pk)
+        except MenuItem.DoesNotExist:
+            raise Http404
+        data = dict(MenuItemSerializer(menu_item).data)
+        menu_cache.set(cache_key, data)
+    return json_response(data)
+
+
+@async_api_view(permission_classes=[IsCustomer])
+async def cart(request):
+    """
+    Endpoint: /api/async/cart/menu-items
+    GET: cart items of the current user, ?summary=true for the lines with their menu item and the totals.
+    Writes go to /api/cart/menu-items
+    :param request:
+    :return: JSON() and Status Codes.
+    """
+    user_cart_items = Cart.objects.filter(user=request.user)
+    if request.GET.get('summary', '').lower() in ('1', 'true'):
+        summary = await user_cart_items.aaggregate(item_count=Sum('quantity', default=0),
+                                                   subtotal=Sum('price', default=0))
+        summary['items'] = [
+            line async for line in user_cart_items.select_related('menuitem__category').order_by('id')
+        ]
+        return json_response(CartSummarySerializer(summary).data)
+    return json_response(CartSerializer([line async for line in user_cart_items], many=True).data)
+
+
+@read_from_replica
+@async_api_view(throttle_classes=[OrderRateThrottle])
+async def order_manager(request):
+    """
+    Endpoint: /api/async/orders/
+    GET: same as /api/orders/. Managers see every order, delivery crew the orders assigned to them, customers
+    their own orders. Newest first, keyset paginated. Orders are placed with POST /api/orders/
+    :param request:
+    :return: JSON() and Status Codes.
+    """
+    tables = (Order, ArchivedOrder) if request.GET.get('history', '').lower() in ('1', 'true') else (Order,)
+    if is_manager(request):
+        querysets = [model.objects.all() for model in tables]
+    elif is_delivery_crew(request):
+        querysets = [model.objects.filter(delivery_crew=request.user) for model in tables]
+    else:
+        querysets = [model.objects.filter(user=request.user) for model in tables]
+
+    paginator = KeysetPaginator(ordering=('-date', '-id'))
+    page = await paginator.apaginate_many([orders.with_items() for orders in querysets], request)
+    return json_response(paginator.get_paginated_data(OrderDetailSerializer(page, many=True).data))
@@ -0,0 +1,100 @@
+import copy
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .caching import LRUCache
+from .shared_state import get_counter, bump_counter
+
+# token key -> (generation, user, token) of active users. Shared by all requests served by this process.
+# Token and user changes made through the ORM bump the token generation, a counter shared by every worker process
+# of the host (see shared_state.py), and entries cached under an older generation are not used anymore: logging out,
+# deleting a token or deactivating a user takes effect at once in every worker.
+# The ttl only bounds how long a change made outside of the ORM (raw SQL, another host) goes unnoticed.
+TOKEN_GENERATION_KEY = 'token-generation'
+_token_cache = LRUCache(
+    maxsize=getattr(settings, 'TOKEN_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'TOKEN_CACHE_TTL', 60),
+)
+
+
+def token_generation():
+    """
+    Read before looking the token up in the db and passed to cache_token(), so a change made during the lookup
+    is not hidden.
+    """
+    return get_counter(TOKEN_GENERATION_KEY)
+
+
+def get_cached_token(key):
+    """
+    :return: (user, token) or None when the key is not cached. Copies, so a request can't change what the next one
+        sees.
+    """
+    cached = _token_cache.get(key)
+    if cached is None:
+        return None
+    generation, user, token = cached
+    if generation != token_generation():
+        _token_cache.delete(key)
+        return None
+    return copy.copy(user), token
+
+
+def cache_token(token, generation):
+    # only tokens of active users are cached, inactive ones go through the db and fail every time
+    if token.user.is_active:
+        _token_cache.set(token.key, (generation, copy.copy(token.user), token))
+
+
+def invalidate_tokens(key=None):
+    """
+    Drop one cached token, or all of them when key is None, in every worker process.
+    """
+    if key is None:
+        _token_cache.clear()
+    else:
+        _token_cache.delete(key)
+    bump_counter(TOKEN_GENERATION_KEY)  # the other processes drop every token they cached
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that remembers the user of each token, so repeated calls with the same token skip the
+    Token + User query. The roles of the user are cached separately, see roles.py
+    """
+
+    def authenticate_credentials(self, key):
+        cached = get_cached_token(key)
+        if cached is not None:
+            return cached
+        generation = token_generation()
+        user, token = super().authenticate_credentials(key)
+        cache_token(token, generation)
+        return user, token
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def token_changed(sender, instance, **kwargs):
+    # djoser's token/logout deletes the token. A new token is not cached anywhere yet
+    if not kwargs.get('created'):
+        invalidate_tokens(instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    """
+    A deactivated, renamed or deleted user must not be served from the cache. A user has at most one token.
+    """
+    if kwargs.get('created'):
+        return  # no token yet
+    if kwargs.get('update_fields') == frozenset(['last_login']):
+        return  # every login saves it, nothing cached depends on it
+    for key in Token.objects.filter(user_id=instance.pk).values_list('key', flat=True):
+        invalidate_tokens(key)
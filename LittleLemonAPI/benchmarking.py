@@ -0,0 +1,326 @@
+# Endpoint benchmark suite used by `manage.py benchmark_api`. Seeds the db at a given scale, drives every route of
+# urls.py in process through django's test clients and measures latency, throughput and queries per request.
+import json
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User, Group
+from django.db import connection
+from django.test import Client, AsyncClient
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from .checkout import checkout
+from .menu_cache import menu_cache
+from .models import MenuItem, Category, Cart, Order, OrderItem
+from .roles import MANAGER, DELIVERY_CREW
+from .rollups import rebuild_rollups
+
+WORDS = [
+    'greek', 'salad', 'lemon', 'dessert', 'bruschetta', 'pasta', 'grilled', 'fish', 'chicken', 'lamb',
+    'souvlaki', 'feta', 'olive', 'spicy', 'roasted', 'garlic', 'house', 'special', 'vegan', 'platter',
+]
+
+DEFAULT_SCALE = {
+    'menu_items': 1000,
+    'users': 100,
+    'carts': 50,
+    'orders': 1000,
+}
+
+
+def percentile(timings, p):
+    return statistics.quantiles(timings, n=100, method='inclusive')[p - 1] if len(timings) > 1 else timings[0]
+
+
+def summarize(timings, queries, elapsed):
+    """
+    :param timings: latency of each request in ms
+    :param queries: number of queries of each request
+    :param elapsed: wall time of the whole run in seconds
+    """
+    return {
+        'requests': len(timings),
+        'rps': round(len(timings) / elapsed, 1),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'queries': max(queries),
+    }
+
+
+class Fixtures:
+    """
+    Benchmark data. Everything is created with bulk inserts so large scales seed quickly.
+    Meant to be created inside a transaction that is rolled back.
+    """
+
+    def __init__(self, scale, seed=0):
+        self.rng = random.Random(seed)
+        self.scale = scale
+        manager_group = Group.objects.get_or_create(name=MANAGER)[0]
+        self.crew_group = Group.objects.get_or_create(name=DELIVERY_CREW)[0]
+
+        # the users making the requests
+        self.manager = User.objects.create_user(username='bench-manager')
+        self.manager.groups.add(manager_group)
+        self.crew = User.objects.create_user(username='bench-crew')
+        self.crew.groups.add(self.crew_group)
+        self.customer = User.objects.create_user(username='bench-customer')
+        self.tokens = {user: Token.objects.create(user=user).key for user in (self.manager, self.crew, self.customer)}
+        # promoted and demoted by the group management routes
+        self.target = User.objects.create_user(username='bench-target')
+
+        self.category = Category.objects.create(slug='bench', title='Benchmark')
+        MenuItem.objects.bulk_create(
+            (MenuItem(title=' '.join(self.rng.sample(WORDS, 3)) + f' {i}', price=self.rng.randint(100, 5000) / 100,
+                      featured=i % 10 == 0, category=self.category)
+             for i in range(max(scale['menu_items'], 10))),
+            batch_size=5000,
+        )
+        self.menuitems = list(MenuItem.objects.filter(category=self.category).values_list('id', 'price'))
+        self.menuitem = self.menuitems[0][0]
+        self.deep_page = max(len(self.menuitems) // 40, 1)  # half way through the menu with 20 per page
+
+        User.objects.bulk_create(
+            (User(username=f'bench-user{i}') for i in range(scale['users'])),
+            batch_size=5000,
+        )
+        customers = [self.customer.pk] + list(
+            User.objects.filter(username__startswith='bench-user').values_list('id', flat=True)
+        )
+
+        Cart.objects.bulk_create(
+            (Cart(user_id=user_id, menuitem_id=menuitem_id, quantity=2, unit_price=price, price=price * 2)
+             for user_id in customers[1:scale['carts'] + 1]
+             for menuitem_id, price in self.rng.sample(self.menuitems, 3)),
+            batch_size=5000,
+        )
+
+        # orders spread over the last 90 days, every other one assigned to the delivery crew user
+        now = timezone.now()
+        lines = [self.rng.sample(self.menuitems, 3) for _ in range(scale['orders'])]
+        orders = Order.objects.bulk_create(
+            (Order(user_id=customers[i % len(customers)], delivery_crew=self.crew if i % 2 else None,
+                   status=i % 3 == 0, total=sum(price for _, price in lines[i]),
+                   date=now - timedelta(minutes=self.rng.randint(0, 90 * 24 * 60)))
+             for i in range(scale['orders'])),
+            batch_size=5000,
+        )
+        OrderItem.objects.bulk_create(
+            (OrderItem(order=order, menuitem_id=menuitem_id, quantity=1, unit_price=price, price=price)
+             for order, order_lines in zip(orders, lines)
+             for menuitem_id, price in order_lines),
+            batch_size=5000,
+        )
+        rebuild_rollups()
+        self.counter = 0
+        self.order = Order.objects.filter(user=self.customer).values_list('id', flat=True).first()
+        # a delivery crew backlog for the bulk update
+        self.crew_orders = list(Order.objects.filter(delivery_crew=self.crew).values_list('id', flat=True)[:100])
+        if self.order is None:
+            self.order = self.new_order()['pk']
+
+    def next(self):
+        self.counter += 1
+        return self.counter
+
+    def fill_cart(self, user, lines=3):
+        Cart.objects.bulk_create(
+            [Cart(user=user, menuitem_id=menuitem_id, quantity=1, unit_price=price, price=price)
+             for menuitem_id, price in self.menuitems[:lines]],
+            ignore_conflicts=True,
+        )
+
+    # setups, run before each request and not timed. They return values used in the path and payload
+
+    def new_menu_item(self):
+        menuitem = MenuItem.objects.create(title=f'bench delete {self.next()}', price=5, featured=False,
+                                           category=self.category)
+        return {'pk': menuitem.pk}
+
+    def new_order(self):
+        self.fill_cart(self.customer)
+        return {'pk': checkout(self.customer).pk}
+
+    def promote(self, group):
+        self.target.groups.add(group)
+        return {'pk': self.target.pk}
+
+    def demote(self, group):
+        self.target.groups.remove(group)
+        return {}
+
+
+class Route:
+    """
+    One benchmarked request.
+    :param path: relative to /api/, formatted with the values returned by setup and `menuitem`, `order`,
+        `deep_page`
+    :param user: 'manager', 'crew', 'customer' or None for anonymous requests
+    :param data: payload, or a function of the setup values returning it
+    :param setup: function of the Fixtures run before each request
+    """
+
+    def __init__(self, name, method, path, user='customer', data=None, setup=None, content_type='application/json',
+                 asgi=False):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.user = user
+        self.data = data
+        self.setup = setup
+        self.content_type = content_type
+        self.asgi = asgi
+
+    def prepare(self, fixtures):
+        context = {'menuitem': fixtures.menuitem, 'order': fixtures.order, 'deep_page': fixtures.deep_page}
+        if self.setup:
+            context.update(self.setup(fixtures))
+        data = self.data(fixtures, context) if callable(self.data) else self.data
+        return '/api/' + self.path.format(**context), data
+
+
+def import_body(fixtures, context):
+    return json.dumps([
+        {'title': f'bench import {i}', 'price': '4.50', 'category': 'bench'} for i in range(100)
+    ])
+
+
+# every route of urls.py. Writes are repeated with a setup that puts the data back in shape
+ROUTES = [
+    Route('signup', 'post', 'users/', user=None,
+          data=lambda fixtures, context: {'username': f'bench-signup{fixtures.next()}', 'password': 'secret'}),
+    Route('user details', 'get', 'users/me'),
+
+    Route('managers list', 'get', 'groups/manager/users', user='manager'),
+    Route('managers add', 'post', 'groups/manager/users', user='manager', data={'username': 'bench-target'},
+          setup=lambda fixtures: fixtures.demote(Group.objects.get(name=MANAGER))),
+    Route('managers remove', 'delete', 'groups/manager/users/{pk}', user='manager',
+          setup=lambda fixtures: fixtures.promote(Group.objects.get(name=MANAGER))),
+    Route('delivery crew list', 'get', 'groups/delivery-crew/users', user='manager'),
+    Route('delivery crew add', 'post', 'groups/delivery-crew/users', user='manager',
+          data={'username': 'bench-target'}, setup=lambda fixtures: fixtures.demote(fixtures.crew_group)),
+    Route('delivery crew remove', 'delete', 'groups/delivery-crew/users/{pk}', user='manager',
+          setup=lambda fixtures: fixtures.promote(fixtures.crew_group)),
+
+    Route('menu list', 'get', 'menu-items/?perpage=20'),
+    Route('menu list deep page', 'get', 'menu-items/?perpage=20&page={deep_page}&ordering=price'),
+    Route('menu list filtered', 'get', 'menu-items/?category=bench&price_min=10&price_max=20&featured=true'),
+    Route('menu search', 'get', 'menu-items/?search=greek%20sal&perpage=20'),
+    Route('menu cursor', 'get', 'menu-items/?pagination=cursor&perpage=20&ordering=-price'),
+    Route('menu create', 'post', 'menu-items/', user='manager',
+          data=lambda fixtures, context: {'title': f'bench create {fixtures.next()}', 'price': '5.00',
+                                          'featured': False, 'category_id': fixtures.category.pk}),
+    Route('menu import', 'post', 'menu-items/import', user='manager', data=import_body),
+    Route('menu item', 'get', 'menu-items/{menuitem}'),
+    Route('menu item put', 'put', 'menu-items/{menuitem}', user='manager',
+          data=lambda fixtures, context: {'title': 'bench put', 'price': '7.00', 'featured': False,
+                                          'category_id': fixtures.category.pk}),
+    Route('menu item patch', 'patch', 'menu-items/{menuitem}', user='manager', data={'price': '8.00'}),
+    Route('menu item delete', 'delete', 'menu-items/{pk}', user='manager',
+          setup=lambda fixtures: fixtures.new_menu_item()),
+
+    Route('cart', 'get', 'cart/menu-items', setup=lambda fixtures: fixtures.fill_cart(fixtures.customer) or {}),
+    Route('cart summary', 'get', 'cart/menu-items?summary=true'),
+    Route('cart add', 'post', 'cart/menu-items',
+          data=lambda fixtures, context: [{'menuitem': menuitem_id, 'quantity': 1}
+                                          for menuitem_id, _ in fixtures.menuitems[:3]]),
+    Route('cart patch', 'patch', 'cart/menu-items',
+          data=lambda fixtures, context: [{'menuitem': menuitem_id, 'quantity': 2}
+                                          for menuitem_id, _ in fixtures.menuitems[:3]]),
+    Route('cart put', 'put', 'cart/menu-items',
+          data=lambda fixtures, context: [{'menuitem': menuitem_id, 'quantity': 1}
+                                          for menuitem_id, _ in fixtures.menuitems[3:6]]),
+    Route('cart delete', 'delete', 'cart/menu-items'),
+
+    Route('orders manager', 'get', 'orders/?perpage=20', user='manager'),
+    Route('orders delivery crew', 'get', 'orders/?perpage=20', user='crew'),
+    Route('orders customer', 'get', 'orders/?perpage=20'),
+    Route('orders history', 'get', 'orders/?perpage=20&history=true', user='manager'),
+    Route('checkout', 'post', 'orders/', setup=lambda fixtures: fixtures.fill_cart(fixtures.customer) or {}),
+    Route('order', 'get', 'orders/{order}'),
+    Route('order patch', 'patch', 'orders/{order}', user='manager',
+          data=lambda fixtures, context: {'status': fixtures.next() % 2, 'delivery_crew': fixtures.crew.pk}),
+    Route('order delete', 'delete', 'orders/{pk}', user='manager', setup=lambda fixtures: fixtures.new_order()),
+    Route('orders bulk patch', 'patch', 'orders/bulk', user='crew',
+          data=lambda fixtures, context: {'orders': fixtures.crew_orders, 'status': fixtures.next() % 2}),
+    Route('orders export csv', 'get', 'orders/export?output=csv', user='manager'),
+    Route('orders export ndjson', 'get', 'orders/export?output=ndjson', user='manager'),
+
+    Route('sales by day', 'get', 'reports/sales', user='manager'),
+    Route('sales by menu item', 'get', 'reports/sales?group=menuitem', user='manager'),
+
+    Route('async menu list', 'get', 'async/menu-items/?perpage=20', asgi=True),
+    Route('async menu item', 'get', 'async/menu-items/{menuitem}', asgi=True),
+    Route('async cart', 'get', 'async/cart/menu-items?summary=true', asgi=True),
+    Route('async orders', 'get', 'async/orders/?perpage=20', user='manager', asgi=True),
+]
+
+
+async def asend(send, path, kwargs):
+    return await send(path, **kwargs)
+
+
+def run_route(route, fixtures, requests, cold=False, warmup=1, captured_queries=None):
+    """
+    Sends `requests` requests for one route, one after the other.
+    :param cold: empty the menu cache before every request
+    :param warmup: requests sent first and left out of the results, e.g. the one that caches the user roles
+    :param captured_queries: list receiving the queries ({'sql': ..., 'time': ...}) of every request, warmup included
+    :return: summary dict, see summarize(), plus the status codes seen
+    """
+    user = getattr(fixtures, route.user) if route.user else None
+    headers = {'Authorization': f'Token {fixtures.tokens[user]}'} if user else {}
+    client = AsyncClient() if route.asgi else Client()
+    timings, queries, statuses = [], [], {}
+    elapsed = 0
+    for number in range(warmup + requests):
+        path, data = route.prepare(fixtures)
+        if cold:
+            menu_cache.clear()
+        kwargs = {'headers': headers}
+        if data is not None:
+            kwargs.update(data=data if isinstance(data, str) else json.dumps(data), content_type=route.content_type)
+        send = getattr(client, route.method)
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            if route.asgi:
+                response = async_to_sync(asend)(send, path, kwargs)
+            else:
+                response = send(path, **kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)  # the export is produced while it is read
+            duration = time.perf_counter() - start
+        if captured_queries is not None:
+            captured_queries.extend(captured)
+        if number < warmup:
+            continue
+        elapsed += duration
+        timings.append(duration * 1000)
+        queries.append(len(captured))
+        statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+    return dict(summarize(timings, queries, elapsed), statuses=statuses)
+
+
+def compare(results, baseline, threshold):
+    """
+    Flags the endpoints that got slower or run more queries than in a previous run.
+    :param threshold: allowed p95 increase, e.g. 0.25 for 25%
+    :return: list of messages, empty if nothing regressed
+    """
+    regressions = []
+    for name, current in results['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+            regressions.append(f"{name}: p95 {previous['p95_ms']:.2f}ms -> {current['p95_ms']:.2f}ms")
+        if current['queries'] > previous['queries']:
+            regressions.append(f"{name}: queries {previous['queries']} -> {current['queries']}")
+    return regressions
@@ -0,0 +1,98 @@
+from django.db import transaction
+from django.db.models import Case, When, Value, F, DecimalField, IntegerField, ExpressionWrapper
+from rest_framework.exceptions import ValidationError
+
+from .models import Cart, MenuItem
+from .serializers import MAX_CART_QUANTITY
+
+
+def _prices(lines):
+    """
+    Current price of every menu item in `lines`, one query.
+    :raises ValidationError: some menu items don't exist
+    """
+    prices = dict(MenuItem.objects.filter(pk__in=lines).values_list('id', 'price'))
+    missing = sorted(set(lines) - set(prices))
+    if missing:
+        raise ValidationError({'menuitem': [f'Menu item {pk} does not exist.' for pk in missing]})
+    return prices
+
+
+def _per_line(values, output_field):
+    """
+    CASE menuitem_id WHEN 1 THEN x WHEN 2 THEN y END so one UPDATE can apply a different value to each cart line.
+    """
+    return Case(
+        *(When(menuitem_id=menuitem_id, then=Value(value)) for menuitem_id, value in values.items()),
+        output_field=output_field,
+    )
+
+
+def add_to_cart(user, lines):
+    """
+    Adds quantities to the cart of a user: new menu items get a line, existing lines are incremented in the db
+    (quantity = quantity + n) so concurrent adds don't lose updates. Touched lines take the current menu price.
+    No line goes over MAX_CART_QUANTITY: the batch is rejected instead.
+    Constant number of queries whatever the number of lines.
+    :param lines: dict menuitem id -> quantity to add
+    :return: queryset of the cart lines that were touched
+    :raises ValidationError: unknown menu items, or lines that would go over MAX_CART_QUANTITY
+    """
+    prices = _prices(lines)
+    with transaction.atomic():
+        # make sure every line exists. Lines already in the cart are left alone by ignore_conflicts
+        Cart.objects.bulk_create(
+            [Cart(user=user, menuitem_id=menuitem_id, quantity=0, unit_price=prices[menuitem_id], price=0)
+             for menuitem_id in lines],
+            ignore_conflicts=True,
+        )
+        # lines that would go over MAX_CART_QUANTITY are not updated, the rowcount tells
+        too_many = Value(MAX_CART_QUANTITY) - _per_line(lines, IntegerField())
+        # the whole line is repriced at the current menu price, as set_cart_quantities does. The right hand side
+        # reads the quantity before the update
+        quantity = F('quantity') + _per_line(lines, IntegerField())
+        unit_price = _per_line(prices, DecimalField(max_digits=6, decimal_places=2))
+        updated = Cart.objects.filter(user=user, menuitem_id__in=lines, quantity__lte=too_many).update(
+            quantity=quantity,
+            unit_price=unit_price,
+            price=ExpressionWrapper(quantity * unit_price, output_field=DecimalField(max_digits=6, decimal_places=2)),
+        )
+        if updated < len(lines):
+            # rolls the whole batch back
+            over = Cart.objects.filter(user=user, menuitem_id__in=lines, quantity__gt=too_many)
+            raise ValidationError({'quantity': [
+                f'Menu item {menuitem_id} would go over {MAX_CART_QUANTITY} in the cart.'
+                for menuitem_id in sorted(over.values_list('menuitem_id', flat=True))
+            ]})
+    return Cart.objects.filter(user=user, menuitem_id__in=lines).order_by('id')
+
+
+def set_cart_quantities(user, lines, replace=False):
+    """
+    Sets the quantity of cart lines at the current menu price. A quantity of 0 removes the line.
+    :param lines: dict menuitem id -> new quantity
+    :param replace: remove every line not in `lines` (PUT)
+    """
+    keep = {menuitem_id: quantity for menuitem_id, quantity in lines.items() if quantity > 0}
+    prices = _prices(keep)
+    with transaction.atomic():
+        user_cart_items = Cart.objects.filter(user=user)
+        if replace:
+            user_cart_items.exclude(menuitem_id__in=keep).delete()
+        else:
+            user_cart_items.filter(menuitem_id__in=set(lines) - set(keep)).delete()
+        if not keep:
+            return
+        Cart.objects.bulk_create(
+            [Cart(user=user, menuitem_id=menuitem_id, quantity=0, unit_price=prices[menuitem_id], price=0)
+             for menuitem_id in keep],
+            ignore_conflicts=True,
+        )
+        user_cart_items.filter(menuitem_id__in=keep).update(
+            quantity=_per_line(keep, IntegerField()),
+            unit_price=_per_line(prices, DecimalField(max_digits=6, decimal_places=2)),
+            price=_per_line(
+                {menuitem_id: prices[menuitem_id] * quantity for menuitem_id, quantity in keep.items()},
+                DecimalField(max_digits=6, decimal_places=2),
+            ),
+        )
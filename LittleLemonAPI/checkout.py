@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Cart, Order, OrderItem
+from .dispatch import dispatch_orders
+from .rollups import record_order
+
+
+def checkout(user):
+    """
+    Turns the Cart of a user into an Order in a single transaction.
+
+    The cart rows are locked, copied into OrderItem rows with one bulk INSERT, the order total is computed by the db
+    and the cart is emptied. The number of queries is the same regardless of the number of items in the cart.
+    :param user: the user placing the order
+    :return: the new Order or None if the cart is empty
+    """
+    with transaction.atomic():
+        # lock the cart rows so a concurrent checkout of the same cart can't build a second order from it
+        cart_items = list(
+            Cart.objects.select_for_update()
+            .filter(user=user)
+            .values_list('menuitem_id', 'quantity', 'unit_price', 'price')
+        )
+        if not cart_items:
+            return None
+
+        # let the db sum the line prices instead of adding them up in python
+        total = Cart.objects.filter(user=user).aggregate(total=Sum('price'))['total']
+        order = Order.objects.create(user=user, status=False, total=total, date=timezone.now())
+
+        # Populate order items with all items from the cart in one INSERT
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menuitem_id=menuitem_id, quantity=quantity, unit_price=unit_price, price=price)
+            for menuitem_id, quantity, unit_price, price in cart_items
+        ])
+
+        # sales reports are kept up to date in the same transaction, see rollups.py
+        record_order(order, [(menuitem_id, quantity, price) for menuitem_id, quantity, _, price in cart_items])
+
+        # Delete Cart items after adding to the order
+        Cart.objects.filter(user=user).delete()
+
+        # assign a delivery crew member as soon as the order exists instead of waiting for the next dispatch cycle
+        if getattr(settings, 'DISPATCH_ON_CHECKOUT', False):
+            transaction.on_commit(dispatch_orders)
+
+    return order
@@ -0,0 +1,99 @@
+import heapq
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Case, When, Value, Count, Q, IntegerField
+
+from .models import Order
+from .roles import DELIVERY_CREW
+
+# used when settings.DISPATCH_BATCH_SIZE is not set. settings.DISPATCH_MAX_OPEN_ORDERS (open orders a delivery crew
+# member can hold) defaults to no limit
+DEFAULT_BATCH_SIZE = 500
+
+
+def crew_loads():
+    """
+    Load index: number of open (status 0) orders assigned to every member of the Delivery crew group, idle members
+    included. One query.
+    :return: dict user id -> open orders
+    """
+    return dict(
+        User.objects.filter(groups__name=DELIVERY_CREW, is_active=True)
+        .values('id')  # group by the id only, not every column of the user
+        .annotate(open_orders=Count('delivery_crew', filter=Q(delivery_crew__status=False)))
+        .values_list('id', 'open_orders')
+    )
+
+
+def plan(orders, loads, max_open_orders=None):
+    """
+    Assigns each order, oldest first, to the least loaded crew member. Ties go to the lowest user id.
+    :param orders: unassigned order ids in dispatch order
+    :param loads: dict crew user id -> open orders. Not modified
+    :param max_open_orders: crew members holding that many open orders get nothing more
+    :return: dict crew user id -> list of order ids
+    """
+    # min-heap of (open orders, user id), the top is the next crew member to receive an order
+    heap = [(load, crew_id) for crew_id, load in loads.items()
+            if max_open_orders is None or load < max_open_orders]
+    heapq.heapify(heap)
+    assignments = defaultdict(list)
+    for order_id in orders:
+        if not heap:
+            break  # everybody is at capacity, the rest waits for the next cycle
+        load, crew_id = heapq.heappop(heap)
+        assignments[crew_id].append(order_id)
+        load += 1
+        if max_open_orders is None or load < max_open_orders:
+            heapq.heappush(heap, (load, crew_id))
+    return dict(assignments)
+
+
+def dispatch_orders(batch_size=None, max_open_orders=None):
+    """
+    One dispatch cycle: assigns up to `batch_size` unassigned open orders, oldest first, to the delivery crew
+    members with the fewest open orders.
+    Three queries whatever the batch size: the load index, the queue of unassigned orders and a single
+    UPDATE ... SET delivery_crew_id = CASE WHEN id IN (...) THEN crew ... END.
+    Orders assigned by a manager or another dispatcher in the meantime are left alone by the UPDATE and left out of
+    the result, at the cost of a fourth query.
+    :param batch_size: defaults to settings.DISPATCH_BATCH_SIZE
+    :param max_open_orders: defaults to settings.DISPATCH_MAX_OPEN_ORDERS
+    :return: dict crew user id -> list of order ids assigned in this cycle
+    """
+    # read on every call, not at import, so override_settings and settings changed at runtime apply
+    if batch_size is None:
+        batch_size = getattr(settings, 'DISPATCH_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    if max_open_orders is None:
+        max_open_orders = getattr(settings, 'DISPATCH_MAX_OPEN_ORDERS', None)
+    with transaction.atomic():
+        loads = crew_loads()
+        if not loads:
+            return {}
+        # rows locked by a concurrent dispatcher are skipped on databases that support it (no-op on SQLite)
+        orders = list(
+            Order.objects.select_for_update(skip_locked=True)
+            .filter(status=False, delivery_crew__isnull=True)
+            .order_by('date', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        assignments = plan(orders, loads, max_open_orders)
+        planned = [order_id for order_ids in assignments.values() for order_id in order_ids]
+        if not planned:
+            return assignments
+        updated = Order.objects.filter(pk__in=planned, delivery_crew__isnull=True).update(delivery_crew_id=Case(
+            *(When(pk__in=order_ids, then=Value(crew_id)) for crew_id, order_ids in assignments.items()),
+            output_field=IntegerField(),
+        ))
+        if updated < len(planned):
+            # some orders were assigned by someone else since the queue was read: report what this cycle did only
+            assigned_to = dict(Order.objects.filter(pk__in=planned).values_list('id', 'delivery_crew_id'))
+            assignments = {
+                crew_id: [order_id for order_id in order_ids if assigned_to.get(order_id) == crew_id]
+                for crew_id, order_ids in assignments.items()
+            }
+            assignments = {crew_id: order_ids for crew_id, order_ids in assignments.items() if order_ids}
+    return assignments
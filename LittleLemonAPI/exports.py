@@ -0,0 +1,112 @@
+import csv
+import json
+import heapq
+from itertools import groupby
+
+from django.db import router
+
+from .models import Order, ArchivedOrder
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# one row per order item, its order repeated on each line
+CSV_COLUMNS = [
+    'order_id', 'user_id', 'delivery_crew_id', 'status', 'total', 'date',
+    'item_id', 'menuitem_id', 'quantity', 'unit_price', 'price',
+]
+ORDER_FIELDS = ['id', 'user_id', 'delivery_crew_id', 'status', 'total', 'date']
+ITEM_FIELDS = ['orderitem__id', 'orderitem__menuitem_id', 'orderitem__quantity', 'orderitem__unit_price',
+               'orderitem__price']
+
+
+def order_item_rows(start=None, end=None, chunk_size=2000):
+    """
+    Order items joined with their order as plain tuples (see ORDER_FIELDS + ITEM_FIELDS), oldest order first.
+    Archived orders included. One query per table walked with a cursor `chunk_size` rows at a time, the two streams
+    are merged on (date, id) as they are read, nothing is accumulated in memory.
+    :param start: datetime, orders placed at or after
+    :param end: datetime, orders placed before
+    """
+    streams = []
+    for model in (Order, ArchivedOrder):
+        # the rows are read while the response streams, after the view returned: pick the database now
+        # Read from the order side: sorting on the order's (date, id) walks the date index and looks the items up
+        # by order_id, so rows come out as they are read. Sorting on the item's order_id sorts the whole export
+        # first.
+        orders = model.objects.using(router.db_for_read(model)).filter(orderitem__isnull=False)
+        if start is not None:
+            orders = orders.filter(date__gte=start)
+        if end is not None:
+            orders = orders.filter(date__lt=end)
+        streams.append(
+            orders.order_by('date', 'id')
+            .values_list(*ORDER_FIELDS, *ITEM_FIELDS)
+            .iterator(chunk_size=chunk_size)
+        )
+    date, order_id = ORDER_FIELDS.index('date'), ORDER_FIELDS.index('id')
+    return heapq.merge(*streams, key=lambda row: (row[date], row[order_id]))
+
+
+class Echo:
+    """
+    File-like object that returns what is written so csv.writer can produce lines for a streaming response.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return int(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for row in rows:
+        yield writer.writerow([_value(value) for value in row])
+
+
+def iter_ndjson(rows):
+    """
+    One JSON object per order with its items nested. Rows arrive sorted by order so they are grouped as they stream.
+    """
+    order_size = len(ORDER_FIELDS)
+    for order, items in groupby(rows, key=lambda row: row[:order_size]):
+        order_id, user_id, delivery_crew_id, status, total, date = order
+        yield json.dumps({
+            'order_id': order_id,
+            'user_id': user_id,
+            'delivery_crew_id': delivery_crew_id,
+            'status': status,
+            'total': str(total),
+            'date': date.isoformat(),
+            'order_items': [
+                {
+                    'id': item_id,
+                    'menuitem_id': menuitem_id,
+                    'quantity': quantity,
+                    'unit_price': str(unit_price),
+                    'price': str(price),
+                }
+                for item_id, menuitem_id, quantity, unit_price, price in (item[order_size:] for item in items)
+            ],
+        }) + '\n'
+
+
+def export_orders(fmt, start=None, end=None):
+    """
+    :param fmt: 'csv' or 'ndjson'
+    :return: iterator of str chunks to feed a StreamingHttpResponse
+    """
+    rows = order_item_rows(start, end)
+    return iter_csv(rows) if fmt == 'csv' else iter_ndjson(rows)
@@ -0,0 +1,139 @@
+from decimal import Decimal, InvalidOperation
+
+from rest_framework.exceptions import ValidationError
+
+from .search import search_menu_items
+
+# ?ordering= value -> order_by fields. Only orderings an index can serve are allowed,
+# id breaks ties between equal prices/titles so pages are stable (and usable as a keyset, see pagination.py).
+MENU_ITEM_ORDERINGS = {
+    'id': ('id',),
+    '-id': ('-id',),
+    'price': ('price', 'id'),
+    '-price': ('-price', '-id'),
+    'title': ('title', 'id'),
+    '-title': ('-title', '-id'),
+}
+
+
+class Filter:
+    """
+    Maps one query param to one queryset lookup.
+    Subclasses implement parse() to turn the raw value into the lookup value or raise ValueError.
+    """
+
+    def __init__(self, lookup):
+        self.lookup = lookup
+
+    def parse(self, value):
+        return value
+
+    def filter(self, queryset, value):
+        return queryset.filter(**{self.lookup: self.parse(value)})
+
+
+class DecimalFilter(Filter):
+    def parse(self, value):
+        try:
+            return Decimal(value)
+        except InvalidOperation:
+            raise ValueError('Enter a number.')
+
+
+class BooleanFilter(Filter):
+    """
+    Filters a boolean field with `field IN (value)`.
+    field=True compiles to a bare `WHERE field` (NOT field for False) which SQLite can't match against an index.
+    """
+    TRUE = {'1', 'true', 'yes'}
+    FALSE = {'0', 'false', 'no'}
+
+    def parse(self, value):
+        value = value.lower()
+        if value in self.TRUE:
+            return [True]
+        if value in self.FALSE:
+            return [False]
+        raise ValueError('Enter true or false.')
+
+
+class IdOrSlugFilter(Filter):
+    """
+    Filters a foreign key by the related id when the value is a number, by the related slug otherwise.
+    e.g. ?category=2 or ?category=desserts
+    """
+
+    def filter(self, queryset, value):
+        if value.isdigit():
+            return queryset.filter(**{f'{self.lookup}_id': int(value)})
+        return queryset.filter(**{f'{self.lookup}__slug': value})
+
+
+class FilterSet:
+    """
+    Declarative query param filtering.
+    Subclasses declare `filters` (query param -> Filter) and `orderings` (allowed ?ordering= values).
+    Every filter is meant to hit an index, see the indexes on the filtered model.
+    """
+    filters = {}
+    orderings = {}
+    default_ordering = None
+
+    def __init__(self, query_params):
+        self.query_params = query_params
+
+    def filter_queryset(self, queryset):
+        errors = {}
+        for name, filter_ in self.filters.items():
+            value = self.query_params.get(name, '').strip()
+            if not value:
+                continue
+            try:
+                queryset = filter_.filter(queryset, value)
+            except ValueError as error:
+                errors[name] = [str(error)]
+        if errors:
+            raise ValidationError(errors)
+        return queryset
+
+    def get_ordering(self, default=None):
+        """
+        :return: tuple of order_by fields for ?ordering=, or `default` (falls back to default_ordering) when missing
+        """
+        ordering = self.query_params.get('ordering', '').strip()
+        if not ordering:
+            return default or self.orderings[self.default_ordering]
+        if ordering not in self.orderings:
+            raise ValidationError({'ordering': [f"Must be one of {', '.join(self.orderings)}."]})
+        return self.orderings[ordering]
+
+
+class MenuItemFilterSet(FilterSet):
+    """
+    /api/menu-items/ filters.
+    e.g. ?price_min=5&price_max=12.50&category=mains&featured=true&ordering=-price
+    """
+    filters = {
+        'price': DecimalFilter('price'),
+        'price_min': DecimalFilter('price__gte'),
+        'price_max': DecimalFilter('price__lte'),
+        'category': IdOrSlugFilter('category'),
+        'featured': BooleanFilter('featured__in'),
+    }
+    orderings = MENU_ITEM_ORDERINGS
+    default_ordering = 'id'
+
+
+def filter_menu_items(menuitems, query_params):
+    """
+    Applies the /api/menu-items/ filters and ?search= to a MenuItem queryset. Shared by the sync and async views.
+    :return: (queryset, filterset, ranked) ranked tells if the queryset can be ordered by search_rank
+    """
+    filterset = MenuItemFilterSet(query_params)
+    menuitems = filterset.filter_queryset(menuitems)
+
+    search = query_params.get('search')
+    ranked = False
+    if search:  # full text prefix search on SQLite, title__icontains elsewhere. See search.py
+        menuitems, ranked = search_menu_items(menuitems, search)
+    return menuitems, filterset, ranked
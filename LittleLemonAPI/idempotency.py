@@ -0,0 +1,158 @@
+import functools
+import hashlib
+import json
+import random
+import time
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .sqlite_store import connect
+
+# Idempotency-Key support for POST requests.
+# A client that sends the same key again, e.g. retrying a checkout after a timeout, gets the response of the first
+# request back instead of running it twice. Keys are per user and live in their own SQLite file shared by every
+# worker process of the host, so a retry landing on another worker is answered too and replays never touch the
+# app database.
+# Only successful responses are kept: a request that failed changed nothing, its retry runs again.
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency_key (
+    key TEXT PRIMARY KEY,       -- user id:Idempotency-Key
+    fingerprint TEXT NOT NULL,  -- hash of the method, path and body of the first request
+    status INTEGER,             -- NULL while the first request runs
+    body TEXT,                  -- response data as JSON
+    created REAL NOT NULL,      -- unix time the first request started
+    expires REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+# Takes the key if it is new, expired or held by a request that died without releasing it.
+# A single statement, so of two concurrent requests with the same key only one gets a row back.
+CLAIM = """
+INSERT INTO idempotency_key (key, fingerprint, status, body, created, expires)
+VALUES (:key, :fingerprint, NULL, NULL, :now, :now + :ttl)
+ON CONFLICT (key) DO UPDATE SET
+    fingerprint = excluded.fingerprint, status = NULL, body = NULL, created = :now, expires = :now + :ttl
+WHERE expires < :now OR (status IS NULL AND created < :now - :lock_timeout)
+RETURNING key
+"""
+
+# fraction of the requests that also delete the expired keys and trim the store to IDEMPOTENCY_MAX_KEYS
+CLEANUP_PROBABILITY = 0.01
+
+
+def idempotency_db():
+    return str(getattr(settings, 'IDEMPOTENCY_DB', settings.BASE_DIR / 'idempotency.sqlite3'))
+
+
+def _connection():
+    return connect(idempotency_db(), SCHEMA)
+
+
+def claim(key, fingerprint, now=None):
+    """
+    :return: None when the key is ours to run the request, else the (fingerprint, status, body) stored for it.
+        status is None while the request holding the key is still running.
+    """
+    now = time.time() if now is None else now
+    connection = _connection()
+    claimed = connection.execute(CLAIM, {
+        'key': key, 'fingerprint': fingerprint, 'now': now,
+        'ttl': getattr(settings, 'IDEMPOTENCY_TTL', 24 * 60 * 60),
+        'lock_timeout': getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 60),
+    }).fetchone()
+    if random.random() < CLEANUP_PROBABILITY:
+        cleanup(now)
+    if claimed is not None:
+        return None
+    stored = connection.execute(
+        'SELECT fingerprint, status, body FROM idempotency_key WHERE key = ?', (key,)
+    ).fetchone()
+    # deleted by a cleanup in between: report it as in progress, the client retries
+    return stored if stored is not None else (fingerprint, None, None)
+
+
+def save(key, status_code, body, now=None):
+    now = time.time() if now is None else now
+    _connection().execute(
+        'UPDATE idempotency_key SET status = ?, body = ?, expires = ? WHERE key = ?',
+        (status_code, body, now + getattr(settings, 'IDEMPOTENCY_TTL', 24 * 60 * 60), key),
+    )
+
+
+def release(key):
+    _connection().execute('DELETE FROM idempotency_key WHERE key = ?', (key,))
+
+
+def cleanup(now=None):
+    now = time.time() if now is None else now
+    connection = _connection()
+    connection.execute('DELETE FROM idempotency_key WHERE expires < ?', (now,))
+    # bounded: the oldest keys go first once there are too many
+    connection.execute(
+        'DELETE FROM idempotency_key WHERE key IN '
+        '(SELECT key FROM idempotency_key ORDER BY created DESC LIMIT -1 OFFSET ?)',
+        (getattr(settings, 'IDEMPOTENCY_MAX_KEYS', 100000),),
+    )
+
+
+def reset_idempotency_keys():
+    _connection().execute('DELETE FROM idempotency_key')
+
+
+def fingerprint(request):
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def idempotent(view):
+    """
+    Makes the POST requests of a view safe to retry with an Idempotency-Key header. Put it under @api_view and the
+    permission/throttle decorators so the request is authenticated and allowed before the key is looked at.
+    - first request with a key: runs the view, keeps a successful response for IDEMPOTENCY_TTL seconds
+    - same key again: the stored response, with an Idempotent-Replayed: true header. The view does not run
+    - same key while the first request is running: 409, retry later
+    - same key with another path or body: 422
+    Requests without the header are not affected.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if request.method != 'POST' or key is None:
+            return view(request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response({'detail': f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters.'},
+                            status.HTTP_400_BAD_REQUEST)
+
+        key = f'{request.user.pk}:{key}'
+        request_fingerprint = fingerprint(request)
+        stored = claim(key, request_fingerprint)
+        if stored is not None:
+            stored_fingerprint, status_code, body = stored
+            if stored_fingerprint != request_fingerprint:
+                return Response({'detail': f'This {HEADER} was used with another request.'},
+                                status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if status_code is None:
+                return Response({'detail': f'A request with this {HEADER} is in progress.'},
+                                status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
+            return Response(json.loads(body), status_code, headers={'Idempotent-Replayed': 'true'})
+
+        try:
+            response = view(request, *args, **kwargs)
+        except BaseException:
+            release(key)
+            raise
+        if status.is_success(response.status_code):
+            save(key, response.status_code, json.dumps(response.data, cls=JSONEncoder))
+        else:
+            release(key)
+        return response
+
+    return wrapper
@@ -0,0 +1,150 @@
+import contextvars
+import functools
+import json
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework import serializers
+
+from .permissions import IsManager, IsCustomer
+
+logger = logging.getLogger('LittleLemonAPI.timing')
+
+# RequestTimings of the request being served. Context variables follow the request into threads and async code.
+_current = contextvars.ContextVar('littlelemon_request_timings', default=None)
+
+
+class RequestTimings:
+    """
+    Time spent per phase of one request, in seconds, plus the number of queries.
+    """
+
+    def __init__(self):
+        self.durations = {}
+        self.queries = 0
+        self._active = set()
+
+    def add(self, name, duration):
+        self.durations[name] = self.durations.get(name, 0) + duration
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook, sees every query of every connection used by the request
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add('db', time.perf_counter() - start)
+            self.queries += 1
+
+    def server_timing(self):
+        """
+        Server-Timing header value, e.g. db;dur=3.2;desc="4 queries", view;dur=8.1, total;dur=9.0
+        """
+        metrics = []
+        for name, duration in self.durations.items():
+            metric = f'{name};dur={duration * 1000:.1f}'
+            if name == 'db':
+                metric += f';desc="{self.queries} queries"'
+            metrics.append(metric)
+        return ', '.join(metrics)
+
+
+@contextmanager
+def timed(name):
+    """
+    Adds the time spent in the block to `name` for the current request. Nested blocks of the same name are counted
+    once, e.g. a nested serializer inside the serializer of the response. Does nothing outside an instrumented request.
+    """
+    timings = _current.get()
+    if timings is None or name in timings._active:
+        yield
+        return
+    timings._active.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings._active.discard(name)
+        timings.add(name, time.perf_counter() - start)
+
+
+def _timed_method(cls, method_name, name):
+    method = getattr(cls, method_name)
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with timed(name):
+            return method(*args, **kwargs)
+
+    setattr(cls, method_name, wrapper)
+
+
+_instrumented = False
+
+
+def instrument():
+    """
+    Times serializers and the role based permission checks. Wraps the methods once, when the middleware is
+    enabled, so nothing is added to these code paths when SERVER_TIMING is off.
+    """
+    global _instrumented
+    if _instrumented:
+        return
+    _instrumented = True
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        _timed_method(cls, 'to_representation', 'serializer')
+        _timed_method(cls, 'run_validation', 'serializer')
+    for cls in (IsManager, IsCustomer):
+        _timed_method(cls, 'has_permission', 'permissions')
+
+
+class ServerTimingMiddleware:
+    """
+    Measures every request: total time, view time, serializer time, time in the IsManager/IsCustomer permission
+    checks, number of queries and SQL time. Sent back as a Server-Timing header (shown by browser dev tools) and
+    logged as one JSON line on the LittleLemonAPI.timing logger.
+
+    Opt-in with SERVER_TIMING = True in settings. When off, the middleware removes itself at startup.
+    Place it first in MIDDLEWARE so total covers the other middleware.
+    Queries run while a StreamingHttpResponse is consumed, after the middleware returns, are not counted.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SERVER_TIMING', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        instrument()
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings.execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        end = time.perf_counter()
+        if hasattr(request, '_view_start'):
+            # from the view being called to its response coming back through the middleware below this one
+            timings.add('view', end - request._view_start)
+        timings.add('total', end - start)
+
+        response['Server-Timing'] = timings.server_timing()
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': timings.queries,
+            **{f'{name}_ms': round(duration * 1000, 2) for name, duration in timings.durations.items()},
+        }))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._view_start = time.perf_counter()
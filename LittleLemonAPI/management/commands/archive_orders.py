@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.archive import archive_orders, DEFAULT_AFTER_DAYS, DEFAULT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = ('Moves the delivered orders older than --days, with their items, to the archive tables, one batch per '
+            'transaction. Archived orders stay readable through the API with ?history=true.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'ARCHIVE_AFTER_DAYS', DEFAULT_AFTER_DAYS),
+                            help='age of the orders to archive')
+        parser.add_argument('--batch-size', type=int,
+                            default=getattr(settings, 'ARCHIVE_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+                            help='orders per transaction')
+        parser.add_argument('--pause', type=float, default=0, help='seconds to sleep between batches')
+        parser.add_argument('--max-batches', type=int, help='stop after that many batches')
+
+    def handle(self, *args, **options):
+        archived = archive_orders(options['days'], options['batch_size'], options['pause'], options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} orders.'))
@@ -0,0 +1,78 @@
+import json
+import platform
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import override_settings
+from rest_framework.throttling import UserRateThrottle
+
+from LittleLemonAPI.benchmarking import DEFAULT_SCALE, ROUTES, Fixtures, run_route, compare
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks every /api/ route in process. Seeds the db at the given scale inside a transaction that is '
+            'rolled back, sends --requests requests per route and reports throughput, p50/p95/p99 latency and '
+            'queries per request. Results can be written as JSON and compared with a previous run.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--menu-items', type=int, default=DEFAULT_SCALE['menu_items'])
+        parser.add_argument('--users', type=int, default=DEFAULT_SCALE['users'], help='customers')
+        parser.add_argument('--carts', type=int, default=DEFAULT_SCALE['carts'], help='customers with a cart')
+        parser.add_argument('--orders', type=int, default=DEFAULT_SCALE['orders'])
+        parser.add_argument('--requests', type=int, default=50, help='requests per route')
+        parser.add_argument('--routes', nargs='+', help='only the routes whose name contains one of these')
+        parser.add_argument('--cold', action='store_true', help='empty the menu cache before every request')
+        parser.add_argument('--output', help='write the results to this JSON file')
+        parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='p95 increase flagged as a regression with --compare, 0.25 is 25%%')
+
+    # the test clients call the site 'testserver', only allowed while running tests
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def handle(self, *args, **options):
+        scale = {name: options[name] for name in DEFAULT_SCALE}
+        routes = [route for route in ROUTES
+                  if not options['routes'] or any(part in route.name for part in options['routes'])]
+        results = {
+            'scale': scale,
+            'requests': options['requests'],
+            'cold': options['cold'],
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'endpoints': {},
+        }
+
+        # every route would be throttled after 10 requests
+        UserRateThrottle.rate = '1000000/second'
+        try:
+            with transaction.atomic():
+                self.stdout.write(f'Seeding {scale}...')
+                fixtures = Fixtures(scale)
+                self.stdout.write(f"{'route':<22} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+                                  f"{'queries':>8}  statuses")
+                for route in routes:
+                    result = run_route(route, fixtures, options['requests'], cold=options['cold'])
+                    results['endpoints'][route.name] = result
+                    statuses = ' '.join(f'{code}x{count}' for code, count in result['statuses'].items())
+                    self.stdout.write(f"{route.name:<22} {result['rps']:>8.0f} {result['p50_ms']:>8.2f} "
+                                      f"{result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+                                      f"{result['queries']:>8}  {statuses}")
+                transaction.set_rollback(True)
+        finally:
+            del UserRateThrottle.rate
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options['compare']:
+            with open(options['compare']) as file:
+                regressions = compare(results, json.load(file), options['threshold'])
+            if regressions:
+                raise CommandError('Regressions:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regression.'))
@@ -0,0 +1,140 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User, Group
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client, AsyncClient, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.throttling import UserRateThrottle
+
+from LittleLemonAPI.benchmarking import percentile
+from LittleLemonAPI.models import MenuItem, Category, Cart, Order, OrderItem
+from LittleLemonAPI.roles import MANAGER
+
+# (name, user, path) the path is requested under /api/ (WSGI, DRF views) and /api/async/ (ASGI, async views)
+ROUTES = [
+    ('menu list', 'customer', 'menu-items/?perpage=20'),
+    ('menu cursor', 'customer', 'menu-items/?pagination=cursor&perpage=20&ordering=-price'),
+    ('menu item', 'customer', 'menu-items/{menuitem}'),
+    ('cart summary', 'customer', 'cart/menu-items?summary=true'),
+    ('orders', 'manager', 'orders/?perpage=20'),
+]
+
+
+class Command(BaseCommand):
+    help = ('Compares the read endpoints served by the WSGI handler (DRF views, one thread per concurrent request) '
+            'with the ASGI handler (async views, one event loop). Reports requests per second and p50/p99 latency. '
+            'Seeds benchmark users, menu items and orders then deletes them.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='requests per route and handler')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--items', type=int, default=200, help='menu items to seed')
+        parser.add_argument('--orders', type=int, default=100, help='orders to seed')
+
+    # the test clients call the site 'testserver', only allowed while running tests
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def handle(self, *args, **options):
+        # the benchmark would be throttled after 10 requests
+        UserRateThrottle.rate = '1000000/second'
+        try:
+            self.seed(options)
+            self.stdout.write(f"{'route':<13} {'handler':<8} {'rps':>8} {'p50 ms':>8} {'p99 ms':>8}")
+            for name, user, path in ROUTES:
+                path = path.format(menuitem=self.menuitem_id)
+                headers = {'Authorization': f'Token {self.tokens[user]}'}
+                for handler, run in (('wsgi', self.run_wsgi), ('asgi', self.run_asgi)):
+                    elapsed, timings = run(path, headers, options)
+                    self.stdout.write(f'{name:<13} {handler:<8} {len(timings) / elapsed:>8.0f} '
+                                      f'{percentile(timings, 50):>8.2f} {percentile(timings, 99):>8.2f}')
+        finally:
+            del UserRateThrottle.rate
+            self.cleanup()
+
+    def seed(self, options):
+        self.category = Category.objects.create(slug='asgi-benchmark', title='ASGI benchmark')
+        MenuItem.objects.bulk_create(
+            MenuItem(title=f'Benchmark item {i}', price=1 + i % 50, featured=False, category=self.category)
+            for i in range(options['items'])
+        )
+        menuitems = list(MenuItem.objects.filter(category=self.category))
+        self.menuitem_id = menuitems[0].pk
+
+        self.users = [
+            User.objects.create_user(username='asgi-benchmark-manager'),
+            User.objects.create_user(username='asgi-benchmark-customer'),
+        ]
+        manager, customer = self.users
+        manager.groups.add(Group.objects.get_or_create(name=MANAGER)[0])
+        self.tokens = {
+            'manager': Token.objects.create(user=manager).key,
+            'customer': Token.objects.create(user=customer).key,
+        }
+
+        # written directly rather than through checkout(): the benchmark orders must not reach the sales rollups,
+        # cleanup() deletes them without going through rollups.delete_order()
+        lines = [menuitems[i % 10:i % 10 + 3] for i in range(options['orders'])]
+        orders = Order.objects.bulk_create(
+            Order(user=customer, status=False, total=sum(menuitem.price for menuitem in order_lines),
+                  date=timezone.now())
+            for order_lines in lines
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, menuitem=menuitem, quantity=1, unit_price=menuitem.price, price=menuitem.price)
+            for order, order_lines in zip(orders, lines)
+            for menuitem in order_lines
+        )
+        # left in the cart for the cart summary route
+        for menuitem in menuitems[:5]:
+            Cart.objects.create(user=customer, menuitem=menuitem, quantity=2, unit_price=menuitem.price,
+                                price=menuitem.price * 2)
+
+    def cleanup(self):
+        users = [user for user in getattr(self, 'users', [])]
+        Order.objects.filter(user__in=users).delete()  # order items cascade
+        for user in users:
+            user.delete()  # cart and token cascade
+        MenuItem.objects.filter(category__slug='asgi-benchmark').delete()
+        Category.objects.filter(slug='asgi-benchmark').delete()
+
+    @staticmethod
+    def run_wsgi(path, headers, options):
+        client_headers = {f"HTTP_{name.upper().replace('-', '_')}": value for name, value in headers.items()}
+
+        def request(_):
+            start = time.perf_counter()
+            response = Client().get(f'/api/{path}', **client_headers)
+            assert response.status_code == 200, response.status_code
+            return (time.perf_counter() - start) * 1000
+
+        def close_connection(_):
+            connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            start = time.perf_counter()
+            timings = list(executor.map(request, range(options['requests'])))
+            elapsed = time.perf_counter() - start
+            list(executor.map(close_connection, range(options['concurrency'])))
+        return elapsed, timings
+
+    @staticmethod
+    def run_asgi(path, headers, options):
+        async def run():
+            client = AsyncClient()
+            semaphore = asyncio.Semaphore(options['concurrency'])
+
+            async def request():
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.get(f'/api/async/{path}', headers=headers)
+                    assert response.status_code == 200, response.status_code
+                    return (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            timings = await asyncio.gather(*(request() for _ in range(options['requests'])))
+            return time.perf_counter() - start, timings
+
+        return asyncio.run(run())
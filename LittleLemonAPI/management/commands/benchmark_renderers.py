@@ -0,0 +1,76 @@
+import statistics
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from LittleLemonAPI.models import MenuItem, Category, Order, OrderItem
+from LittleLemonAPI.renderers import FastJSONRenderer, orjson_available
+from LittleLemonAPI.serializers import MenuItemSerializer, OrderDetailSerializer
+
+
+class Command(BaseCommand):
+    help = ('Compares DRF\'s JSONRenderer with FastJSONRenderer on serialized MenuItem and OrderItem rows, as the '
+            'menu and order lists return them. Rows are built in memory, the database is not used.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1_000, 10_000, 100_000])
+        parser.add_argument('--repeat', type=int, default=5, help='renders per size, the median is reported')
+
+    def handle(self, *args, **options):
+        if not orjson_available():
+            raise CommandError('orjson is not installed, FastJSONRenderer falls back to JSONRenderer.')
+
+        self.stdout.write(f"{'rows':>8} {'data':<11} {'serialize ms':>13} {'json ms':>9} {'orjson ms':>10} "
+                          f"{'speedup':>8} {'MB':>7} {'rows/s orjson':>14}")
+        for size in options['sizes']:
+            for name, serializer in (('menu items', self.menu_items(size)), ('order items', self.order_items(size))):
+                start = time.perf_counter()
+                data = serializer.data  # a ReturnList, computed once
+                serialize = (time.perf_counter() - start) * 1000
+                json_ms, expected = self.time(lambda: JSONRenderer().render(data), options)
+                orjson_ms, rendered = self.time(lambda: FastJSONRenderer().render(data), options)
+                if rendered != expected:
+                    raise CommandError(f'FastJSONRenderer output differs from JSONRenderer on {name}.')
+                self.stdout.write(f'{size:>8} {name:<11} {serialize:>13.1f} {json_ms:>9.1f} {orjson_ms:>10.1f} '
+                                  f'{json_ms / orjson_ms:>7.1f}x {len(rendered) / 1e6:>7.2f} '
+                                  f'{size / orjson_ms * 1000:>14,.0f}')
+
+    @staticmethod
+    def time(function, options):
+        timings, result = [], None
+        for _ in range(options['repeat']):
+            start = time.perf_counter()
+            result = function()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings), result
+
+    @staticmethod
+    def menu_items(size):
+        # GET /api/menu-items/: menu items with their category nested
+        category = Category(id=1, slug='mains', title='Mains')
+        return MenuItemSerializer([
+            MenuItem(id=i, title=f'Greek salad {i}', price=Decimal(f'{i % 50 + 1}.50'), featured=i % 10 == 0,
+                     category=category)
+            for i in range(1, size + 1)
+        ], many=True)
+
+    @staticmethod
+    def order_items(size):
+        # GET /api/orders/: orders of 5 items with the menu item titles
+        menuitems = [MenuItem(id=i, title=f'Greek salad {i}', price=Decimal('12.50'), featured=False,
+                              category_id=1) for i in range(1, 6)]
+        date = datetime(2024, 1, 1, 12, 30, tzinfo=timezone.utc)
+        orders = []
+        for order_id in range(1, size // len(menuitems) + 1):
+            order = Order(id=order_id, user_id=1, delivery_crew_id=2, status=False, total=Decimal('62.50'), date=date)
+            # what Order.objects.with_items() prefetches
+            order._prefetched_objects_cache = {'orderitem_set': [
+                OrderItem(id=order_id * 10 + i, order=order, menuitem=menuitem, quantity=1, unit_price=menuitem.price,
+                          price=menuitem.price)
+                for i, menuitem in enumerate(menuitems)
+            ]}
+            orders.append(order)
+        return OrderDetailSerializer(orders, many=True)
@@ -0,0 +1,68 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from LittleLemonAPI.models import MenuItem, Category
+from LittleLemonAPI.search import search_menu_items, fts_available
+
+WORDS = [
+    'greek', 'salad', 'lemon', 'dessert', 'bruschetta', 'pasta', 'grilled', 'fish', 'chicken', 'lamb',
+    'souvlaki', 'feta', 'olive', 'spicy', 'roasted', 'garlic', 'house', 'special', 'vegan', 'platter',
+]
+
+
+class Command(BaseCommand):
+    help = ('Compares menu title search through the FTS5 index with the title__icontains scan. '
+            'Seeds the menu at each size inside a transaction that is rolled back, the database is left untouched.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10_000, 100_000, 1_000_000])
+        parser.add_argument('--repeat', type=int, default=20, help='runs per query, the median is reported')
+        parser.add_argument('--perpage', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            raise CommandError('The FTS5 menu index is not available on this database. Run migrations on SQLite.')
+
+        self.stdout.write(f"{'items':>9} {'query':<14} {'matches':>8} {'icontains ms':>13} {'fts ms':>9} "
+                          f"{'speedup':>8}")
+        for size in options['sizes']:
+            with transaction.atomic():
+                self.seed(size)
+                # common word, rare word, prefix of a word and a two word query
+                for search in ('salad', f'item{size - 1}', 'brus', 'greek sal'):
+                    icontains = self.time(MenuItem.objects.filter(title__icontains=search).order_by('id'),
+                                          options)
+                    menuitems, _ = search_menu_items(MenuItem.objects.all(), search)
+                    fts = self.time(menuitems.order_by('search_rank', 'id'), options)
+                    matches = menuitems.count()
+                    self.stdout.write(f'{size:>9} {search:<14} {matches:>8} {icontains:>13.2f} {fts:>9.2f} '
+                                      f'{icontains / fts:>7.1f}x')
+                transaction.set_rollback(True)
+
+    def seed(self, size):
+        rng = random.Random(size)
+        category = Category.objects.create(slug='benchmark', title='Benchmark')
+        batch = []
+        for i in range(size):
+            title = ' '.join(rng.sample(WORDS, 3)) + f' item{i}'
+            batch.append(MenuItem(title=title, price=rng.randint(100, 5000) / 100, featured=False,
+                                  category=category))
+            if len(batch) == 5000:
+                MenuItem.objects.bulk_create(batch)
+                batch = []
+        MenuItem.objects.bulk_create(batch)
+
+    @staticmethod
+    def time(queryset, options):
+        timings = []
+        for _ in range(options['repeat']):
+            start = time.perf_counter()
+            # what a page of /api/menu-items/?search= costs: Paginator COUNT(*) plus the first page
+            queryset.count()
+            list(queryset.values_list('id', flat=True)[:options['perpage']])
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
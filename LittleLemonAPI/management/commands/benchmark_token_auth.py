@@ -0,0 +1,52 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from LittleLemonAPI.authentication import CachedTokenAuthentication, invalidate_tokens
+
+
+class Command(BaseCommand):
+    help = ('Compares TokenAuthentication with CachedTokenAuthentication: authentication queries and time per '
+            'request for requests spread over --users users. Seeds users and tokens inside a transaction that is '
+            'rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--requests', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = User.objects.bulk_create(
+                User(username=f'auth-benchmark{i}') for i in range(options['users'])
+            )
+            tokens = [Token.objects.create(user=user).key for user in users]
+            rng = random.Random(0)
+            keys = [rng.choice(tokens) for _ in range(options['requests'])]
+            factory = APIRequestFactory()
+
+            self.stdout.write(f"{'authentication':<28} {'queries/request':>16} {'us/request':>11}")
+            invalidate_tokens()
+            for authentication in (TokenAuthentication(), CachedTokenAuthentication()):
+                queries = []
+
+                def count_query(execute, sql, params, many, context):
+                    queries.append(sql)
+                    return execute(sql, params, many, context)
+
+                with connection.execute_wrapper(count_query):
+                    start = time.perf_counter()
+                    for key in keys:
+                        request = Request(factory.get('/api/users/me', HTTP_AUTHORIZATION=f'Token {key}'))
+                        authentication.authenticate(request)
+                    elapsed = time.perf_counter() - start
+                self.stdout.write(f'{type(authentication).__name__:<28} {len(queries) / len(keys):>16.3f} '
+                                  f'{elapsed / len(keys) * 1e6:>11.1f}')
+            invalidate_tokens()
+            transaction.set_rollback(True)
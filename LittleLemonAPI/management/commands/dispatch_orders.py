@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.dispatch import dispatch_orders, DEFAULT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = ('Assigns unassigned orders to the least loaded delivery crew members, oldest orders first. '
+            'Runs one cycle, or one cycle every --interval seconds with --loop.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=getattr(settings, 'DISPATCH_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+                            help='orders per cycle')
+        parser.add_argument('--max-open-orders', type=int,
+                            default=getattr(settings, 'DISPATCH_MAX_OPEN_ORDERS', None),
+                            help='open orders a crew member can hold')
+        parser.add_argument('--loop', action='store_true', help='keep dispatching until interrupted')
+        parser.add_argument('--interval', type=float, default=5, help='seconds between cycles with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            # a full batch means more orders are waiting, go again without sleeping
+            while True:
+                assignments = dispatch_orders(options['batch_size'], options['max_open_orders'])
+                assigned = sum(len(order_ids) for order_ids in assignments.values())
+                if assigned:
+                    self.stdout.write(f'Assigned {assigned} orders to {len(assignments)} delivery crew members.')
+                if assigned < options['batch_size']:
+                    break
+            if not options['loop']:
+                return
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                return
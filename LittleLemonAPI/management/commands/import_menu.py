@@ -0,0 +1,43 @@
+import json
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from LittleLemonAPI.menu_import import import_menu, ImportFormatError, FORMATS
+
+
+class Command(BaseCommand):
+    help = ('Creates or updates menu items from a JSON array, JSONL or CSV file. Items are matched on title and '
+            'category. The file is streamed and imported in batches. Same rules as POST /api/menu-items/import')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="file to import, '-' for stdin")
+        parser.add_argument('--format', choices=FORMATS,
+                            help='defaults to the file extension (.json, .jsonl/.ndjson, .csv)')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format']
+        if fmt is None:
+            suffix = Path(path).suffix.lower().lstrip('.')
+            fmt = {'ndjson': 'jsonl'}.get(suffix, suffix)
+            if fmt not in FORMATS:
+                raise CommandError('Cannot tell the format from the file name, use --format.')
+
+        try:
+            if path == '-':
+                report = import_menu(sys.stdin.buffer, fmt, batch_size=options['batch_size'])
+            else:
+                with open(path, 'rb') as stream:
+                    report = import_menu(stream, fmt, batch_size=options['batch_size'])
+        except OSError as error:
+            raise CommandError(error)
+        except ImportFormatError as error:
+            self.stdout.write(json.dumps(error.report.as_dict(), indent=2))
+            raise CommandError(error)
+
+        self.stdout.write(json.dumps(report.as_dict(), indent=2))
+        if report.failed:
+            self.stderr.write(self.style.WARNING(f'{report.failed} rows were not imported.'))
@@ -0,0 +1,45 @@
+import pstats
+from collections import Counter
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from LittleLemonAPI.profiling import profile_dir
+
+SORT_KEYS = ('cumulative', 'tottime', 'ncalls')
+
+
+class Command(BaseCommand):
+    help = ('Aggregates the request profiles written by the profiling hook (PROFILE_SAMPLE_RATE or the X-Profile '
+            'header) and prints the top functions across all of them.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help='directory of .prof files, PROFILE_DIR by default')
+        parser.add_argument('--view', help='only the profiles of this view, e.g. order_manager')
+        parser.add_argument('--method', help='only the profiles of this HTTP method, e.g. GET')
+        parser.add_argument('--sort', choices=SORT_KEYS, default='cumulative')
+        parser.add_argument('--limit', type=int, default=30, help='number of functions to print')
+
+    def handle(self, *args, **options):
+        directory = Path(options['dir']) if options['dir'] else profile_dir()
+        profiles = Counter()
+        files = []
+        for path in sorted(directory.glob('*.prof')):
+            # <time>-<METHOD>-<view>-<pid>-<n>.prof, see profiling.profile_path()
+            _, method, view, *_ = path.stem.split('-')
+            if options['view'] and view != options['view']:
+                continue
+            if options['method'] and method != options['method'].upper():
+                continue
+            profiles[f'{method} {view}'] += 1
+            files.append(str(path))
+        if not files:
+            raise CommandError(f'No matching profiles in {directory}.')
+
+        self.stdout.write(f'{len(files)} profiles:')
+        for request, count in profiles.most_common():
+            self.stdout.write(f'  {count:>6}  {request}')
+        self.stdout.write('')
+
+        stats = pstats.Stats(*files, stream=self.stdout)
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(options['limit'])
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = ('Recomputes the daily sales rollups read by /api/reports/sales from every order, archived ones included. '
+            'Use it to backfill after deploying the rollup tables or to repair them.')
+
+    def handle(self, *args, **options):
+        days, menuitem_days = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {days} daily sales rows and {menuitem_days} daily menu item sales rows.'
+        ))
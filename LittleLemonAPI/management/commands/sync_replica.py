@@ -0,0 +1,49 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+class Command(BaseCommand):
+    help = ('Copies the primary SQLite database into the replica stand-in databases, once or every --interval '
+            'seconds with --loop. The delay between copies plays the part of replication lag.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', action='append',
+                            help='replica alias to refresh, can be repeated. All of DATABASE_REPLICAS by default')
+        parser.add_argument('--loop', action='store_true', help='keep copying until interrupted')
+        parser.add_argument('--interval', type=float, default=1, help='seconds between copies with --loop')
+
+    def handle(self, *args, **options):
+        aliases = options['database'] or getattr(settings, 'DATABASE_REPLICAS', [])
+        if not aliases:
+            raise CommandError('No replica: set DATABASE_REPLICAS or pass --database.')
+        for alias in aliases:
+            if alias not in settings.DATABASES or alias == DEFAULT_DB_ALIAS:
+                raise CommandError(f'{alias} is not a replica database.')
+            if settings.DATABASES[alias]['ENGINE'] != 'django.db.backends.sqlite3':
+                raise CommandError(f'{alias} is not a SQLite database, use the replication of its server instead.')
+
+        while True:
+            for alias in aliases:
+                self.copy(settings.DATABASES[DEFAULT_DB_ALIAS]['NAME'], settings.DATABASES[alias]['NAME'])
+                self.stdout.write(f'Copied the primary database to {alias}.')
+            if not options['loop']:
+                return
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                return
+
+    @staticmethod
+    def copy(source, target):
+        # the backup api copies a consistent snapshot while the primary keeps taking writes
+        source = sqlite3.connect(str(source))
+        target = sqlite3.connect(str(target))
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
@@ -0,0 +1,81 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .caching import LRUCache
+from .models import MenuItem, Category
+from .routers import pin_to_primary, CATALOG_PIN
+from .shared_state import get_counter, bump_counter
+
+CATALOG_VERSION_KEY = 'catalog-version'
+
+# Serialized menu responses keyed on (catalog version, normalized query params).
+# Entries of an old version are never read again and simply age out of the LRU.
+menu_cache = LRUCache(
+    maxsize=getattr(settings, 'MENU_CACHE_SIZE', 512),
+    ttl=getattr(settings, 'MENU_CACHE_TTL', 300),
+)
+
+# query param -> default. Applied before building the key so ?page=1 and no page share an entry.
+MENU_QUERY_DEFAULTS = {
+    'page': '1',
+    'perpage': '2',
+}
+
+
+def catalog_version():
+    """
+    Current version of the menu catalog.
+    It lives in the shared state store so a manager's edit served by one worker invalidates the cached menu of every
+    worker of the host, see shared_state.py
+    """
+    return get_counter(CATALOG_VERSION_KEY)
+
+
+async def acatalog_version():
+    """
+    catalog_version() for async views.
+    """
+    return await sync_to_async(get_counter)(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    """
+    Invalidates every cached menu response. Call after writes that bypass model signals (bulk_create, update()).
+    """
+    bump_counter(CATALOG_VERSION_KEY)
+    pin_to_primary(CATALOG_PIN)  # the replicas may not have the change yet
+
+
+def _menu_cache_key(kind, version, query_params, kwargs):
+    params = dict(MENU_QUERY_DEFAULTS) if kind == 'list' else {}
+    for name, value in (query_params or {}).items():
+        value = value.strip()
+        if value:
+            params[name] = value.lower() if name == 'search' else value
+    return (kind, version, tuple(sorted(params.items())), tuple(sorted(kwargs.items())))
+
+
+def menu_cache_key(kind, query_params=None, **kwargs):
+    """
+    :param kind: 'list' or 'item'
+    :param query_params: request.query_params. Normalized: defaults applied, blanks dropped, sorted.
+    :param kwargs: extra key parts e.g. pk
+    """
+    return _menu_cache_key(kind, catalog_version(), query_params, kwargs)
+
+
+async def amenu_cache_key(kind, query_params=None, **kwargs):
+    """
+    menu_cache_key() for async views. Sync and async views share the cached entries built from the same key.
+    """
+    return _menu_cache_key(kind, await acatalog_version(), query_params, kwargs)
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def catalog_changed(sender, **kwargs):
+    bump_catalog_version()
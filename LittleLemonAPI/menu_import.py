@@ -0,0 +1,249 @@
+import codecs
+import csv
+import json
+
+from django.db import transaction
+from django.db.models import Q
+
+from .menu_cache import bump_catalog_version
+from .models import MenuItem, Category
+from .serializers import MenuItemImportSerializer
+
+FORMATS = ('json', 'jsonl', 'csv')
+
+# Content-Type -> format for the import endpoint
+CONTENT_TYPES = {
+    'application/json': 'json',
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+    'application/x-jsonlines': 'jsonl',
+    'text/csv': 'csv',
+}
+
+CHUNK_SIZE = 64 * 1024
+MAX_ROW_SIZE = 1024 * 1024  # a single JSON row larger than this is rejected instead of buffered
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportFormatError(Exception):
+    """
+    The input can't be parsed any further. Rows read before the error are already imported, see `report`.
+    """
+    report = None
+
+
+# Streaming parsers. Each yields (row number, row) and only keeps the current chunk/row in memory.
+
+def iter_text(stream, chunk_size=CHUNK_SIZE):
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='strict')
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        try:
+            yield decoder.decode(chunk)
+        except UnicodeDecodeError:
+            raise ImportFormatError('Input is not valid UTF-8.')
+    yield decoder.decode(b'', final=True)
+
+
+def iter_lines(stream):
+    buffer = ''
+    for text in iter_text(stream):
+        buffer += text
+        start = 0
+        while True:
+            end = buffer.find('\n', start)
+            if end == -1:
+                break
+            yield buffer[start:end + 1]
+            start = end + 1
+        buffer = buffer[start:]
+    if buffer:
+        yield buffer
+
+
+def iter_csv(stream):
+    reader = csv.DictReader(iter_lines(stream))
+    try:
+        for number, row in enumerate(reader, start=1):
+            # a blank cell is a value left out, e.g. featured falls back to its default instead of failing the row
+            yield number, {
+                name: value for name, value in row.items() if not isinstance(value, str) or value.strip()
+            }
+    except csv.Error as error:
+        raise ImportFormatError(f'CSV error: {error}')
+
+
+def iter_jsonl(stream):
+    number = 0
+    for line in iter_lines(stream):
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, ValueError('Invalid JSON.')
+
+
+def iter_json_array(stream):
+    """
+    Decodes a top level JSON array one element at a time.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = finished = False
+    number = 0
+    for text in iter_text(stream):
+        buffer = buffer[position:] + text
+        position = 0
+        while not finished:
+            # skip whitespace and separators between elements
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position == len(buffer):
+                break  # need more data
+            if not started:
+                if buffer[position] != '[':
+                    raise ImportFormatError('Expected a JSON array.')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                finished = True
+                break
+            try:
+                row, position = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if len(buffer) - position > MAX_ROW_SIZE:
+                    raise ImportFormatError(f'Invalid JSON after row {number}.')
+                break  # incomplete element, need more data
+            number += 1
+            yield number, row
+    if not finished:
+        raise ImportFormatError(f'Invalid or truncated JSON array after row {number}.')
+
+
+PARSERS = {
+    'json': iter_json_array,
+    'jsonl': iter_jsonl,
+    'csv': iter_csv,
+}
+
+
+# Validation and upsert
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, row_number, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': self.errors,  # at most MAX_REPORTED_ERRORS
+        }
+
+
+def resolve_categories(references):
+    """
+    One query for all the category ids/slugs referenced in a batch.
+    :return: dict reference -> category id
+    """
+    ids = {int(reference) for reference in references if reference.isdigit()}
+    slugs = {reference for reference in references if not reference.isdigit()}
+    resolved = {}
+    for category_id, slug in Category.objects.filter(Q(id__in=ids) | Q(slug__in=slugs)).values_list('id', 'slug'):
+        if category_id in ids:
+            resolved[str(category_id)] = category_id
+        if slug in slugs:
+            resolved[slug] = category_id
+    return resolved
+
+
+def import_batch(rows, report):
+    """
+    Validates a batch of rows and upserts the valid ones keyed on (title, category).
+    Queries per batch: categories, existing items and one INSERT ... ON CONFLICT DO UPDATE.
+    """
+    valid = []
+    for number, row in rows:
+        if not isinstance(row, dict):
+            report.add_error(number, {'non_field_errors': [str(row) if isinstance(row, Exception) else
+                                                           'Expected an object.']})
+            continue
+        serializer = MenuItemImportSerializer(data=row)
+        if serializer.is_valid():
+            valid.append((number, serializer.validated_data))
+        else:
+            report.add_error(number, serializer.errors)
+
+    categories = resolve_categories({data['category'] for _, data in valid})
+    items = {}  # (title, category_id) -> validated data. A title repeated in the batch: last row wins
+    for number, data in valid:
+        category_id = categories.get(data['category'])
+        if category_id is None:
+            report.add_error(number, {'category': [f"Category '{data['category']}' does not exist."]})
+            continue
+        items[(data['title'], category_id)] = data
+
+    if not items:
+        return
+
+    with transaction.atomic():
+        # only tells created from updated in the report, the upsert itself relies on the unique constraint
+        existing = set(MenuItem.objects.filter(
+            category_id__in={category_id for _, category_id in items},
+            title__in={title for title, _ in items},
+        ).values_list('title', 'category_id'))
+        MenuItem.objects.bulk_create(
+            [
+                MenuItem(title=title, category_id=category_id, price=data['price'], featured=data['featured'])
+                for (title, category_id), data in items.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['title', 'category'],
+            update_fields=['price', 'featured'],
+        )
+    updated = len(existing & items.keys())
+    report.updated += updated
+    report.created += len(items) - updated
+
+
+def import_menu(stream, fmt, batch_size=500):
+    """
+    Imports menu items from a binary stream (uploaded request body, open file).
+    Rows are parsed, validated and upserted `batch_size` at a time, the input is never fully loaded in memory.
+    :param stream: object with a read(size) method returning bytes
+    :param fmt: one of FORMATS
+    :return: ImportReport
+    :raises ImportFormatError: the input can't be parsed. Batches before the error are kept.
+    """
+    report = ImportReport()
+    batch = []
+    try:
+        for row in PARSERS[fmt](stream):
+            batch.append(row)
+            if len(batch) == batch_size:
+                import_batch(batch, report)
+                batch = []
+        import_batch(batch, report)
+    except ImportFormatError as error:
+        error.report = report  # what was imported before the input broke
+        raise
+    finally:
+        # bulk_create/bulk_update don't send the signals that invalidate the cached menu
+        if report.created or report.updated:
+            bump_catalog_version()
+    return report
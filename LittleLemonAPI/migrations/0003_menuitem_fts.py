@@ -0,0 +1,72 @@
+from django.db import migrations, transaction, OperationalError
+
+FTS_TABLE = 'LittleLemonAPI_menuitem_fts'
+MENUITEM_TABLE = 'LittleLemonAPI_menuitem'
+
+CREATE_SQL = [
+    f'''CREATE VIRTUAL TABLE "{FTS_TABLE}" USING fts5(
+        title, content='{MENUITEM_TABLE}', content_rowid='id', tokenize='unicode61'
+    )''',
+    f'''CREATE TRIGGER "{FTS_TABLE}_ai" AFTER INSERT ON "{MENUITEM_TABLE}" BEGIN
+        INSERT INTO "{FTS_TABLE}"(rowid, title) VALUES (new.id, new.title);
+    END''',
+    f'''CREATE TRIGGER "{FTS_TABLE}_ad" AFTER DELETE ON "{MENUITEM_TABLE}" BEGIN
+        INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}", rowid, title) VALUES ('delete', old.id, old.title);
+    END''',
+    f'''CREATE TRIGGER "{FTS_TABLE}_au" AFTER UPDATE OF title ON "{MENUITEM_TABLE}" BEGIN
+        INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}", rowid, title) VALUES ('delete', old.id, old.title);
+        INSERT INTO "{FTS_TABLE}"(rowid, title) VALUES (new.id, new.title);
+    END''',
+    # index the rows that already exist
+    f'''INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}") VALUES ('rebuild')''',
+]
+
+DROP_SQL = [
+    f'DROP TRIGGER IF EXISTS "{FTS_TABLE}_ai"',
+    f'DROP TRIGGER IF EXISTS "{FTS_TABLE}_ad"',
+    f'DROP TRIGGER IF EXISTS "{FTS_TABLE}_au"',
+    f'DROP TABLE IF EXISTS "{FTS_TABLE}"',
+]
+
+
+def fts5_supported(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    try:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute('CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)')
+            cursor.execute('DROP TABLE temp.fts5_probe')
+    except OperationalError:  # no such module: fts5
+        return False
+    return True
+
+
+def create_fts(apps, schema_editor):
+    """
+    Full text index on MenuItem.title kept in sync by triggers, so bulk_create and update() are covered too.
+    Skipped on other databases, search falls back to icontains there. See search.py
+    Note: triggers are dropped if a later migration makes Django rebuild the menuitem table on SQLite, re-run this
+    in such a migration.
+    """
+    if not fts5_supported(schema_editor.connection):
+        return
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0002_alter_orderitem_order'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
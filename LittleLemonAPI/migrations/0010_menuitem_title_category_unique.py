@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-17 19:15
+
+import importlib
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+menuitem_fts = importlib.import_module('LittleLemonAPI.migrations.0003_menuitem_fts')
+
+TITLE_MAX_LENGTH = 255
+
+
+def rename_duplicates(apps, schema_editor):
+    """
+    Items sharing a title within a category would break the constraint. The oldest keeps its title, the others get
+    their id appended, e.g. 'Soup (42)'. Renamed rather than deleted: carts and orders may reference them.
+    """
+    MenuItem = apps.get_model('LittleLemonAPI', 'MenuItem')
+    duplicates = (MenuItem.objects.values('title', 'category').annotate(count=Count('id'), keep=Min('id'))
+                  .filter(count__gt=1))
+    for duplicate in duplicates:
+        menuitems = MenuItem.objects.filter(title=duplicate['title'], category=duplicate['category'])
+        for menuitem in menuitems.exclude(id=duplicate['keep']):
+            suffix = f' ({menuitem.id})'
+            menuitem.title = menuitem.title[:TITLE_MAX_LENGTH - len(suffix)] + suffix
+            menuitem.save(update_fields=['title'])
+
+
+def restore_fts_triggers(apps, schema_editor):
+    """
+    Adding or removing the constraint rebuilds the menuitem table on SQLite, which drops the triggers of
+    0003_menuitem_fts. The index itself is kept: ids don't change.
+    """
+    connection = schema_editor.connection
+    if menuitem_fts.FTS_TABLE not in connection.introspection.table_names():
+        return
+    for sql in menuitem_fts.DROP_SQL[:-1] + menuitem_fts.CREATE_SQL[1:-1]:  # triggers only
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0009_menuitem_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicates, migrations.RunPython.noop),
+        migrations.RunPython(migrations.RunPython.noop, restore_fts_triggers),
+        migrations.AddConstraint(
+            model_name='menuitem',
+            constraint=models.UniqueConstraint(fields=('title', 'category'), name='menuitem_title_category_unique'),
+        ),
+        migrations.RunPython(restore_fts_triggers, migrations.RunPython.noop),
+    ]
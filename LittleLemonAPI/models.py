@@ -25,10 +25,52 @@ class MenuItem(models.Model):
     featured = models.BooleanField(db_index=True)
     category = models.ForeignKey(Category, on_delete=models.PROTECT)
 
+    # menu filters narrow on category or featured then range/sort on price. See filters.py
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', 'price'], name='menuitem_category_price_idx'),
+            models.Index(fields=['featured', 'price'], name='menuitem_featured_price_idx'),
+        ]
+        # the key the menu import upserts on. See menu_import.py
+        constraints = [
+            models.UniqueConstraint(fields=['title', 'category'], name='menuitem_title_category_unique'),
+        ]
+
     def __str__(self):
         return self.title
 
 
+class Match(models.Lookup):
+    """
+    column MATCH query, FTS5 full text search restricted to that column.
+    """
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+class MenuItemSearch(models.Model):
+    """
+    The FTS5 index of the menu titles created by migration 0003, SQLite only. Read only: triggers keep it in sync
+    with MenuItem. Lets the ORM join it on rowid, filter with title__match and order by its bm25 `rank`.
+    See search.py
+    """
+    menuitem = models.OneToOneField(MenuItem, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+                                    db_constraint=False, related_name='search')
+    title = models.TextField()
+    rank = models.FloatField()  # hidden column of FTS5, lower is more relevant. Only set in a MATCH query
+
+    class Meta:
+        managed = False
+        db_table = 'LittleLemonAPI_menuitem_fts'
+
+
+MenuItemSearch._meta.get_field('title').register_lookup(Match)
+
+
 class Cart(models.Model):
     """
     Cart models is a temporary storage where user can place items before placing an order.
@@ -49,17 +91,43 @@ class Cart(models.Model):
         return str(self.menuitem)
 
 
+class OrderQuerySet(models.QuerySet):
+    def with_items(self):
+        """
+        Prefetch the order items (and their menu item) in one extra query for the whole page of orders.
+        """
+        return self.prefetch_related(
+            models.Prefetch('orderitem_set', queryset=OrderItem.objects.select_related('menuitem'))
+        )
+
+
 class Order(models.Model):
     """
     Holds an order as a single item. An order item can have many Order items.
     """
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    objects = OrderQuerySet.as_manager()
+
+    # no single column index on the foreign keys, the composite indexes below start with them
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     # to refer to same model as foreign key twice in a model. Set on field to have related_name
-    delivery_crew = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='delivery_crew', null=True)
+    delivery_crew = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='delivery_crew', null=True,
+                                      db_index=False)
     status = models.BooleanField(db_index=True, default=0)
     total = models.DecimalField(max_digits=6, decimal_places=2)  # total price of all items in the field
     date = models.DateTimeField(db_index=True)  # mark when order was placed
 
+    # Order lists narrow on the customer or the delivery crew then walk the orders newest first, see order_manager.
+    # Dispatch reads the open orders of a crew member and the unassigned open orders oldest first, see dispatch.py
+    # The id that breaks date ties is the rowid, stored at the end of every index entry.
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'date'], name='order_user_date_idx'),
+            models.Index(fields=['delivery_crew', 'date'], name='order_crew_date_idx'),
+            models.Index(fields=['delivery_crew', 'status', 'date'], name='order_crew_status_date_idx'),
+            # delivered orders oldest first, see archive.py
+            models.Index(fields=['status', 'date'], name='order_status_date_idx'),
+        ]
+
 
 class OrderItem(models.Model):
     """
@@ -75,3 +143,78 @@ class OrderItem(models.Model):
     # One order can have one type of menuitem but quantity can vary
     class Meta:
         unique_together = ('order', 'menuitem')
+
+
+class ArchivedOrderQuerySet(models.QuerySet):
+    def with_items(self):
+        """
+        Same as OrderQuerySet.with_items() for archived orders.
+        """
+        return self.prefetch_related(
+            models.Prefetch('orderitem_set', queryset=ArchivedOrderItem.objects.select_related('menuitem'))
+        )
+
+
+class ArchivedOrder(models.Model):
+    """
+    Delivered order moved out of the Order table once it is old enough, see archive.py
+    Keeps the id it had as an Order. Read only: the API reads it when a caller asks for history.
+    """
+    objects = ArchivedOrderQuerySet.as_manager()
+
+    id = models.BigIntegerField(primary_key=True)  # id of the Order it was
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders', db_index=False)
+    delivery_crew = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='archived_deliveries', null=True,
+                                      db_index=False)
+    status = models.BooleanField(default=1)
+    total = models.DecimalField(max_digits=6, decimal_places=2)
+    date = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    # same access paths as the Order lists. The id is not a rowid here (a 64 bit column copied from Order), so it
+    # ends every index explicitly for the date ties
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'id'], name='archivedorder_date_id_idx'),
+            models.Index(fields=['user', 'date', 'id'], name='archivedorder_user_date_idx'),
+            models.Index(fields=['delivery_crew', 'date', 'id'], name='archivedorder_crew_date_idx'),
+        ]
+
+
+class ArchivedOrderItem(models.Model):
+    """
+    OrderItem of an archived order. The reverse accessor and lookups are named like OrderItem's
+    (order.orderitem_set, orderitem__price) so archived orders can go through the Order serializers.
+    """
+    id = models.BigIntegerField(primary_key=True)  # id of the OrderItem it was
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='orderitem_set',
+                              related_query_name='orderitem')
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    quantity = models.SmallIntegerField()
+    unit_price = models.DecimalField(max_digits=6, decimal_places=2)
+    price = models.DecimalField(max_digits=6, decimal_places=2)
+
+
+class DailySales(models.Model):
+    """
+    Rollup of the orders placed on a day. Kept up to date as orders are placed and deleted, see rollups.py
+    Reports read these rows instead of aggregating Order.
+    """
+    date = models.DateField(unique=True)
+    order_count = models.IntegerField(default=0)
+    items_sold = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+
+class DailyMenuItemSales(models.Model):
+    """
+    Rollup of the quantity and revenue of a menu item sold on a day.
+    """
+    date = models.DateField()
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    # one row per menu item per day. The unique index also serves date range reads
+    class Meta:
+        unique_together = ('date', 'menuitem')
@@ -0,0 +1,36 @@
+from django.db import transaction
+
+from .models import Order
+
+UPDATED = 'updated'
+NOT_FOUND = 'not_found'
+NOT_ASSIGNED = 'not_assigned'  # delivery crew updating an order assigned to someone else
+
+
+def bulk_update_orders(order_ids, changes, crew=None):
+    """
+    Sets the same fields on many orders in one transaction: one SELECT to tell the missing and the forbidden ids
+    apart, one UPDATE ... WHERE id IN (...) for the rest. Two queries whatever the number of orders.
+    :param order_ids: ids of the orders, duplicates are ignored
+    :param changes: dict of Order fields to set e.g. {'status': True, 'delivery_crew': user}
+    :param crew: only update the orders assigned to this user, for delivery crew updates
+    :return: list of (order id, UPDATED | NOT_FOUND | NOT_ASSIGNED) in the order of `order_ids`
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    with transaction.atomic():
+        # the rows stay locked until the UPDATE on databases that support it, SQLite locks on the write
+        assigned_to = dict(
+            Order.objects.select_for_update().filter(pk__in=order_ids).values_list('id', 'delivery_crew_id')
+        )
+        results = []
+        for order_id in order_ids:
+            if order_id not in assigned_to:
+                results.append((order_id, NOT_FOUND))
+            elif crew is not None and assigned_to[order_id] != crew.pk:
+                results.append((order_id, NOT_ASSIGNED))
+            else:
+                results.append((order_id, UPDATED))
+        updated = [order_id for order_id, result in results if result == UPDATED]
+        if updated and changes:
+            Order.objects.filter(pk__in=updated).update(**changes)
+    return results
@@ -0,0 +1,175 @@
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import replace_query_param
+
+MAX_PAGE_SIZE = 100
+
+
+class KeysetPaginator:
+    """
+    Keyset (seek) pagination over an ordering made of indexed columns.
+
+    Instead of OFFSET, each page continues from the ordering values of the last row seen, so every page costs the
+    same index range scan however deep the client goes. There is no COUNT(*).
+    The position is handed to the client as an opaque base64 cursor in the `cursor` query param.
+
+    The last field of the ordering must be unique (e.g. id) so that rows with equal values are never skipped.
+    e.g.
+        paginator = KeysetPaginator(ordering=('-date', '-id'))
+        page = paginator.paginate(Order.objects.all(), request)
+        return Response(paginator.get_paginated_data(OrderSerializer(page, many=True).data))
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'perpage'
+
+    def __init__(self, ordering, page_size=20, max_page_size=MAX_PAGE_SIZE):
+        self.ordering = tuple(ordering)
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+
+    # cursor encoding
+    @staticmethod
+    def encode_cursor(values, reverse=False):
+        payload = json.dumps({'v': values, 'r': int(reverse)}, default=str, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            values, reverse = payload['v'], bool(payload['r'])
+        except (binascii.Error, ValueError, KeyError, TypeError, UnicodeError):
+            raise NotFound('Invalid cursor.')
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound('Invalid cursor.')
+        return values, reverse
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.GET[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        # never trust the client with an unbounded page
+        return min(max(page_size, 1), self.max_page_size)
+
+    # ordering helpers
+    @staticmethod
+    def _field(ordering_field):
+        return ordering_field.lstrip('-')
+
+    @staticmethod
+    def _flip(ordering_field):
+        return ordering_field[1:] if ordering_field.startswith('-') else f'-{ordering_field}'
+
+    def _seek(self, ordering, values):
+        """
+        Builds the row-value comparison (a, b, c) > (x, y, z) as
+        a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        with > swapped for < on descending fields.
+        """
+        condition = Q()
+        equal = Q()
+        for ordering_field, value in zip(ordering, values):
+            field = self._field(ordering_field)
+            lookup = 'lt' if ordering_field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def _position(self, obj):
+        return [getattr(obj, self._field(ordering_field)) for ordering_field in self.ordering]
+
+    def _page_queryset(self, queryset, request):
+        """
+        Orders and seeks the queryset to the requested page. Fetches one extra row to know if there is anything
+        beyond this page.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        cursor = request.GET.get(self.cursor_query_param)  # GET works for DRF and plain django requests
+        self.values, self.reverse = self.decode_cursor(cursor) if cursor else (None, False)
+
+        ordering = tuple(self._flip(f) for f in self.ordering) if self.reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if self.values is not None:
+            queryset = queryset.filter(self._seek(ordering, self.values))
+        return queryset[:self.page_size + 1]
+
+    def _set_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if self.reverse:
+            rows.reverse()  # back to the requested ordering
+            self.has_next, self.has_previous = bool(rows), has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.values is not None and bool(rows)
+        self.page = rows
+        return rows
+
+    def paginate(self, queryset, request):
+        """
+        Returns the rows of the requested page as a list.
+        :param queryset: unordered queryset. Ordering is applied here.
+        :param request: DRF or django request. Reads `cursor` and `perpage` query params
+        :return: list of model instances
+        """
+        return self._set_page(list(self._page_queryset(queryset, request)))
+
+    async def apaginate(self, queryset, request):
+        """
+        paginate() for async views.
+        """
+        return self._set_page([row async for row in self._page_queryset(queryset, request)])
+
+    def _merge(self, pages):
+        """
+        Merges the rows of several tables seeked to the same position. Each holds at most page_size + 1 rows, the
+        first page_size + 1 of the merged rows are those of the union.
+        """
+        rows = [row for page in pages for row in page]
+        ordering = tuple(self._flip(f) for f in self.ordering) if self.reverse else self.ordering
+        # stable sorts, least significant field first
+        for ordering_field in reversed(ordering):
+            field = self._field(ordering_field)
+            rows.sort(key=lambda row: getattr(row, field), reverse=ordering_field.startswith('-'))
+        return rows[:self.page_size + 1]
+
+    def paginate_many(self, querysets, request):
+        """
+        paginate() over the union of several querysets with the same ordering fields, e.g. the orders and the
+        archived orders. One query per queryset. The unique last field must be unique across all of them.
+        """
+        return self._set_page(self._merge([list(self._page_queryset(queryset, request)) for queryset in querysets]))
+
+    async def apaginate_many(self, querysets, request):
+        """
+        paginate_many() for async views.
+        """
+        pages = []
+        for queryset in querysets:
+            pages.append([row async for row in self._page_queryset(queryset, request)])
+        return self._set_page(self._merge(pages))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self._position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        url = self.request.build_absolute_uri()
+        cursor = self.encode_cursor(self._position(self.page[0]), reverse=True)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
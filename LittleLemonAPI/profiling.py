@@ -0,0 +1,67 @@
+import cProfile
+import itertools
+import os
+import random
+import time
+from pathlib import Path
+
+from django.conf import settings
+from rest_framework.views import APIView
+
+PROFILE_HEADER = 'X-Profile'
+
+_counter = itertools.count()
+_installed = False
+
+
+def profile_dir():
+    return Path(getattr(settings, 'PROFILE_DIR', Path(settings.BASE_DIR) / 'profiles'))
+
+
+def profiling_enabled():
+    return getattr(settings, 'PROFILE_SAMPLE_RATE', 0) > 0 or getattr(settings, 'PROFILE_HEADER_TRIGGER', False)
+
+
+def should_profile(view, request):
+    """
+    Profile the views of this app: a PROFILE_SAMPLE_RATE fraction of their requests, plus the requests sent with
+    an X-Profile: 1 header when PROFILE_HEADER_TRIGGER is on.
+    """
+    if not type(view).__module__.startswith('LittleLemonAPI.'):
+        return False
+    if getattr(settings, 'PROFILE_HEADER_TRIGGER', False) and request.headers.get(PROFILE_HEADER) == '1':
+        return True
+    rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0)
+    return rate > 0 and random.random() < rate
+
+
+def profile_path(view, request):
+    # e.g. 20240101T120000-GET-order_manager-1234-7.prof, sortable by time and easy to filter by view
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{request.method}-{type(view).__name__}-{os.getpid()}-{next(_counter)}"
+    return profile_dir() / f'{name}.prof'
+
+
+def install():
+    """
+    Wraps APIView.dispatch so the selected requests run under cProfile. Every profile is written as a pstats file
+    in PROFILE_DIR and named in the X-Profile-File response header. Aggregate them with `manage.py profile_report`.
+    Called at startup only when profiling is enabled, otherwise dispatch is left untouched.
+    """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    dispatch = APIView.dispatch
+
+    def profiled_dispatch(self, request, *args, **kwargs):
+        if not should_profile(self, request):
+            return dispatch(self, request, *args, **kwargs)
+        profiler = cProfile.Profile()
+        response = profiler.runcall(dispatch, self, request, *args, **kwargs)
+        path = profile_path(self, request)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(path)
+        response['X-Profile-File'] = path.name
+        return response
+
+    APIView.dispatch = profiled_dispatch
@@ -0,0 +1,43 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional, JSON is rendered by DRF's renderer without it
+    orjson = None
+
+if orjson is not None:
+    # dict/list subclasses (ReturnDict, ReturnList, OrderedDict) are written as they are, without a copy.
+    # Dates and times go through DRF's encoder so the output is the same as JSONRenderer's, byte for byte.
+    OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def orjson_available():
+    return orjson is not None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer backed by orjson, several times faster on large list responses.
+    Same media type and output as JSONRenderer: compact, utf-8, \\u2028 and \\u2029 escaped. Values orjson does not
+    know (Decimal, datetime, lazy strings, querysets...) are converted by DRF's JSONEncoder.
+    Pretty printed responses (Accept: application/json; indent=4, the browsable API), ASCII only output
+    (UNICODE_JSON = False) and installs without orjson are rendered by JSONRenderer.
+    """
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {})):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        try:
+            ret = orjson.dumps(data, default=self.encoder.default, option=OPTIONS)
+        except orjson.JSONEncodeError:
+            # e.g. integers over 64 bits, which the json module handles
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            # same escaping as JSONRenderer, the output is valid javascript
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
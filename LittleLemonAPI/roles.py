@@ -0,0 +1,125 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User, Group
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+
+from .caching import LRUCache
+from .shared_state import get_counter, bump_counter
+
+MANAGER = 'Manager'
+DELIVERY_CREW = 'Delivery crew'
+
+# user id -> (generation, frozenset of group names). Shared by all requests served by this process.
+# Group changes made through the ORM bump the role generation, a counter shared by every worker process of the host
+# (see shared_state.py), and roles cached under an older generation are read again: a demoted manager loses their
+# rights at once in every worker. The ttl only bounds changes made outside of the ORM.
+ROLE_GENERATION_KEY = 'role-generation'
+_role_cache = LRUCache(
+    maxsize=getattr(settings, 'ROLE_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'ROLE_CACHE_TTL', 60),
+)
+
+
+def get_roles(user):
+    """
+    Group names of a user, from the process cache when possible.
+    :param user: User or AnonymousUser
+    :return: frozenset of group names. Empty for customers and anonymous users
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    generation = get_counter(ROLE_GENERATION_KEY)  # before the query, so a change made meanwhile is not hidden
+    cached = _role_cache.get(user.pk)
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+    roles = frozenset(user.groups.values_list('name', flat=True))
+    _role_cache.set(user.pk, (generation, roles))
+    return roles
+
+
+def request_roles(request):
+    """
+    Group names of the request user. Resolved at most once per request.
+    Use this in permission checks, views and serializers instead of user.groups.filter(...).exists()
+    """
+    roles = getattr(request, '_roles', None)
+    if roles is None:
+        roles = get_roles(request.user)
+        request._roles = roles
+    return roles
+
+
+async def aget_roles(user):
+    """
+    get_roles() for async views.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    generation = await sync_to_async(get_counter)(ROLE_GENERATION_KEY)
+    cached = _role_cache.get(user.pk)
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+    roles = frozenset([name async for name in user.groups.values_list('name', flat=True)])
+    _role_cache.set(user.pk, (generation, roles))
+    return roles
+
+
+async def arequest_roles(request):
+    """
+    request_roles() for async views. Once resolved, the sync helpers and permission classes read the memoized roles
+    without touching the db.
+    """
+    roles = getattr(request, '_roles', None)
+    if roles is None:
+        roles = await aget_roles(request.user)
+        request._roles = roles
+    return roles
+
+
+def is_manager(request):
+    return MANAGER in request_roles(request)
+
+
+def is_delivery_crew(request):
+    return DELIVERY_CREW in request_roles(request)
+
+
+def is_customer(request):
+    # Customers are users without any group
+    return request.user.is_authenticated and not request_roles(request)
+
+
+def invalidate_roles(user_id=None):
+    """
+    Drop the cached roles of one user, or of everybody when user_id is None, in every worker process.
+    """
+    if user_id is None:
+        _role_cache.clear()
+    else:
+        _role_cache.delete(user_id)
+    bump_counter(ROLE_GENERATION_KEY)  # the other processes read the roles they cached again
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Invalidates cached roles whenever group membership changes, e.g. user.groups.add(manager_group) in the group
+    management endpoints or an edit in the admin.
+    """
+    if not action.startswith('post_'):
+        return
+    if not reverse:  # user.groups.add/remove/clear
+        invalidate_roles(instance.pk)
+    elif pk_set:  # group.user_set.add/remove
+        for user_id in pk_set:
+            invalidate_roles(user_id)
+    else:  # group.user_set.clear()
+        invalidate_roles()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, **kwargs):
+    # renaming or deleting a group changes the roles of all its members
+    invalidate_roles()
@@ -0,0 +1,127 @@
+from django.db import connections, router, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem, DailySales, DailyMenuItemSales
+
+
+def _upsert(model, key_columns, add_columns, rows):
+    """
+    Adds `rows` to the rollup table of `model` in one statement:
+    INSERT ... ON CONFLICT (key) DO UPDATE SET column = column + excluded.column
+    Missing rows are created, existing ones are incremented (or decremented with negative values) in the db so
+    concurrent orders never overwrite each other's totals.
+    :param rows: list of tuples, key values then add values
+    """
+    if not rows:
+        return
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = key_columns + add_columns
+    placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    sql = (
+        f"INSERT INTO {table} ({', '.join(quote(column) for column in columns)}) "
+        f"VALUES {', '.join([placeholders] * len(rows))} "
+        f"ON CONFLICT ({', '.join(quote(column) for column in key_columns)}) DO UPDATE SET "
+        + ', '.join(f'{quote(column)} = {table}.{quote(column)} + excluded.{quote(column)}' for column in add_columns)
+    )
+    params = [connection.ops.adapt_unknown_value(value) for row in rows for value in row]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def apply_order(date, total, lines, sign=1):
+    """
+    Adds (sign=1) or removes (sign=-1) one order from the rollups. Two queries whatever the number of lines.
+    :param date: datetime the order was placed
+    :param total: order total
+    :param lines: iterable of (menuitem_id, quantity, price)
+    """
+    day = timezone.localdate(date)
+    lines = list(lines)
+    _upsert(
+        DailySales, ['date'], ['order_count', 'items_sold', 'revenue'],
+        [(day, sign, sign * sum(quantity for _, quantity, _ in lines), sign * total)],
+    )
+    _upsert(
+        DailyMenuItemSales, ['date', 'menuitem_id'], ['quantity', 'revenue'],
+        [(day, menuitem_id, sign * quantity, sign * price) for menuitem_id, quantity, price in lines],
+    )
+
+
+def record_order(order, lines):
+    """
+    Adds a newly placed order to the rollups. Call inside the transaction that creates the order.
+    """
+    apply_order(order.date, order.total, lines)
+
+
+def delete_order(order):
+    """
+    Deletes an order and takes it out of the rollups in one transaction.
+    """
+    with transaction.atomic():
+        lines = OrderItem.objects.filter(order=order).values_list('menuitem_id', 'quantity', 'price')
+        apply_order(order.date, order.total, lines, sign=-1)
+        order.delete()
+
+
+def rebuild_rollups():
+    """
+    Recomputes every rollup row from Order and OrderItem, plus the archived orders. For backfills and to repair drift.
+    :return: (number of days, number of day/menu item rows)
+    """
+    with transaction.atomic():
+        DailySales.objects.all().delete()
+        DailyMenuItemSales.objects.all().delete()
+
+        items_sold = dict(
+            OrderItem.objects.annotate(day=TruncDate('order__date')).values('day')
+            .annotate(quantity=Sum('quantity')).values_list('day', 'quantity')
+        )
+        days = DailySales.objects.bulk_create(
+            DailySales(date=row['day'], order_count=row['order_count'], revenue=row['revenue'],
+                       items_sold=items_sold.get(row['day'], 0))
+            for row in Order.objects.annotate(day=TruncDate('date')).values('day')
+            .annotate(order_count=Count('id'), revenue=Sum('total')).order_by().iterator()
+        )
+        menuitem_days = DailyMenuItemSales.objects.bulk_create(
+            (
+                DailyMenuItemSales(date=row['day'], menuitem_id=row['menuitem_id'], quantity=row['quantity'],
+                                   revenue=row['revenue'])
+                for row in OrderItem.objects.annotate(day=TruncDate('order__date')).values('day', 'menuitem_id')
+                .annotate(quantity=Sum('quantity'), revenue=Sum('price')).order_by().iterator()
+            ),
+            batch_size=1000,
+        )
+        if ArchivedOrder.objects.exists():
+            add_archived_orders()
+            return DailySales.objects.count(), DailyMenuItemSales.objects.count()
+    return len(days), len(menuitem_days)
+
+
+def add_archived_orders(batch_size=500):
+    """
+    Adds the archived orders to the rollups. Archiving leaves the rollups alone (see archive.py), only a rebuild,
+    which starts from the hot tables, needs this.
+    """
+    items_sold = dict(
+        ArchivedOrderItem.objects.annotate(day=TruncDate('order__date')).values('day')
+        .annotate(quantity=Sum('quantity')).values_list('day', 'quantity')
+    )
+    days = [
+        (row['day'], row['order_count'], items_sold.get(row['day'], 0), row['revenue'])
+        for row in ArchivedOrder.objects.annotate(day=TruncDate('date')).values('day')
+        .annotate(order_count=Count('id'), revenue=Sum('total')).order_by()
+    ]
+    menuitem_days = [
+        (row['day'], row['menuitem_id'], row['quantity'], row['revenue'])
+        for row in ArchivedOrderItem.objects.annotate(day=TruncDate('order__date')).values('day', 'menuitem_id')
+        .annotate(quantity=Sum('quantity'), revenue=Sum('price')).order_by()
+    ]
+    for i in range(0, len(days), batch_size):
+        _upsert(DailySales, ['date'], ['order_count', 'items_sold', 'revenue'], days[i:i + batch_size])
+    for i in range(0, len(menuitem_days), batch_size):
+        _upsert(DailyMenuItemSales, ['date', 'menuitem_id'], ['quantity', 'revenue'], menuitem_days[i:i + batch_size])
@@ -0,0 +1,133 @@
+import asyncio
+import contextvars
+import functools
+import hashlib
+import random
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .shared_state import pin, is_pinned
+
+# Read replicas.
+# Views decorated with @read_from_replica send their reads to one of the DATABASE_REPLICAS aliases. Everything
+# else, all writes, reads inside a transaction and reads after a write in the same request go to the primary.
+# After a write, the client's requests stay on the primary for REPLICA_STICKY_SECONDS so it reads its own writes
+# while the replicas catch up. Pins live in the shared state store so every worker of the host sees them.
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+CLIENT_PIN = 'primary:client:{}'
+# set when the menu changes, see menu_cache.py: nobody reads the menu from a replica that may not have the change
+# yet, and caches it under the new catalog version
+CATALOG_PIN = 'primary:catalog'
+
+
+class RoutingState:
+    def __init__(self, use_replica=False, pinned=False):
+        self.use_replica = use_replica
+        self.pinned = pinned  # read from the primary for the rest of the request
+        self.wrote = False
+
+
+_state = contextvars.ContextVar('littlelemon_routing_state', default=None)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def pin_to_primary(name):
+    """
+    Sends the reads guarded by `name` to the primary for REPLICA_STICKY_SECONDS, in every worker process.
+    """
+    if replicas():
+        pin(name, getattr(settings, 'REPLICA_STICKY_SECONDS', 5))
+
+
+def pinned_to_primary(name):
+    return bool(replicas()) and is_pinned(name)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.use_replica or state.pinned or not replicas():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS  # e.g. select_for_update, reads of a checkout
+        return random.choice(replicas())
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # replicas hold the same data
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
+
+
+def read_from_replica(view=None, *, unless_pinned=None):
+    """
+    Lets the reads of the GET requests of a view go to a replica. Put it above @api_view so authentication reads
+    are included. Other methods write, so they read from the primary too. Works with async views.
+    :param unless_pinned: name of a pin set with pin_to_primary(), reads go to the primary while it holds
+    """
+    if view is None:
+        return functools.partial(read_from_replica, unless_pinned=unless_pinned)
+
+    if asyncio.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            state = _state.get()
+            if state is not None and request.method in SAFE_METHODS:
+                state.use_replica = unless_pinned is None or not await sync_to_async(pinned_to_primary)(unless_pinned)
+            return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        state = _state.get()
+        if state is not None and request.method in SAFE_METHODS:
+            state.use_replica = unless_pinned is None or not pinned_to_primary(unless_pinned)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def client_key(request):
+    """
+    Identifies the client without authenticating it: its token, else its session, else its address. Hashed so
+    credentials never end up in cache keys.
+    """
+    client = (request.headers.get('Authorization') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+              or request.META.get('REMOTE_ADDR', ''))
+    return hashlib.sha256(client.encode()).hexdigest()
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Tracks the routing state of each request and pins clients that wrote to the primary for
+    REPLICA_STICKY_SECONDS. Does nothing when DATABASE_REPLICAS is empty.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replicas():
+            return self.get_response(request)
+        key = CLIENT_PIN.format(client_key(request))
+        state = RoutingState(pinned=is_pinned(key))
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            pin_to_primary(key)
+        return response
@@ -0,0 +1,49 @@
+import re
+
+from django.db import connections
+from django.db.models import F
+
+from .models import MenuItemSearch
+
+FTS_TABLE = MenuItemSearch._meta.db_table
+
+# alias -> bool. The FTS table is created by migration 0003 on SQLite builds with FTS5 only.
+_fts_available = {}
+
+
+def fts_available(using='default'):
+    if using not in _fts_available:
+        connection = connections[using]
+        _fts_available[using] = (
+            connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_available[using]
+
+
+def fts_query(search):
+    """
+    Turns user input into an FTS5 query where every word is a quoted prefix term, e.g. 'greek sal' ->
+    '"greek"* "sal"*'. Quoting keeps FTS5 operators in the input (AND, NEAR, -, ...) from being interpreted.
+    :return: the query or None if the input has no searchable word
+    """
+    words = re.findall(r'\w+', search)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_menu_items(menuitems, search):
+    """
+    Filters menu items on their title.
+    Uses the FTS5 index when available: prefix matching on each word, annotated with the bm25 relevance as
+    `search_rank` (lower is more relevant). Falls back to title__icontains on other databases.
+    :param menuitems: MenuItem queryset
+    :param search: raw value of the search query param
+    :return: (queryset, ranked) where ranked tells if the queryset can be ordered by search_rank
+    """
+    query = fts_query(search)
+    if query is None or not fts_available(menuitems.db):
+        return menuitems.filter(title__icontains=search), False
+
+    # joins the index on rowid so MATCH runs once for the whole query, the rank is FTS5's bm25 score
+    return menuitems.filter(search__title__match=query).alias(search_rank=F('search__rank')), True
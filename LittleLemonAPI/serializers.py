@@ -2,14 +2,21 @@ from rest_framework import serializers
 
 from django.contrib.auth.models import User
 
+from .roles import MANAGER, DELIVERY_CREW, request_roles
 from .models import (
     MenuItem,
     Category,
     Cart,
     OrderItem,
-    Order
+    Order,
+    DailySales,
 )
 
+# orders a bulk update can change at once
+MAX_BULK_ORDERS = 1000
+# most of one menu item a cart line can hold, whether set or reached by adding to the line
+MAX_CART_QUANTITY = 1000
+
 
 # User management and Authentication serializers
 
@@ -39,6 +46,17 @@ class MenuItemSerializer(serializers.ModelSerializer):
     #     return super().update(instance, validated_data, partial=True)
 
 
+class MenuItemImportSerializer(serializers.Serializer):
+    """
+    One row of a bulk menu import. Validation only, no queries: the category (id or slug) is resolved for the whole
+    batch at once and rows are upserted with bulk_create/bulk_update. See menu_import.py
+    """
+    title = serializers.CharField(max_length=255)
+    price = serializers.DecimalField(max_digits=6, decimal_places=2)
+    featured = serializers.BooleanField(default=False)
+    category = serializers.CharField(max_length=50)
+
+
 class CartSerializer(serializers.ModelSerializer):
     class Meta:
         model = Cart
@@ -48,20 +66,34 @@ class CartSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'price',
                             'unit_price']  # Cart Item Id/pk is added automatically.
 
-    def create(self, validated_data):
-        user = self.context['request'].user  # user context passed from view. Associates Cart item to user
-        menuitem = validated_data.pop('menuitem')  # Extract MenuItem ID from POST data
-        # menuitem = MenuItem.objects.get(pk=menuitem_id)
-        unit_price = menuitem.price  # Fetch unit_price from MenuItem model
 
-        quantity = validated_data.get('quantity')
-        price = unit_price * quantity  # Calculate price
+class CartLineDetailSerializer(CartSerializer):
+    """
+    Cart line with its menu item embedded. Needs Cart.objects.select_related('menuitem__category')
+    """
+    menuitem = MenuItemSerializer(read_only=True)
+
+
+class CartSummarySerializer(serializers.Serializer):
+    """
+    Everything the checkout screen shows: the lines with their menu item, the number of items and the subtotal.
+    """
+    items = CartLineDetailSerializer(many=True)
+    item_count = serializers.IntegerField()
+    subtotal = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+class CartLineSerializer(serializers.Serializer):
+    """
+    One {menuitem, quantity} pair of a cart POST/PATCH/PUT. Lines are applied in bulk, see carts.py
+    """
+    menuitem = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, max_value=MAX_CART_QUANTITY)
 
-        # Create Cart instance with calculated price
-        cart_item = Cart.objects.create(user=user, menuitem=menuitem, unit_price=unit_price, price=price,
-                                        **validated_data)
 
-        return cart_item
+class CartQuantitySerializer(CartLineSerializer):
+    # PATCH/PUT set the quantity, 0 removes the line
+    quantity = serializers.IntegerField(min_value=0, max_value=MAX_CART_QUANTITY)
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -70,6 +102,51 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'order', 'menuitem', 'quantity', 'unit_price', 'price']
 
 
+class OrderLineSerializer(OrderItemSerializer):
+    """
+    Order item nested inside an order listing. Menu item title comes from select_related('menuitem').
+    """
+    title = serializers.CharField(source='menuitem.title', read_only=True)
+
+    class Meta(OrderItemSerializer.Meta):
+        fields = ['id', 'menuitem', 'title', 'quantity', 'unit_price', 'price']
+
+
+class OrderDetailSerializer(serializers.ModelSerializer):
+    """
+    Read only order with its items nested.
+    Querysets passed here must prefetch the items, see Order.objects.with_items(), otherwise each order costs a query.
+    """
+    order_id = serializers.IntegerField(source='id', read_only=True)
+    order_items = OrderLineSerializer(source='orderitem_set', many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['order_id', 'user', 'delivery_crew', 'status', 'total', 'date', 'order_items']
+        read_only_fields = fields
+
+
+def validate_order_update(roles, data):
+    """
+    Fields an order update accepts depending on the user group. Shared by the single order PATCH and the bulk one.
+    Manager sends status, delivery_crew or both (only the fields sent are changed) while the
+    delivery_crew requires only the status field only
+    :param roles: groups of the user, see roles.request_roles
+    :param data: validated fields of the update
+    """
+    if MANAGER in roles:
+        # Manager can update status and delivery_crew fields, one at a time or together
+        if 'status' not in data and 'delivery_crew' not in data:
+            raise serializers.ValidationError("Status or delivery crew field is required for Manager")
+    elif DELIVERY_CREW in roles:
+        # Allow Delivery crew to update status field only
+        if 'status' not in data:
+            raise serializers.ValidationError("Status field is required for Delivery crew")
+        if 'delivery_crew' in data:
+            raise serializers.ValidationError("Delivery crew field not allowed for Delivery crew")
+            # Or handle this differently based on your requirements
+
+
 class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
@@ -79,26 +156,41 @@ class OrderSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
         """
-        Validate the data fields required to PATCH depending on user group.
-        Manager Requires status and delivery_crew field while the
-        delivery_crew requires only the status field only
+        Validate the data fields required to PATCH depending on user group. See validate_order_update
         :param data:
         :return:
         """
-        user = self.context['request'].user  # get user
-
-        if user.groups.filter(name='Manager').exists():
-            # Manager can update status and delivery_crew fields
-            if 'status' not in data:
-                raise serializers.ValidationError("Status field is required for Manager")
-            if 'delivery_crew' not in data:
-                raise serializers.ValidationError("Delivery crew field is required for Manager")
-        elif user.groups.filter(name='Delivery crew').exists():
-            # Allow Delivery crew to update status field only
-            if 'status' not in data:
-                raise serializers.ValidationError("Status field is required for Delivery crew")
-            if 'delivery_crew' in data:
-                raise serializers.ValidationError("Delivery crew field not allowed for Delivery crew")
-                # Or handle this differently based on your requirements
+        roles = request_roles(self.context['request'])  # get user groups, resolved once per request
+        validate_order_update(roles, data)
+        return data
 
+
+class OrderBulkUpdateSerializer(serializers.Serializer):
+    """
+    PATCH /api/orders/bulk payload: the ids of the orders and the fields to set on all of them.
+    Same field rules per group as a single order PATCH.
+    """
+    orders = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False,
+                                   max_length=MAX_BULK_ORDERS)
+    status = serializers.BooleanField(required=False)
+    delivery_crew = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), allow_null=True, required=False)
+
+    def validate(self, data):
+        roles = request_roles(self.context['request'])
+        validate_order_update(roles, data)
         return data
+
+
+# Reporting serializers. Read only, built from the rollup tables.
+
+class DailySalesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailySales
+        fields = ['date', 'order_count', 'items_sold', 'revenue']
+
+
+class MenuItemSalesSerializer(serializers.Serializer):
+    menuitem = serializers.IntegerField(source='menuitem_id')
+    title = serializers.CharField(source='menuitem__title')
+    quantity = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=12, decimal_places=2)
@@ -0,0 +1,87 @@
+import random
+import time
+
+from django.conf import settings
+
+from .sqlite_store import connect
+
+# State shared by every worker process of the host:
+# - version counters, e.g. the menu catalog version (menu_cache.py) and the token generation (authentication.py).
+#   A write bumps the counter in one process and every other process sees the new value on its next read, so
+#   process-local caches keyed on it are invalidated everywhere at once.
+# - pins that hold for a few seconds, e.g. the clients that must read from the primary (routers.py)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shared_counter (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS shared_pin (
+    name TEXT PRIMARY KEY,
+    until REAL NOT NULL  -- unix time the pin expires
+) WITHOUT ROWID;
+"""
+
+# Counters start from the time in ns so a deleted store never goes back to a value already used.
+# A single statement, so two processes bumping at the same time both move the counter.
+BUMP = """
+INSERT INTO shared_counter (name, value) VALUES (:name, :now)
+ON CONFLICT (name) DO UPDATE SET value = MAX(value + 1, :now)
+RETURNING value
+"""
+INIT = 'INSERT INTO shared_counter (name, value) VALUES (?, ?) ON CONFLICT (name) DO NOTHING'
+
+PIN = """
+INSERT INTO shared_pin (name, until) VALUES (:name, :until)
+ON CONFLICT (name) DO UPDATE SET until = MAX(until, excluded.until)
+"""
+
+# fraction of the pins that also delete the expired ones
+CLEANUP_PROBABILITY = 0.01
+
+
+def shared_state_db():
+    return str(getattr(settings, 'SHARED_STATE_DB', settings.BASE_DIR / 'shared_state.sqlite3'))
+
+
+def _connection():
+    return connect(shared_state_db(), SCHEMA)
+
+
+def get_counter(name):
+    connection = _connection()
+    row = connection.execute('SELECT value FROM shared_counter WHERE name = ?', (name,)).fetchone()
+    if row is None:
+        connection.execute(INIT, (name, time.time_ns()))
+        row = connection.execute('SELECT value FROM shared_counter WHERE name = ?', (name,)).fetchone()
+    return row[0]
+
+
+def bump_counter(name):
+    """
+    :return: the new value
+    """
+    return _connection().execute(BUMP, {'name': name, 'now': time.time_ns()}).fetchone()[0]
+
+
+def pin(name, seconds, now=None):
+    """
+    Sets a pin that holds for `seconds`, or longer if it is already set for longer.
+    """
+    now = time.time() if now is None else now
+    connection = _connection()
+    connection.execute(PIN, {'name': name, 'until': now + seconds})
+    if random.random() < CLEANUP_PROBABILITY:
+        connection.execute('DELETE FROM shared_pin WHERE until < ?', (now,))
+
+
+def is_pinned(name, now=None):
+    now = time.time() if now is None else now
+    return _connection().execute(
+        'SELECT 1 FROM shared_pin WHERE name = ? AND until > ?', (name, now)
+    ).fetchone() is not None
+
+
+def reset_shared_state():
+    connection = _connection()
+    connection.execute('DELETE FROM shared_counter')
+    connection.execute('DELETE FROM shared_pin')
@@ -0,0 +1,29 @@
+import os
+import sqlite3
+import threading
+
+# Small SQLite files shared by every worker process of the host, for state that must not wait on the app database:
+# the rate limit buckets (throttling.py), the idempotency keys (idempotency.py) and the version counters
+# (shared_state.py).
+
+_local = threading.local()
+
+
+def connect(path, schema):
+    """
+    One connection per thread and database file, created with `schema` (one or more statements) on first use.
+    WAL lets readers and the single writer of each statement proceed without blocking each other.
+    """
+    connections = getattr(_local, 'connections', None)
+    if connections is None or _local.pid != os.getpid():
+        # none yet, or inherited from the parent of a forked worker: sqlite connections must not cross a fork
+        connections = _local.connections = {}
+        _local.pid = os.getpid()
+    connection = connections.get((path, schema))
+    if connection is None:
+        connection = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.executescript(schema)
+        connections[(path, schema)] = connection
+    return connection
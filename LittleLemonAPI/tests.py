@@ -1,3 +1,1680 @@
-from django.test import TestCase
+import io
+import json
+import multiprocessing
+import re
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User, Group
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework.throttling import UserRateThrottle
+
+from .benchmarking import ROUTES, Fixtures, run_route, compare
+from .checkout import checkout
+from . import profiling
+from .archive import archive_batch, archive_orders
+from .dispatch import dispatch_orders, plan
+from .management.commands.sync_replica import Command
+from .routers import ReplicaRouter, RoutingState, _state
+from .roles import get_roles, invalidate_roles
+from .throttling import reset_throttles, take_token
+from . import idempotency
+from .shared_state import reset_shared_state
+from .renderers import FastJSONRenderer, orjson_available
+from .authentication import invalidate_tokens
+from .menu_cache import menu_cache, bump_catalog_version
+from . import search
+from .search import search_menu_items, fts_query
+from .menu_import import import_menu, iter_json_array, ImportFormatError
+from .rollups import rebuild_rollups
+from .models import (
+    MenuItem,
+    Category,
+    Cart,
+    Order,
+    OrderItem,
+    ArchivedOrder,
+    ArchivedOrderItem,
+    DailySales,
+    DailyMenuItemSales,
+)
+
 
 # Create your tests here.
+
+def full_table_scans(queries):
+    """
+    Runs EXPLAIN QUERY PLAN on every captured SELECT and returns the plan lines that scan a whole table,
+    e.g. 'SCAN LittleLemonAPI_menuitem'. Index scans ('SCAN x USING INDEX y') and virtual tables are not reported.
+    """
+    scans = []
+    with connection.cursor() as cursor:
+        for query in queries:
+            if not query['sql'].startswith('SELECT'):
+                continue
+            cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+            for row in cursor.fetchall():
+                if re.fullmatch(r'SCAN \S+', row[-1]):
+                    scans.append(f"{row[-1]} <- {query['sql']}")
+    return scans
+
+
+def slow_query_plans(queries, accepted=()):
+    """
+    Runs EXPLAIN QUERY PLAN on every captured SELECT and returns the plan lines that scan a whole table or sort the
+    rows in a temporary b-tree, e.g. 'USE TEMP B-TREE FOR ORDER BY', unless the line is in `accepted`.
+    """
+    slow = []
+    with connection.cursor() as cursor:
+        for query in queries:
+            if not query['sql'].startswith('SELECT'):
+                continue
+            cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+            for row in cursor.fetchall():
+                line = row[-1]
+                if (re.fullmatch(r'SCAN \S+', line) or 'TEMP B-TREE' in line) and line not in accepted:
+                    slow.append(f"{line} <- {query['sql']}")
+    return slow
+
+
+# one connection per thread, shared by the test client requests
+@override_settings(THROTTLE_DB=':memory:', SHARED_STATE_DB=':memory:', IDEMPOTENCY_DB=':memory:')
+class LittleLemonTestCase(TestCase):
+    """
+    Common fixtures. Creates the Manager and Delivery crew groups, one user of each kind and a small menu.
+    """
+
+    def setUp(self):
+        cache.clear()
+        reset_throttles()
+        idempotency.reset_idempotency_keys()
+        reset_shared_state()
+        invalidate_roles()  # ids are reused between tests
+        invalidate_tokens()
+        menu_cache.clear()
+        self.manager_group = Group.objects.create(name='Manager')
+        self.delivery_crew_group = Group.objects.create(name='Delivery crew')
+
+        self.manager = User.objects.create_user(username='manager')
+        self.manager.groups.add(self.manager_group)
+        self.crew = User.objects.create_user(username='crew')
+        self.crew.groups.add(self.delivery_crew_group)
+        self.customer = User.objects.create_user(username='customer')
+
+        self.category = Category.objects.create(slug='mains', title='Mains')
+        self.menu = [
+            MenuItem.objects.create(title=f'Item {i}', price=Decimal('2.50') + i, featured=False,
+                                    category=self.category)
+            for i in range(15)
+        ]
+
+        self.client = APIClient()
+
+    def shared_db(self, setting):
+        """
+        Points a shared SQLite store setting (THROTTLE_DB, SHARED_STATE_DB...) at a file for the rest of the test, so
+        processes forked by in_other_workers() use the same store, like the worker processes of a host.
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(**{setting: str(Path(directory.name) / f'{setting.lower()}.sqlite3')})
+        override.enable()
+        self.addCleanup(override.disable)
+
+    @staticmethod
+    def in_other_workers(function, calls, processes=4):
+        """
+        Runs function(*args) for each args of `calls` in forked processes, up to `processes` at a time.
+        :return: the results in the order of `calls`. An exception in a process is raised here
+        """
+        with multiprocessing.get_context('fork').Pool(min(processes, len(calls))) as pool:
+            return pool.starmap(function, calls)
+
+    def fill_cart(self, user, count):
+        for menuitem in self.menu[:count]:
+            Cart.objects.create(user=user, menuitem=menuitem, quantity=2, unit_price=menuitem.price,
+                                price=menuitem.price * 2)
+
+
+class CheckoutTests(LittleLemonTestCase):
+
+    def test_checkout_moves_cart_to_order(self):
+        self.fill_cart(self.customer, 3)
+        order = checkout(self.customer)
+
+        self.assertEqual(order.total, sum(item.price * 2 for item in self.menu[:3]))
+        self.assertEqual(OrderItem.objects.filter(order=order).count(), 3)
+        self.assertFalse(Cart.objects.filter(user=self.customer).exists())
+
+    def test_checkout_empty_cart(self):
+        self.assertIsNone(checkout(self.customer))
+        self.assertFalse(Order.objects.exists())
+
+    def test_checkout_query_budget_is_constant(self):
+        self.fill_cart(self.customer, 1)
+        with CaptureQueriesContext(connection) as small:
+            checkout(self.customer)
+
+        self.fill_cart(self.customer, 15)
+        with CaptureQueriesContext(connection) as large:
+            checkout(self.customer)
+
+        self.assertEqual(len(small), len(large))
+
+    def test_checkout_query_budget(self):
+        self.fill_cart(self.customer, 15)
+        # savepoint, lock/read cart, sum, insert order, bulk insert items, 2 rollup upserts, delete cart,
+        # release savepoint
+        with self.assertNumQueries(9):
+            checkout(self.customer)
+
+    def test_order_post_endpoint(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.post('/api/orders/')
+        self.assertEqual(response.status_code, 400)
+
+        self.fill_cart(self.customer, 2)
+        response = self.client.post('/api/orders/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Order.objects.filter(user=self.customer).count(), 1)
+
+
+class OrderListTests(LittleLemonTestCase):
+
+    def place_orders(self, user, count, lines=3):
+        for _ in range(count):
+            self.fill_cart(user, lines)
+            order = checkout(user)
+            order.delivery_crew = self.crew
+            order.save()
+
+    def assertConstantQueries(self, user, url='/api/orders/'):
+        self.client.force_authenticate(user)
+        self.client.get(url)  # resolve and cache the user roles
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        self.place_orders(self.customer, 10)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+        self.assertEqual(len(small), len(large))
+        return response
+
+    def test_manager_listing_constant_queries(self):
+        self.place_orders(self.customer, 1)
+        response = self.assertConstantQueries(self.manager)
+        self.assertEqual(len(response.data['results']), 11)
+        self.assertEqual(len(response.data['results'][0]['order_items']), 3)
+
+    def test_delivery_crew_listing_constant_queries(self):
+        self.place_orders(self.customer, 1)
+        response = self.assertConstantQueries(self.crew)
+        self.assertEqual(len(response.data['results']), 11)
+
+    def test_customer_listing_constant_queries(self):
+        self.place_orders(self.customer, 1)
+        response = self.assertConstantQueries(self.customer)
+        self.assertEqual(len(response.data['results']), 11)
+
+    def test_keyset_pages_cover_all_orders(self):
+        self.place_orders(self.customer, 7, lines=1)
+        self.client.force_authenticate(self.manager)
+
+        seen = []
+        url = '/api/orders/?perpage=3'
+        while url:
+            response = self.client.get(url)
+            seen += [order['order_id'] for order in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, list(Order.objects.order_by('-date', '-id').values_list('id', flat=True)))
+
+        # walk back from the last page
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([order['order_id'] for order in response.data['results']], seen[3:6])
+
+    def test_invalid_cursor(self):
+        self.client.force_authenticate(self.manager)
+        self.assertEqual(self.client.get('/api/orders/?cursor=garbage').status_code, 404)
+
+
+class RoleCacheTests(LittleLemonTestCase):
+
+    def test_roles_are_cached_across_requests(self):
+        self.assertEqual(get_roles(self.manager), {'Manager'})
+        with self.assertNumQueries(0):
+            self.assertEqual(get_roles(self.manager), {'Manager'})
+
+    def test_group_endpoints_invalidate_roles(self):
+        self.assertEqual(get_roles(self.customer), set())
+        self.client.force_authenticate(self.manager)
+
+        response = self.client.post('/api/groups/delivery-crew/users', {'username': 'customer'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(get_roles(self.customer), {'Delivery crew'})
+
+        response = self.client.delete(f'/api/groups/delivery-crew/users/{self.customer.pk}')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(get_roles(self.customer), set())
+
+        self.client.post('/api/groups/manager/users', {'username': 'customer'})
+        self.assertEqual(get_roles(self.customer), {'Manager'})
+        self.client.delete(f'/api/groups/manager/users/{self.customer.pk}')
+        self.assertEqual(get_roles(self.customer), set())
+
+    def test_demotion_in_another_worker_invalidates(self):
+        self.shared_db('SHARED_STATE_DB')
+        self.assertEqual(get_roles(self.manager), {'Manager'})
+        # removed from the group by another worker: no signal in this process, its cache still has the role
+        User.groups.through.objects.filter(user=self.manager).delete()
+        self.assertEqual(get_roles(self.manager), {'Manager'})
+        self.in_other_workers(invalidate_roles, [(self.manager.pk,)])
+        self.assertEqual(get_roles(self.manager), set())
+
+    def test_roles_resolved_once_per_request(self):
+        # PATCH checks roles in the view and again in OrderSerializer.validate
+        self.fill_cart(self.customer, 1)
+        order = checkout(self.customer)
+        self.client.force_authenticate(self.manager)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(f'/api/orders/{order.pk}', {'status': 1, 'delivery_crew': self.crew.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sum('auth_group' in query['sql'] for query in queries), 1)
+
+
+class MenuCacheTests(LittleLemonTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.customer)
+
+    def test_menu_list_is_cached_per_query(self):
+        first = self.client.get('/api/menu-items/?search=item&perpage=5')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/menu-items/?perpage=5&search=ITEM ')
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(menu_cache.hits, 1)
+
+        # a different page is a different entry
+        third = self.client.get('/api/menu-items/?search=item&perpage=5&page=2')
+        self.assertNotEqual(first.data, third.data)
+        self.assertEqual(menu_cache.misses, 2)
+
+    def test_writes_invalidate_cached_menu(self):
+        self.client.get('/api/menu-items/?perpage=1')
+        self.client.get(f'/api/menu-items/{self.menu[0].pk}')
+
+        self.menu[0].title = 'Renamed'
+        self.menu[0].save()
+        self.assertEqual(self.client.get('/api/menu-items/?perpage=1').data[0]['title'], 'Renamed')
+        self.assertEqual(self.client.get(f'/api/menu-items/{self.menu[0].pk}').data['title'], 'Renamed')
+
+        self.category.title = 'Starters'
+        self.category.save()
+        self.assertEqual(self.client.get('/api/menu-items/?perpage=1').data[0]['category']['title'], 'Starters')
+
+    def test_manager_edit_invalidates_cached_item(self):
+        url = f'/api/menu-items/{self.menu[1].pk}'
+        self.client.get(url)
+        self.client.force_authenticate(self.manager)
+        self.client.patch(url, {'price': '99.00'})
+        self.assertEqual(self.client.get(url).data['price'], '99.00')
+
+    def test_edit_in_another_worker_invalidates(self):
+        self.shared_db('SHARED_STATE_DB')
+        self.client.get('/api/menu-items/?perpage=1')
+        # the edit lands on another worker: no signal in this process, this worker's cache still has the menu
+        MenuItem.objects.filter(pk=self.menu[0].pk).update(title='Renamed')
+        self.assertEqual(self.client.get('/api/menu-items/?perpage=1').data[0]['title'], 'Item 0')
+        self.in_other_workers(bump_catalog_version, [()])
+        self.assertEqual(self.client.get('/api/menu-items/?perpage=1').data[0]['title'], 'Renamed')
+
+    def test_cache_is_bounded(self):
+        menu_cache.maxsize, maxsize = 3, menu_cache.maxsize
+        try:
+            for page in range(1, 6):
+                self.client.get(f'/api/menu-items/?page={page}')
+            self.assertEqual(len(menu_cache), 3)
+        finally:
+            menu_cache.maxsize = maxsize
+
+
+class MenuPaginationTests(LittleLemonTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.customer)
+
+    def walk(self, url):
+        titles = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            titles += [item['title'] for item in response.data['results']]
+            url = response.data['next']
+        return titles, response
+
+    def test_cursor_pages_follow_ordering(self):
+        for ordering in ('price', '-price', 'title', '-id'):
+            reset_throttles()
+            titles, _ = self.walk(f'/api/menu-items/?pagination=cursor&perpage=4&ordering={ordering}')
+            expected = list(MenuItem.objects.order_by(ordering, 'id').values_list('title', flat=True))
+            self.assertEqual(titles, expected, ordering)
+
+    def test_cursor_previous_link(self):
+        titles, last_page = self.walk('/api/menu-items/?pagination=cursor&perpage=4&ordering=-price')
+        response = self.client.get(last_page.data['previous'])
+        self.assertEqual([item['title'] for item in response.data['results']], titles[8:12])
+
+    def test_cursor_pages_skip_count_and_offset(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/menu-items/?pagination=cursor&ordering=price')
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_cursor_rejects_unindexed_ordering(self):
+        response = self.client.get('/api/menu-items/?pagination=cursor&ordering=featured')
+        self.assertEqual(response.status_code, 400)
+
+    def test_page_size_is_capped(self):
+        for i in range(100):
+            MenuItem.objects.create(title=f'Extra {i}', price=1, featured=False, category=self.category)
+        self.assertEqual(len(self.client.get('/api/menu-items/?perpage=1000').data), 100)
+        self.assertEqual(len(self.client.get('/api/menu-items/?pagination=cursor&perpage=1000').data['results']), 100)
+
+    def test_out_of_range_page(self):
+        self.assertEqual(self.client.get('/api/menu-items/?page=50').status_code, 404)
+
+    def test_malformed_page_params(self):
+        for query in ('page=abc', 'perpage=abc', 'pagination=cursor&perpage=abc'):
+            response = self.client.get(f'/api/menu-items/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn('must be a number', response.data['error'])
+        self.assertEqual(len(self.client.get('/api/menu-items/?pagination=cursor&perpage=3').data['results']), 3)
+
+
+class MenuSearchTests(LittleLemonTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.salad = MenuItem.objects.create(title='Greek Salad', price=8, featured=True, category=self.category)
+        self.pasta = MenuItem.objects.create(title='Pasta with Greek cheese', price=9, featured=False,
+                                             category=self.category)
+
+    def titles(self, search):
+        menuitems, ranked = search_menu_items(MenuItem.objects.all(), search)
+        if ranked:
+            menuitems = menuitems.order_by('search_rank', 'id')
+        return [item.title for item in menuitems]
+
+    def test_prefix_match_on_words(self):
+        self.assertEqual(self.titles('sal'), ['Greek Salad'])
+        self.assertEqual(set(self.titles('gre')), {'Greek Salad', 'Pasta with Greek cheese'})
+        self.assertEqual(self.titles('greek sal'), ['Greek Salad'])
+
+    def test_ranked_by_relevance(self):
+        MenuItem.objects.create(title='Greek greek greek', price=1, featured=False, category=self.category)
+        self.assertEqual(self.titles('greek')[0], 'Greek greek greek')
+
+    def test_index_follows_writes(self):
+        self.salad.title = 'Caesar Salad'
+        self.salad.save()
+        self.assertEqual(self.titles('greek'), ['Pasta with Greek cheese'])
+        self.assertEqual(self.titles('caes'), ['Caesar Salad'])
+
+        self.pasta.delete()
+        self.assertEqual(self.titles('greek'), [])
+
+        MenuItem.objects.bulk_create([MenuItem(title='Lemon Dessert', price=5, featured=False,
+                                               category=self.category)])
+        self.assertEqual(self.titles('lem'), ['Lemon Dessert'])
+
+    def test_operators_are_not_interpreted(self):
+        self.assertEqual(fts_query('greek OR -"x'), '"greek"* "OR"* "x"*')
+        self.assertEqual(self.titles('"('), [])  # no words, falls back to icontains
+
+    def test_fallback_without_fts(self):
+        with mock.patch('LittleLemonAPI.search.fts_available', return_value=False):
+            # icontains also matches inside words
+            self.assertEqual(self.titles('alad'), ['Greek Salad'])
+
+    def test_search_endpoint(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.get('/api/menu-items/?search=greek&perpage=10')
+        self.assertEqual([item['title'] for item in response.data], ['Greek Salad', 'Pasta with Greek cheese'])
+
+
+class MenuFilterTests(LittleLemonTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.desserts = Category.objects.create(slug='desserts', title='Desserts')
+        self.cake = MenuItem.objects.create(title='Lemon cake', price=4, featured=True, category=self.desserts)
+        self.tart = MenuItem.objects.create(title='Lemon tart', price=6, featured=False, category=self.desserts)
+        self.client.force_authenticate(self.customer)
+
+    def titles(self, query):
+        response = self.client.get(f'/api/menu-items/?perpage=100&{query}')
+        self.assertEqual(response.status_code, 200, response.data)
+        return [item['title'] for item in response.data]
+
+    def test_price_filters(self):
+        self.assertEqual(self.titles('price=4'), ['Lemon cake'])
+        self.assertEqual(self.titles('price_min=4&price_max=5&ordering=-price'),
+                         ['Item 2', 'Lemon cake'])
+
+    def test_category_by_id_or_slug(self):
+        self.assertEqual(self.titles('category=desserts'), ['Lemon cake', 'Lemon tart'])
+        self.assertEqual(self.titles(f'category={self.desserts.pk}&ordering=-price'), ['Lemon tart', 'Lemon cake'])
+
+    def test_featured(self):
+        self.assertEqual(self.titles('featured=true'), ['Lemon cake'])
+        self.assertEqual(len(self.titles('featured=0')), 16)
+
+    def test_invalid_values(self):
+        response = self.client.get('/api/menu-items/?price_min=cheap&featured=maybe')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {'price_min', 'featured'})
+        self.assertEqual(self.client.get('/api/menu-items/?ordering=category__slug').status_code, 400)
+
+    def test_filters_use_indexes(self):
+        queries = [
+            'price_min=3&price_max=8',
+            'price_min=3&ordering=-price',
+            'price=4',
+            f'category={self.desserts.pk}',
+            f'category={self.desserts.pk}&ordering=price',
+            f'category={self.desserts.pk}&price_max=5',
+            'category=desserts&ordering=-price',
+            'featured=true',
+            'featured=true&ordering=price',
+            'featured=false&price_min=3',
+            'featured=true&ordering=title',
+            'category=desserts&featured=1&ordering=-title',
+            'ordering=price',
+            'ordering=-title',
+            'search=lemon&category=desserts',
+            'pagination=cursor&featured=true&ordering=price',
+            'pagination=cursor&category=desserts&ordering=-price',
+        ]
+        for query in queries:
+            reset_throttles()
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(f'/api/menu-items/?{query}')
+            self.assertEqual(response.status_code, 200, query)
+            self.assertEqual(full_table_scans(captured), [], query)
+
+
+class TrickleStream(io.BytesIO):
+    """
+    Returns at most a few bytes per read so parsers have to cope with rows split across chunks.
+    """
+
+    def read(self, size=-1):
+        return super().read(3)
+
+
+class MenuImportTests(LittleLemonTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.manager)
+
+    def post(self, body, content_type):
+        return self.client.generic('POST', '/api/menu-items/import', body, content_type=content_type)
+
+    def test_json_array_upsert(self):
+        rows = [
+            {'title': 'Item 0', 'price': '1.00', 'featured': True, 'category': 'mains'},  # existing, updated
+            {'title': 'Soup', 'price': '4.50', 'category': str(self.category.pk)},
+            {'title': 'Soup', 'price': '5.00', 'category': 'mains'},  # same item again, last row wins
+            {'title': 'Ghost', 'price': '1.00', 'category': 'nope'},
+            {'title': '', 'price': 'free', 'category': 'mains'},
+        ]
+        response = self.post(json.dumps(rows), 'application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['failed']), (1, 1, 2))
+        self.assertEqual([error['row'] for error in response.data['errors']], [5, 4])
+        self.assertEqual(set(response.data['errors'][0]['errors']), {'title', 'price'})
+
+        self.menu[0].refresh_from_db()
+        self.assertEqual((self.menu[0].price, self.menu[0].featured), (Decimal('1.00'), True))
+        self.assertEqual(MenuItem.objects.get(title='Soup').price, Decimal('5.00'))
+
+    def test_jsonl_and_csv(self):
+        body = '{"title": "Tea", "price": "2", "category": "mains"}\n\nnot json\n[1]\n'
+        response = self.post(body, 'application/x-ndjson')
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 2))
+
+        body = 'title,price,featured,category\r\nTea,3.00,true,mains\r\n"Coffee, black",2.00,false,mains\r\n'
+        response = self.post(body, 'text/csv')
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 1))
+        self.assertTrue(MenuItem.objects.get(title='Tea').featured)
+        self.assertTrue(MenuItem.objects.filter(title='Coffee, black').exists())
+
+        # blank cells: featured defaults to false, a blank price is missing
+        body = 'title,price,featured,category\r\nJuice,3.00,,mains\r\nWater, ,true,mains\r\n'
+        response = self.post(body, 'text/csv')
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 1))
+        self.assertEqual(response.data['errors'][0]['errors'], {'price': ['This field is required.']})
+        self.assertFalse(MenuItem.objects.get(title='Juice').featured)
+
+    def test_batches_and_query_count(self):
+        rows = ''.join(json.dumps({'title': f'New {i}', 'price': '1', 'category': 'mains'}) + '\n'
+                       for i in range(50))
+        # per batch: categories, savepoint, existing items, insert, release
+        with self.assertNumQueries(5 * 5):
+            report = import_menu(io.BytesIO(rows.encode()), 'jsonl', batch_size=10)
+        self.assertEqual(report.created, 50)
+
+    def test_upsert_on_unique_title_and_category(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            MenuItem.objects.create(title='Item 0', price=1, featured=False, category=self.category)
+
+        rows = ''.join(json.dumps({'title': title, 'price': price, 'category': 'mains'}) + '\n'
+                       for title, price in [('Item 0', '7'), ('Tea', '2'), ('Tea', '3')])
+        report = import_menu(io.BytesIO(rows.encode()), 'jsonl', batch_size=1)
+        self.assertEqual((report.created, report.updated), (1, 2))
+        self.assertEqual(MenuItem.objects.get(title='Tea').price, Decimal('3.00'))
+        self.assertEqual(MenuItem.objects.get(title='Item 0').price, Decimal('7.00'))
+
+    def test_json_array_parsed_in_small_chunks(self):
+        body = json.dumps([{'title': 'Caf\u00e9 \u2615', 'n': [1, 2, {'x': ']'}]}] * 3, ensure_ascii=False)
+        rows = list(iter_json_array(TrickleStream(body.encode())))
+        self.assertEqual([number for number, _ in rows], [1, 2, 3])
+        self.assertEqual(rows[2][1]['title'], 'Caf\u00e9 \u2615')
+
+    def test_truncated_json_keeps_earlier_batches(self):
+        body = json.dumps([{'title': f'New {i}', 'price': '1', 'category': 'mains'} for i in range(3)])[:-20]
+        with self.assertRaises(ImportFormatError) as context:
+            import_menu(io.BytesIO(body.encode()), 'json', batch_size=1)
+        self.assertEqual(context.exception.report.created, 2)
+
+        response = self.post(body, 'application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_import_invalidates_menu_cache(self):
+        self.client.get('/api/menu-items/?search=tea')
+        self.post('[{"title": "Tea", "price": "2", "category": "mains"}]', 'application/json')
+        self.assertEqual(len(self.client.get('/api/menu-items/?search=tea').data), 1)
+
+    def test_managers_only(self):
+        self.assertEqual(self.post('[]', 'text/plain').status_code, 415)
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.post('[]', 'application/json').status_code, 403)
+
+
+class OrderExportTests(LittleLemonTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.orders = []
+        for day in (1, 2, 3):
+            self.fill_cart(self.customer, day)
+            order = checkout(self.customer)
+            order.date = datetime(2024, 1, day, 12, tzinfo=dt_timezone.utc)
+            order.save()
+            self.orders.append(order)
+        self.client.force_authenticate(self.manager)
+
+    def content(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_one_line_per_item(self):
+        response = self.client.get('/api/orders/export')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = self.content(response).splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['order_id', 'user_id', 'delivery_crew_id'])
+        self.assertEqual(len(lines), 1 + 1 + 2 + 3)
+        self.assertTrue(lines[1].startswith(f'{self.orders[0].pk},{self.customer.pk},,0,'))
+
+    def test_ndjson_nests_items_per_order(self):
+        response = self.client.get('/api/orders/export?output=ndjson')
+        orders = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual([order['order_id'] for order in orders], [order.pk for order in self.orders])
+        self.assertEqual([len(order['order_items']) for order in orders], [1, 2, 3])
+        self.assertEqual(Decimal(orders[1]['total']), self.orders[1].total)
+
+    def test_date_range(self):
+        response = self.client.get('/api/orders/export?output=ndjson&start=2024-01-02&end=2024-01-02')
+        orders = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual([order['order_id'] for order in orders], [self.orders[1].pk])
+
+        response = self.client.get('/api/orders/export?output=ndjson&start=2024-01-02T13:00:00Z')
+        self.assertEqual(len(self.content(response).splitlines()), 1)
+
+    def test_single_query_whatever_the_size(self):
+        self.client.get('/api/orders/export?output=xml')  # resolve and cache the user roles
+        with self.assertNumQueries(2):  # orders and archived orders
+            self.content(self.client.get('/api/orders/export'))
+
+    def test_invalid_params(self):
+        self.assertEqual(self.client.get('/api/orders/export?output=xml').status_code, 400)
+        self.assertEqual(self.client.get('/api/orders/export?start=yesterday').status_code, 400)
+        self.assertEqual(self.client.get('/api/orders/export?end=2024-02-30').status_code, 400)
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/orders/export').status_code, 403)
+
+
+class SalesRollupTests(LittleLemonTestCase):
+
+    def place_order(self, lines):
+        self.fill_cart(self.customer, lines)
+        return checkout(self.customer)
+
+    def snapshot(self):
+        return (
+            list(DailySales.objects.order_by('date').values_list('date', 'order_count', 'items_sold', 'revenue')),
+            list(DailyMenuItemSales.objects.order_by('date', 'menuitem_id')
+                 .values_list('date', 'menuitem_id', 'quantity', 'revenue')),
+        )
+
+    def test_checkout_updates_rollups(self):
+        first = self.place_order(2)
+        second = self.place_order(3)
+        day = DailySales.objects.get()
+        self.assertEqual((day.order_count, day.items_sold, day.revenue), (2, 10, first.total + second.total))
+        item = DailyMenuItemSales.objects.get(menuitem=self.menu[0])
+        self.assertEqual((item.quantity, item.revenue), (4, self.menu[0].price * 4))
+
+    def test_delete_endpoint_updates_rollups(self):
+        self.place_order(2)
+        order = self.place_order(3)
+        self.client.force_authenticate(self.manager)
+        self.assertEqual(self.client.delete(f'/api/orders/{order.pk}').status_code, 204)
+
+        day = DailySales.objects.get()
+        self.assertEqual((day.order_count, day.items_sold), (1, 4))
+        self.assertEqual(DailyMenuItemSales.objects.get(menuitem=self.menu[2]).quantity, 0)
+
+    def test_rebuild_matches_incremental(self):
+        for lines in (1, 2, 3):
+            self.place_order(lines)
+        incremental = self.snapshot()
+        rebuild_rollups()
+        self.assertEqual(self.snapshot(), incremental)
+
+        Order.objects.filter(pk=Order.objects.first().pk).update(date=datetime(2024, 1, 1, tzinfo=dt_timezone.utc))
+        incremental = self.snapshot()
+
+        self.assertEqual(rebuild_rollups(), (2, 3 + 1))
+        rebuilt = self.snapshot()
+        self.assertEqual(rebuilt[0][0], (datetime(2024, 1, 1).date(), 1, 2, Decimal('5.00')))
+        # the moved order is the only difference
+        self.assertEqual(sum(row[1] for row in rebuilt[0]), sum(row[1] for row in incremental[0]))
+
+    def test_report_endpoint(self):
+        self.place_order(2)
+        self.place_order(1)
+        self.client.force_authenticate(self.manager)
+
+        response = self.client.get('/api/reports/sales')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['order_count'], 2)
+
+        response = self.client.get('/api/reports/sales?group=menuitem')
+        self.assertEqual([(row['title'], row['quantity']) for row in response.data], [('Item 0', 4), ('Item 1', 2)])
+
+        response = self.client.get('/api/reports/sales?start=2000-01-01&end=2000-12-31')
+        self.assertEqual(response.data, [])
+        self.assertEqual(self.client.get('/api/reports/sales?start=soon').status_code, 400)
+
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/reports/sales').status_code, 403)
+
+
+class ArchiveTests(LittleLemonTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # 6 orders placed one day apart, the oldest first. Delivered: all but the second oldest and the newest
+        self.orders = []
+        for day in range(6):
+            self.fill_cart(self.customer, 2)
+            order = checkout(self.customer)
+            order.date = datetime.now(dt_timezone.utc) - timedelta(days=100 - day)
+            order.status = day not in (1, 5)
+            order.delivery_crew = self.crew
+            order.save()
+            self.orders.append(order)
+        self.orders[5].date = datetime.now(dt_timezone.utc)
+        self.orders[5].save()
+        rebuild_rollups()  # the dates moved
+
+    def snapshot(self):
+        return (
+            list(DailySales.objects.order_by('date').values_list('date', 'order_count', 'items_sold', 'revenue')),
+            list(DailyMenuItemSales.objects.order_by('date', 'menuitem_id')
+                 .values_list('date', 'menuitem_id', 'quantity', 'revenue')),
+        )
+
+    def test_archives_old_delivered_orders_in_batches(self):
+        rollups = self.snapshot()
+        self.assertEqual(archive_orders(days=90, batch_size=2), 4)
+        self.assertEqual(sorted(ArchivedOrder.objects.values_list('id', flat=True)),
+                         [self.orders[i].pk for i in (0, 2, 3, 4)])
+        self.assertEqual(sorted(Order.objects.values_list('id', flat=True)), [self.orders[1].pk, self.orders[5].pk])
+        self.assertEqual(ArchivedOrderItem.objects.filter(order_id=self.orders[0].pk).count(), 2)
+        self.assertEqual(OrderItem.objects.count(), 4)
+        # still sales
+        self.assertEqual(self.snapshot(), rollups)
+        rebuild_rollups()
+        self.assertEqual(self.snapshot(), rollups)
+        # nothing left to do
+        self.assertEqual(archive_orders(days=90), 0)
+
+    def test_constant_queries(self):
+        date = datetime.now(dt_timezone.utc) - timedelta(days=200)
+        orders = Order.objects.bulk_create(Order(user=self.customer, status=True, total=5, date=date)
+                                           for _ in range(1200))
+        OrderItem.objects.bulk_create(OrderItem(order=order, menuitem=self.menu[0], quantity=1, unit_price=5, price=5)
+                                      for order in orders)
+        # more rows than SQLite's 999 bind parameters. Savepoint, order ids, 2 INSERT ... SELECT, 2 DELETE, release
+        with self.assertNumQueries(7):
+            self.assertEqual(archive_batch(datetime.now(dt_timezone.utc), batch_size=1500), 1204)
+        self.assertEqual(ArchivedOrderItem.objects.count(), 1200 + 4 * 2)
+        self.assertFalse(ArchivedOrder.objects.filter(archived_at__isnull=True).exists())
+        self.assertFalse(OrderItem.objects.filter(order_id__in=[order.pk for order in orders]).exists())
+
+    def test_settings_read_at_call_time(self):
+        with self.settings(ARCHIVE_AFTER_DAYS=1000):
+            self.assertEqual(archive_orders(), 0)
+        with self.settings(ARCHIVE_BATCH_SIZE=3):
+            self.assertEqual(archive_orders(max_batches=1), 3)
+
+    def test_keeps_64_bit_ids(self):
+        self.assertEqual(ArchivedOrder._meta.pk.db_type(connection), Order._meta.pk.rel_db_type(connection))
+        self.assertEqual(ArchivedOrderItem._meta.pk.db_type(connection), OrderItem._meta.pk.rel_db_type(connection))
+        order = Order.objects.create(id=2 ** 40, user=self.customer, status=True, total=5,
+                                     date=datetime.now(dt_timezone.utc) - timedelta(days=200))
+        OrderItem.objects.create(id=2 ** 40, order=order, menuitem=self.menu[0], quantity=1, unit_price=5, price=5)
+        archive_orders(days=90)
+        self.assertTrue(ArchivedOrderItem.objects.filter(pk=2 ** 40, order_id=2 ** 40).exists())
+
+    def test_order_list_history(self):
+        archive_orders(days=90)
+        for user in (self.customer, self.crew, self.manager):
+            self.client.force_authenticate(user)
+            response = self.client.get('/api/orders/')
+            self.assertEqual([order['order_id'] for order in response.data['results']],
+                             [self.orders[5].pk, self.orders[1].pk])
+            # pages walk both tables newest first
+            seen, url = [], '/api/orders/?history=true&perpage=2'
+            while url:
+                response = self.client.get(url)
+                seen += [order['order_id'] for order in response.data['results']]
+                url = response.data['next']
+            self.assertEqual(seen, [order.pk for order in reversed(self.orders)])
+        self.assertEqual(len(response.data['results'][0]['order_items']), 2)
+
+        response = self.aget('/api/async/orders/?history=true', self.manager)
+        self.assertEqual([order['order_id'] for order in response.json()['results']],
+                         [order.pk for order in reversed(self.orders)])
+
+    def test_archived_order_details(self):
+        archive_orders(days=90)
+        self.client.force_authenticate(self.customer)
+        response = self.client.get(f'/api/orders/{self.orders[0].pk}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data[0]['order_items']), 2)
+        # read only
+        self.client.force_authenticate(self.manager)
+        self.assertEqual(self.client.patch(f'/api/orders/{self.orders[0].pk}', {'status': 0}).status_code, 404)
+
+    def test_export_includes_archived_orders(self):
+        archive_orders(days=90)
+        self.client.force_authenticate(self.manager)
+        response = self.client.get('/api/orders/export?output=ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['order_id'] for line in lines], [order.pk for order in self.orders])
+
+    def aget(self, url, user):
+        async def request():
+            return await self.async_client.get(url, headers={'Authorization': f'Token {token}'})
+        token = Token.objects.get_or_create(user=user)[0].key
+        return async_to_sync(request)()
+
+
+class CartBatchTests(LittleLemonTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.customer)
+
+    def cart(self):
+        return {line.menuitem_id: (line.quantity, line.price) for line in Cart.objects.filter(user=self.customer)}
+
+    def test_single_post_increments_existing_line(self):
+        item = self.menu[0]
+        response = self.client.post('/api/cart/menu-items', {'menuitem': str(item.pk), 'quantity': '2'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['quantity'], 2)
+
+        response = self.client.post('/api/cart/menu-items', {'menuitem': item.pk, 'quantity': 3})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.cart(), {item.pk: (5, item.price * 5)})
+
+    def test_post_reprices_line_after_price_change(self):
+        item = self.menu[0]
+        self.client.post('/api/cart/menu-items', {'menuitem': item.pk, 'quantity': 2})
+        MenuItem.objects.filter(pk=item.pk).update(price=Decimal('2.35'))
+
+        response = self.client.post('/api/cart/menu-items', {'menuitem': item.pk, 'quantity': 1})
+        self.assertEqual(response.status_code, 201)
+        line = Cart.objects.get(user=self.customer, menuitem=item)
+        self.assertEqual((line.quantity, line.unit_price, line.price), (3, Decimal('2.35'), Decimal('7.05')))
+
+    def test_batch_post(self):
+        self.client.post('/api/cart/menu-items', {'menuitem': self.menu[0].pk, 'quantity': 1})
+        lines = [{'menuitem': item.pk, 'quantity': 2} for item in self.menu[:10]]
+        lines.append({'menuitem': self.menu[1].pk, 'quantity': 1})  # listed twice, quantities add up
+        response = self.client.post('/api/cart/menu-items', lines, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 10)
+
+        cart = self.cart()
+        self.assertEqual(cart[self.menu[0].pk], (3, self.menu[0].price * 3))
+        self.assertEqual(cart[self.menu[1].pk], (3, self.menu[1].price * 3))
+        self.assertEqual(cart[self.menu[9].pk], (2, self.menu[9].price * 2))
+
+    def test_batch_query_count_is_constant(self):
+        self.client.post('/api/cart/menu-items', {'menuitem': self.menu[14].pk, 'quantity': 1})  # warm up roles
+        with CaptureQueriesContext(connection) as small:
+            self.client.post('/api/cart/menu-items', [{'menuitem': self.menu[0].pk, 'quantity': 1}], format='json')
+        with CaptureQueriesContext(connection) as large:
+            self.client.post('/api/cart/menu-items',
+                             [{'menuitem': item.pk, 'quantity': 1} for item in self.menu[:12]], format='json')
+        self.assertEqual(len(small), len(large))
+
+    def test_patch_and_put_set_quantities(self):
+        self.client.post('/api/cart/menu-items',
+                         [{'menuitem': item.pk, 'quantity': 2} for item in self.menu[:3]], format='json')
+        response = self.client.patch('/api/cart/menu-items', [
+            {'menuitem': self.menu[0].pk, 'quantity': 5},
+            {'menuitem': self.menu[1].pk, 'quantity': 0},
+            {'menuitem': self.menu[4].pk, 'quantity': 1},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.cart(), {
+            self.menu[0].pk: (5, self.menu[0].price * 5),
+            self.menu[2].pk: (2, self.menu[2].price * 2),
+            self.menu[4].pk: (1, self.menu[4].price),
+        })
+
+        response = self.client.put('/api/cart/menu-items', {'menuitem': self.menu[2].pk, 'quantity': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.cart(), {self.menu[2].pk: (1, self.menu[2].price)})
+
+    def test_quantity_is_bounded(self):
+        self.client.post('/api/cart/menu-items', {'menuitem': self.menu[0].pk, 'quantity': 600})
+        # listed twice and the line already holds 600, the batch is rejected as a whole
+        response = self.client.post('/api/cart/menu-items', [
+            {'menuitem': self.menu[1].pk, 'quantity': 1},
+            {'menuitem': self.menu[0].pk, 'quantity': 300},
+            {'menuitem': self.menu[0].pk, 'quantity': 300},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['quantity'], [f'Menu item {self.menu[0].pk} would go over 1000 in the cart.'])
+        self.assertEqual(self.cart(), {self.menu[0].pk: (600, self.menu[0].price * 600)})
+
+        response = self.client.post('/api/cart/menu-items', {'menuitem': self.menu[0].pk, 'quantity': 400})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['quantity'], 1000)
+
+    def test_invalid_lines(self):
+        response = self.client.post('/api/cart/menu-items', [{'menuitem': 9999, 'quantity': 1}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post('/api/cart/menu-items', [], format='json').status_code, 400)
+        response = self.client.post('/api/cart/menu-items', {'menuitem': self.menu[0].pk, 'quantity': 0})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.cart(), {})
+
+
+class CartSummaryTests(LittleLemonTestCase):
+
+    def test_summary(self):
+        self.fill_cart(self.customer, 3)
+        self.client.force_authenticate(self.customer)
+        self.client.get('/api/cart/menu-items')  # resolve and cache the user roles
+        # lines with their menu item and category, then the aggregate
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/cart/menu-items?summary=true')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['item_count'], 6)
+        self.assertEqual(Decimal(response.data['subtotal']), sum(item.price * 2 for item in self.menu[:3]))
+        self.assertEqual(response.data['items'][0]['menuitem']['title'], 'Item 0')
+        self.assertEqual(response.data['items'][0]['menuitem']['category']['slug'], 'mains')
+
+    def test_empty_cart_summary(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.get('/api/cart/menu-items?summary=1')
+        self.assertEqual((response.data['items'], response.data['item_count']), ([], 0))
+        self.assertEqual(Decimal(response.data['subtotal']), 0)
+
+
+class AsyncViewTests(LittleLemonTestCase):
+    """
+    The /api/async/ endpoints answer like their sync counterparts.
+    """
+
+    def arequest(self, method, url, headers):
+        async def request():
+            return await getattr(self.async_client, method)(url, headers=headers)
+        return async_to_sync(request)()
+
+    def aget(self, url, user=None):
+        headers = {'Authorization': f'Token {Token.objects.get_or_create(user=user)[0].key}'} if user else {}
+        return self.arequest('get', url, headers)
+
+    def assertSameAsSync(self, url, user):
+        response = self.aget(f'/api/async{url}', user)
+        self.assertEqual(response.status_code, 200)
+        menu_cache.clear()  # make the sync view compute its own response
+        self.client.force_authenticate(user)
+        expected = self.client.get(f'/api{url}')
+        # links point to the endpoint that was called
+        self.assertEqual(response.json(), json.loads(expected.content.replace(b'/api/', b'/api/async/')))
+        return response.json()
+
+    def test_menu_items(self):
+        data = self.assertSameAsSync('/menu-items/?perpage=4&page=2&ordering=-price', self.customer)
+        self.assertEqual([item['title'] for item in data], ['Item 10', 'Item 9', 'Item 8', 'Item 7'])
+        self.assertSameAsSync('/menu-items/?search=item&price_min=5', self.customer)
+
+    def test_menu_items_share_the_cache(self):
+        self.client.force_authenticate(self.customer)
+        self.client.get('/api/menu-items/?perpage=4')
+        response = self.aget('/api/async/menu-items/?perpage=4', self.customer)
+        self.assertEqual(len(response.json()), 4)
+        self.assertEqual((menu_cache.misses, menu_cache.hits), (1, 1))
+
+    def test_menu_items_cursor(self):
+        data = self.assertSameAsSync('/menu-items/?pagination=cursor&perpage=5', self.customer)
+        response = self.aget(data['next'], self.customer)
+        self.assertEqual([item['title'] for item in response.json()['results']], [f'Item {i}' for i in range(5, 10)])
+
+    def test_menu_items_errors(self):
+        self.assertEqual(self.aget('/api/async/menu-items/?page=9', self.customer).status_code, 404)
+        self.assertEqual(self.aget('/api/async/menu-items/?page=abc', self.customer).status_code, 400)
+        self.assertEqual(self.aget('/api/async/menu-items/?pagination=cursor&perpage=x', self.customer).status_code,
+                         400)
+        self.assertEqual(self.aget('/api/async/menu-items/?cursor=garbage', self.customer).status_code, 404)
+        self.assertEqual(self.aget('/api/async/menu-items/?ordering=secret', self.customer).status_code, 400)
+
+    def test_single_menu_item(self):
+        self.assertSameAsSync(f'/menu-items/{self.menu[3].pk}', self.crew)
+        self.assertEqual(self.aget('/api/async/menu-items/999', self.crew).status_code, 404)
+
+    def test_cart(self):
+        self.fill_cart(self.customer, 3)
+        self.assertSameAsSync('/cart/menu-items', self.customer)
+        data = self.assertSameAsSync('/cart/menu-items?summary=true', self.customer)
+        self.assertEqual(data['item_count'], 6)
+        self.assertEqual(self.aget('/api/async/cart/menu-items', self.manager).status_code, 403)
+
+    def test_orders(self):
+        for user in (self.customer, self.customer):
+            self.fill_cart(user, 2)
+            checkout(user)
+        data = self.assertSameAsSync('/orders/', self.manager)
+        self.assertEqual(len(data['results']), 2)
+        self.assertEqual(len(data['results'][0]['order_items']), 2)
+        self.assertEqual(self.aget('/api/async/orders/', self.crew).json()['results'], [])
+
+    def test_authentication(self):
+        response = self.aget('/api/async/menu-items/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
+        response = self.arequest('get', '/api/async/menu-items/', {'Authorization': 'Token nope'})
+        self.assertEqual(response.json(), {'detail': 'Invalid token.'})
+
+    def test_read_only(self):
+        token = Token.objects.create(user=self.manager)
+        response = self.arequest('post', '/api/async/menu-items/', {'Authorization': f'Token {token.key}'})
+        self.assertEqual(response.status_code, 405)
+
+    def test_throttled(self):
+        for _ in range(10):
+            self.assertEqual(self.aget('/api/async/orders/', self.customer).status_code, 200)
+        response = self.aget('/api/async/orders/', self.customer)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+class DispatchTests(LittleLemonTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.crew2 = User.objects.create_user(username='crew2')
+        self.crew3 = User.objects.create_user(username='crew3')
+        self.delivery_crew_group.user_set.add(self.crew2, self.crew3)
+        self.start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+    def create_orders(self, count, **kwargs):
+        return Order.objects.bulk_create(
+            Order(user=self.customer, total=10, date=self.start + timedelta(minutes=i), **kwargs)
+            for i in range(count)
+        )
+
+    def open_orders(self):
+        loads = dict.fromkeys((self.crew.pk, self.crew2.pk, self.crew3.pk), 0)
+        for crew_id in Order.objects.filter(status=False).values_list('delivery_crew_id', flat=True):
+            loads[crew_id] = loads.get(crew_id, 0) + 1
+        return loads
+
+    def test_plan_least_loaded_first(self):
+        self.assertEqual(plan([1, 2, 3, 4], {10: 2, 11: 0, 12: 1}), {11: [1, 2], 12: [3], 10: [4]})
+        self.assertEqual(plan([1, 2, 3], {10: 2, 11: 1}, max_open_orders=2), {11: [1]})
+
+    def test_balances_open_orders(self):
+        self.create_orders(6, delivery_crew=self.crew)
+        self.create_orders(4, delivery_crew=self.crew2, status=True)  # delivered orders are not a load
+        self.create_orders(12)
+        assignments = dispatch_orders()
+        self.assertEqual(sum(len(order_ids) for order_ids in assignments.values()), 12)
+        loads = self.open_orders()
+        self.assertNotIn(None, loads)
+        self.assertEqual(sorted(loads.values()), [6, 6, 6])
+
+    def test_oldest_orders_first(self):
+        orders = self.create_orders(5)
+        dispatch_orders(batch_size=2)
+        assigned = Order.objects.filter(delivery_crew__isnull=False).values_list('id', flat=True)
+        self.assertEqual(sorted(assigned), [orders[0].pk, orders[1].pk])
+
+    def test_max_open_orders(self):
+        self.create_orders(10)
+        dispatch_orders(max_open_orders=2)
+        self.assertEqual(self.open_orders(), {None: 4, self.crew.pk: 2, self.crew2.pk: 2, self.crew3.pk: 2})
+
+    def test_settings_read_at_call_time(self):
+        self.create_orders(10)
+        with self.settings(DISPATCH_BATCH_SIZE=7, DISPATCH_MAX_OPEN_ORDERS=2):
+            dispatch_orders()
+        self.assertEqual(self.open_orders(), {None: 4, self.crew.pk: 2, self.crew2.pk: 2, self.crew3.pk: 2})
+        with self.settings(DISPATCH_BATCH_SIZE=1):
+            dispatch_orders()
+        self.assertEqual(self.open_orders()[None], 3)
+
+    def test_manual_assignments_are_kept(self):
+        self.create_orders(3, delivery_crew=self.crew3)
+        dispatch_orders()
+        self.assertEqual(Order.objects.filter(delivery_crew=self.crew3).count(), 3)
+
+    def test_orders_claimed_meanwhile_are_not_reported(self):
+        orders = self.create_orders(6)
+
+        def plan_then_claim(*args):
+            # a manager assigns an order between the read of the queue and the UPDATE
+            Order.objects.filter(pk=orders[0].pk).update(delivery_crew=self.crew3)
+            return plan(*args)
+
+        with mock.patch('LittleLemonAPI.dispatch.plan', plan_then_claim):
+            assignments = dispatch_orders()
+        reported = sorted(order_id for order_ids in assignments.values() for order_id in order_ids)
+        self.assertEqual(reported, [order.pk for order in orders[1:]])
+        for crew_id, order_ids in assignments.items():
+            self.assertEqual(set(Order.objects.filter(pk__in=order_ids).values_list('delivery_crew', flat=True)),
+                             {crew_id})
+
+    def test_no_delivery_crew(self):
+        self.delivery_crew_group.user_set.clear()
+        self.create_orders(3)
+        self.assertEqual(dispatch_orders(), {})
+
+    def test_constant_queries(self):
+        self.create_orders(3)
+        with CaptureQueriesContext(connection) as small:
+            dispatch_orders()
+        self.create_orders(3000)
+        with CaptureQueriesContext(connection) as large:
+            assignments = dispatch_orders(batch_size=3000)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(len([query for query in large if query['sql'].startswith('UPDATE')]), 1)
+        # 3000 orders in one cycle, split evenly
+        self.assertEqual(sorted(len(order_ids) for order_ids in assignments.values()), [1000, 1000, 1000])
+        self.assertFalse(Order.objects.filter(delivery_crew__isnull=True).exists())
+
+    def test_dispatch_on_checkout(self):
+        self.fill_cart(self.customer, 2)
+        with self.settings(DISPATCH_ON_CHECKOUT=True), self.captureOnCommitCallbacks(execute=True):
+            order = checkout(self.customer)
+        order.refresh_from_db()
+        self.assertEqual(order.delivery_crew, self.crew)
+
+
+@override_settings(THROTTLE_DB=':memory:', SHARED_STATE_DB=':memory:')
+class BenchmarkSuiteTests(TestCase):
+
+    @mock.patch.object(UserRateThrottle, 'rate', '1000/second', create=True)
+    def test_every_route_succeeds(self):
+        invalidate_roles()
+        menu_cache.clear()
+        fixtures = Fixtures({'menu_items': 20, 'users': 3, 'carts': 2, 'orders': 10})
+        for route in ROUTES:
+            result = run_route(route, fixtures, requests=2)
+            self.assertEqual(result['requests'], 2)
+            self.assertTrue(all(code.startswith('2') for code in result['statuses']), (route.name, result))
+
+    def test_compare(self):
+        baseline = {'endpoints': {'menu list': {'p95_ms': 10, 'queries': 3}, 'cart': {'p95_ms': 5, 'queries': 2}}}
+        results = {'endpoints': {'menu list': {'p95_ms': 12, 'queries': 3}, 'cart': {'p95_ms': 9, 'queries': 3},
+                                 'new': {'p95_ms': 1, 'queries': 1}}}
+        self.assertEqual(compare(results, baseline, threshold=0.25),
+                         ['cart: p95 5.00ms -> 9.00ms', 'cart: queries 2 -> 3'])
+
+
+class ServerTimingTests(LittleLemonTestCase):
+
+    def test_off_by_default(self):
+        self.client.force_authenticate(self.customer)
+        self.assertNotIn('Server-Timing', self.client.get('/api/menu-items/'))
+
+    def test_server_timing_header_and_log(self):
+        with self.settings(SERVER_TIMING=True):
+            client = APIClient()  # middleware is loaded with the client
+            client.force_authenticate(self.manager)
+            with self.assertLogs('LittleLemonAPI.timing', 'INFO') as logs:
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get('/api/reports/sales?group=menuitem')
+        self.assertEqual(response.status_code, 200)
+        metrics = {metric.split(';')[0]: metric for metric in response['Server-Timing'].split(', ')}
+        self.assertEqual(set(metrics), {'db', 'view', 'serializer', 'permissions', 'total'})
+        self.assertIn(f'desc="{len(queries)} queries"', metrics['db'])
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line['method'], line['path'], line['status'], line['queries']),
+                         ('GET', '/api/reports/sales', 200, len(queries)))
+        self.assertLessEqual(line['view_ms'], line['total_ms'])
+
+
+class ProfilingTests(LittleLemonTestCase):
+
+    def setUp(self):
+        super().setUp()
+        profiling.install()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dir = Path(directory.name)
+        self.client.force_authenticate(self.customer)
+
+    def test_off(self):
+        with self.settings(PROFILE_DIR=self.dir):
+            response = self.client.get('/api/menu-items/', HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-File', response)
+        self.assertEqual(list(self.dir.iterdir()), [])
+
+    def test_header_trigger(self):
+        with self.settings(PROFILE_DIR=self.dir, PROFILE_HEADER_TRIGGER=True):
+            self.assertNotIn('X-Profile-File', self.client.get('/api/menu-items/'))
+            response = self.client.get('/api/menu-items/', HTTP_X_PROFILE='1')
+        self.assertIn('-GET-menu_items-', response['X-Profile-File'])
+        self.assertEqual([path.name for path in self.dir.iterdir()], [response['X-Profile-File']])
+
+    def test_sampling_and_report(self):
+        with self.settings(PROFILE_DIR=self.dir, PROFILE_SAMPLE_RATE=1):
+            for _ in range(3):
+                self.client.get('/api/cart/menu-items')
+            self.client.get('/api/menu-items/')
+        self.assertEqual(len(list(self.dir.glob('*.prof'))), 4)
+
+        out = io.StringIO()
+        call_command('profile_report', dir=str(self.dir), view='cart', limit=5, stdout=out)
+        self.assertIn('3 profiles:', out.getvalue())
+        self.assertIn('GET cart', out.getvalue())
+        self.assertNotIn('menu_items', out.getvalue())
+
+
+class CachedTokenAuthenticationTests(LittleLemonTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.token = Token.objects.create(user=self.customer)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_lookup_cached(self):
+        self.assertEqual(self.client.get('/api/users/me').data['username'], 'customer')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/users/me')
+        self.assertEqual(response.data['username'], 'customer')
+
+    def test_invalid_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token nope')
+        self.assertEqual(self.client.get('/api/users/me').status_code, 401)
+
+    def test_logout_invalidates(self):
+        self.client.get('/api/users/me')
+        self.assertEqual(self.client.post('/auth/token/logout/').status_code, 204)
+        self.assertEqual(self.client.get('/api/users/me').status_code, 401)
+
+    def test_user_change_invalidates(self):
+        self.client.get('/api/users/me')
+        self.customer.username = 'renamed'
+        self.customer.save()
+        self.assertEqual(self.client.get('/api/users/me').data['username'], 'renamed')
+        self.customer.is_active = False
+        self.customer.save()
+        self.assertEqual(self.client.get('/api/users/me').status_code, 401)
+
+    def test_logout_in_another_worker_invalidates(self):
+        self.shared_db('SHARED_STATE_DB')
+        self.client.get('/api/users/me')
+        # the token is deleted by another worker: no signal in this process, its cache still has the token
+        Token.objects.filter(pk=self.token.pk)._raw_delete(Token.objects.db)
+        self.assertEqual(self.client.get('/api/users/me').status_code, 200)
+        self.in_other_workers(invalidate_tokens, [(self.token.key,)])
+        self.assertEqual(self.client.get('/api/users/me').status_code, 401)
+
+    def test_login_keeps_the_cache(self):
+        self.client.get('/api/users/me')
+        self.customer.save(update_fields=['last_login'])
+        with self.assertNumQueries(0):
+            self.client.get('/api/users/me')
+
+    def test_user_delete_invalidates(self):
+        self.client.get('/api/users/me')
+        self.customer.delete()
+        self.assertEqual(self.client.get('/api/users/me').status_code, 401)
+
+    def test_async_views_share_the_cache(self):
+        self.client.get('/api/users/me')
+
+        async def request():
+            return await self.async_client.get('/api/async/menu-items/',
+                                               headers={'Authorization': f'Token {self.token.key}'})
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(async_to_sync(request)().status_code, 200)
+        self.assertFalse([query for query in queries if 'authtoken_token' in query['sql']])
+
+
+class SharedThrottleTests(LittleLemonTestCase):
+
+    def test_token_bucket(self):
+        now = 1000.0
+        self.assertEqual([take_token('k', 3, 0.5, now=now)[0] for _ in range(4)], [True, True, True, False])
+        self.assertFalse(take_token('k', 3, 0.5, now=now + 1)[0])  # half a token
+        self.assertTrue(take_token('k', 3, 0.5, now=now + 2.5)[0])
+        # never refills past the capacity
+        self.assertEqual([take_token('k', 3, 0.5, now=now + 100)[0] for _ in range(4)], [True, True, True, False])
+
+    def test_shared_between_processes(self):
+        self.shared_db('THROTTLE_DB')
+        taken = self.in_other_workers(take_token, [('throttle_test_shared', 20, 0.001)] * 60)
+        self.assertEqual(sum(allowed for allowed, _ in taken), 20)
+
+    def test_scopes_have_their_own_budget(self):
+        self.client.force_authenticate(self.customer)
+        for _ in range(10):
+            self.assertEqual(self.client.get('/api/orders/').status_code, 200)
+        response = self.client.get('/api/orders/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '6')
+        # checkout and menu browsing are not affected
+        self.assertEqual(self.client.post('/api/orders/').status_code, 400)  # empty cart
+        self.assertEqual(self.client.get('/api/menu-items/').status_code, 200)
+
+
+@override_settings(THROTTLE_DB=':memory:', SHARED_STATE_DB=':memory:', DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Runs outside of a test transaction: reads inside a transaction always go to the primary.
+    The test replica is a separate, empty database, so whatever a request finds came from the primary.
+    """
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        reset_throttles()
+        invalidate_roles()
+        invalidate_tokens()
+        menu_cache.clear()
+        self.customer = User.objects.create_user(username='customer')
+        category = Category.objects.create(slug='mains', title='Mains')
+        self.menuitem = MenuItem.objects.create(title='Soup', price=Decimal('4.00'), featured=False,
+                                                category=category)
+        reset_shared_state()  # the fixtures are not a menu change, no catalog pin
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def test_reads_go_to_the_replica(self):
+        response = self.client.get('/api/menu-items/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [])
+        # views without the decorator read from the primary
+        self.assertEqual(self.client.get(f'/api/menu-items/{self.menuitem.pk}').status_code, 200)
+
+        menu_cache.clear()
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(len(self.client.get('/api/menu-items/').data), 1)
+
+    def test_read_your_writes(self):
+        Cart.objects.create(user=self.customer, menuitem=self.menuitem, quantity=1, unit_price=Decimal('4.00'),
+                            price=Decimal('4.00'))
+        # the checkout reads the cart in its transaction, on the primary
+        self.assertEqual(self.client.post('/api/orders/').status_code, 201)
+        # the client that wrote is pinned to the primary for a while
+        self.assertEqual(len(self.client.get('/api/orders/').data['results']), 1)
+        # other clients are not
+        other = APIClient(REMOTE_ADDR='10.0.0.2')
+        other.force_authenticate(self.customer)
+        self.assertEqual(other.get('/api/orders/').data['results'], [])
+        # until the pin expires
+        reset_shared_state()
+        self.assertEqual(self.client.get('/api/orders/').data['results'], [])
+
+    def test_menu_change_pins_menu_reads(self):
+        self.assertEqual(self.client.get('/api/menu-items/').data, [])
+        # a manager's edit served by another worker: its replica may lag, so nobody reads the menu from one for a while
+        self.menuitem.title = 'Soup of the day'
+        self.menuitem.save()
+        other = APIClient(REMOTE_ADDR='10.0.0.2')
+        other.force_authenticate(self.customer)
+        self.assertEqual(other.get('/api/menu-items/').data[0]['title'], 'Soup of the day')
+        # other reads still go to the replica
+        self.assertEqual(other.get('/api/orders/').data['results'], [])
+        reset_shared_state()
+        self.assertEqual(other.get('/api/menu-items/').data, [])
+
+    def test_async_search_on_the_replica(self):
+        search._fts_available.clear()  # nothing warmed by a sync request
+        token = Token.objects.create(user=self.customer)
+        # the token is looked up on the replica too
+        self.customer.save(using='replica')
+        token.save(using='replica')
+
+        async def request():
+            return await self.async_client.get('/api/async/menu-items/?search=sou',
+                                               headers={'Authorization': f'Token {token.key}'})
+        response = async_to_sync(request)()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+        self.assertIn('replica', search._fts_available)
+
+    def test_router(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(MenuItem), 'default')  # outside of a request
+        state = RoutingState(use_replica=True)
+        token = _state.set(state)
+        try:
+            self.assertEqual(router.db_for_read(MenuItem), 'replica')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(MenuItem), 'default')
+            self.assertEqual(router.db_for_write(MenuItem), 'default')
+            self.assertEqual(router.db_for_read(MenuItem), 'default')  # read after write
+        finally:
+            _state.reset(token)
+
+    def test_sync_replica(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        source = Path(directory.name) / 'primary.sqlite3'
+        target = Path(directory.name) / 'replica.sqlite3'
+        with sqlite3.connect(source) as db:
+            db.execute('CREATE TABLE t (x)')
+            db.execute('INSERT INTO t VALUES (1)')
+        Command.copy(source, target)
+        with sqlite3.connect(target) as db:
+            self.assertEqual(db.execute('SELECT x FROM t').fetchall(), [(1,)])
+
+
+# Plan lines accepted per route of the benchmark suite, with the reason
+ACCEPTED_QUERY_PLANS = {
+    # the unfiltered menu is paged in id order: the rowid walk stops at the end of the page
+    'menu list': {'SCAN LittleLemonAPI_menuitem'},
+    'async menu list': {'SCAN LittleLemonAPI_menuitem'},
+    # the filter indexes narrow the rows, the few matching items are then sorted by id
+    'menu list filtered': {'USE TEMP B-TREE FOR ORDER BY'},
+    # relevance only exists once the full text index matched
+    'menu search': {'USE TEMP B-TREE FOR ORDER BY'},
+    # best sellers: the rollup rows of the range are grouped per menu item then sorted by revenue
+    'sales by menu item': {'USE TEMP B-TREE FOR GROUP BY', 'USE TEMP B-TREE FOR ORDER BY'},
+}
+
+
+@override_settings(THROTTLE_DB=':memory:', SHARED_STATE_DB=':memory:')
+class QueryPlanTests(TestCase):
+    """
+    Fails when a query of the views starts scanning a whole table or sorting its results in a temporary b-tree,
+    e.g. after an index was dropped or a queryset changed its filters or ordering.
+    """
+
+    @mock.patch.object(UserRateThrottle, 'rate', '1000/second', create=True)
+    def test_every_route(self):
+        invalidate_roles()
+        menu_cache.clear()
+        fixtures = Fixtures({'menu_items': 20, 'users': 3, 'carts': 2, 'orders': 10})
+        for route in ROUTES:
+            queries = []
+            # cold so the menu queries run instead of being served from the cache
+            run_route(route, fixtures, requests=1, cold=True, captured_queries=queries)
+            self.assertEqual(slow_query_plans(queries, ACCEPTED_QUERY_PLANS.get(route.name, ())), [], route.name)
+
+    def test_order_queries(self):
+        manager = User.objects.create_user(username='manager')
+        manager.groups.add(Group.objects.create(name='Manager'))
+        crew = User.objects.create_user(username='crew')
+        crew.groups.add(Group.objects.create(name='Delivery crew'))
+        customer = User.objects.create_user(username='customer')
+        now = datetime.now(dt_timezone.utc)
+        Order.objects.bulk_create(
+            Order(user=customer, delivery_crew=crew if i % 2 else None, total=1, date=now - timedelta(hours=i))
+            for i in range(12)
+        )
+        client = APIClient()
+        for user in (manager, crew, customer):
+            client.force_authenticate(user)
+            # the first page and the pages after it, which seek past the last (date, id) seen
+            url = '/api/orders/?perpage=2'
+            for _ in range(2):
+                with CaptureQueriesContext(connection) as captured:
+                    response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(slow_query_plans(captured), [], (user.username, url))
+                url = response.data['next']
+        with CaptureQueriesContext(connection) as captured:
+            dispatch_orders()
+        # the open orders are counted per crew member: one group per member of the Delivery crew group
+        self.assertEqual(slow_query_plans(captured, {'USE TEMP B-TREE FOR GROUP BY'}), [])
+        with CaptureQueriesContext(connection) as captured:
+            archive_orders(days=0)
+        self.assertEqual(slow_query_plans(captured), [])
+
+
+class IdempotencyTests(LittleLemonTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.customer)
+
+    def test_checkout_retry(self):
+        self.fill_cart(self.customer, 3)
+        response = self.client.post('/api/orders/', HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(response.status_code, 201)
+        # the retry is answered from the store, the order tables are not read
+        with self.assertNumQueries(0):
+            retry = self.client.post('/api/orders/', HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual((retry.status_code, retry.data), (201, response.data))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_cart_retry(self):
+        line = {'menuitem': self.menu[0].pk, 'quantity': 2}
+        for _ in range(3):
+            response = self.client.post('/api/cart/menu-items', line, format='json', HTTP_IDEMPOTENCY_KEY='add-1')
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(Cart.objects.get(user=self.customer).quantity, 2)
+        # a new key is a new request
+        self.client.post('/api/cart/menu-items', line, format='json', HTTP_IDEMPOTENCY_KEY='add-2')
+        self.assertEqual(Cart.objects.get(user=self.customer).quantity, 4)
+        # no key, no change
+        self.client.post('/api/cart/menu-items', line, format='json')
+        self.assertEqual(Cart.objects.get(user=self.customer).quantity, 6)
+
+    def test_key_reused_for_another_request(self):
+        self.client.post('/api/cart/menu-items', {'menuitem': self.menu[0].pk, 'quantity': 2}, format='json',
+                         HTTP_IDEMPOTENCY_KEY='add-1')
+        response = self.client.post('/api/cart/menu-items', {'menuitem': self.menu[1].pk, 'quantity': 2},
+                                    format='json', HTTP_IDEMPOTENCY_KEY='add-1')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.client.post('/api/orders/', HTTP_IDEMPOTENCY_KEY='add-1').status_code, 422)
+
+    def test_failed_requests_are_not_kept(self):
+        self.assertEqual(self.client.post('/api/orders/', HTTP_IDEMPOTENCY_KEY='checkout-1').status_code, 400)
+        self.fill_cart(self.customer, 1)
+        self.assertEqual(self.client.post('/api/orders/', HTTP_IDEMPOTENCY_KEY='checkout-1').status_code, 201)
+
+    def test_keys_are_per_user(self):
+        other = User.objects.create_user(username='other')
+        for user in (self.customer, other):
+            self.fill_cart(user, 1)
+            self.client.force_authenticate(user)
+            response = self.client.post('/api/orders/', HTTP_IDEMPOTENCY_KEY='checkout-1')
+            self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_concurrent_duplicate(self):
+        self.fill_cart(self.customer, 1)
+        body = b''
+        request = mock.Mock(method='POST', path='/api/orders/', body=body)
+        # another worker is running the first request
+        self.assertIsNone(idempotency.claim(f'{self.customer.pk}:checkout-1', idempotency.fingerprint(request)))
+        response = self.client.post('/api/orders/', HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(Order.objects.exists())
+        # a request that died holding the key does not block it forever
+        with override_settings(IDEMPOTENCY_LOCK_TIMEOUT=0):
+            self.assertEqual(self.client.post('/api/orders/', HTTP_IDEMPOTENCY_KEY='checkout-1').status_code, 201)
+
+    def test_one_claim_between_processes(self):
+        self.shared_db('IDEMPOTENCY_DB')
+        claims = self.in_other_workers(idempotency.claim, [('1:shared', 'fingerprint')] * 8)
+        self.assertEqual(claims.count(None), 1)
+
+    def test_bounded(self):
+        with override_settings(IDEMPOTENCY_MAX_KEYS=2, IDEMPOTENCY_TTL=100):
+            for i in range(5):
+                idempotency.claim(f'1:key-{i}', 'fingerprint', now=1000 + i)
+            idempotency.cleanup(now=1000)
+            self.assertEqual([row[0] for row in idempotency._connection().execute(
+                'SELECT key FROM idempotency_key ORDER BY key')], ['1:key-3', '1:key-4'])
+            idempotency.cleanup(now=2000)  # expired
+        self.assertEqual(idempotency._connection().execute('SELECT COUNT(*) FROM idempotency_key').fetchone(), (0,))
+
+
+class OrderBulkUpdateTests(LittleLemonTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other_crew = User.objects.create_user(username='other crew')
+        self.other_crew.groups.add(self.delivery_crew_group)
+        now = datetime.now(dt_timezone.utc)
+        self.orders = Order.objects.bulk_create(
+            Order(user=self.customer, delivery_crew=self.crew if i < 3 else self.other_crew, total=1, date=now)
+            for i in range(5)
+        )
+        self.ids = [order.pk for order in self.orders]
+
+    def patch(self, user, data):
+        self.client.force_authenticate(user)
+        return self.client.patch('/api/orders/bulk', data, format='json')
+
+    def test_manager(self):
+        self.patch(self.manager, {'orders': []})  # resolve and cache the user roles
+        missing = max(self.ids) + 1
+        with self.assertNumQueries(5):  # delivery crew lookup, SELECT, UPDATE + the savepoint around them
+            response = self.patch(self.manager, {'orders': self.ids + [missing, self.ids[0]], 'status': 1,
+                                                 'delivery_crew': self.other_crew.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 5)
+        self.assertEqual(response.data['results'][-1], {'order_id': missing, 'result': 'not_found'})
+        self.assertEqual(len(response.data['results']), 6)  # duplicates reported once
+        self.assertEqual(set(Order.objects.values_list('status', 'delivery_crew')), {(True, self.other_crew.pk)})
+
+        response = self.patch(self.manager, {'orders': self.ids[:2], 'status': 0, 'delivery_crew': None})
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(Order.objects.filter(delivery_crew__isnull=True).count(), 2)
+
+    def test_delivery_crew(self):
+        response = self.patch(self.crew, {'orders': self.ids, 'status': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['result'] for row in response.data['results']], ['updated'] * 3 + ['not_assigned'] * 2)
+        self.assertEqual(list(Order.objects.order_by('id').values_list('status', flat=True)),
+                         [True, True, True, False, False])
+
+    def test_manager_sets_one_field(self):
+        response = self.patch(self.manager, {'orders': self.ids[:2], 'delivery_crew': self.other_crew.pk})
+        self.assertEqual(response.data['updated'], 2)
+        response = self.patch(self.manager, {'orders': self.ids[1:3], 'status': 1})
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(list(Order.objects.order_by('id').values_list('status', 'delivery_crew')), [
+            (False, self.other_crew.pk), (True, self.other_crew.pk), (True, self.crew.pk),
+            (False, self.other_crew.pk), (False, self.other_crew.pk),
+        ])
+
+        # same for a single order, the field left out is kept
+        self.client.force_authenticate(self.manager)
+        response = self.client.patch(f'/api/orders/{self.ids[3]}', {'status': 1})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.patch(f'/api/orders/{self.ids[4]}', {'delivery_crew': self.crew.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(Order.objects.filter(pk__in=self.ids[3:]).order_by('id')
+                              .values_list('status', 'delivery_crew')),
+                         [(True, self.other_crew.pk), (False, self.crew.pk)])
+
+    def test_same_rules_as_single_update(self):
+        # manager needs status or delivery_crew, delivery crew the status only
+        self.assertEqual(self.patch(self.manager, {'orders': self.ids}).status_code, 400)
+        self.client.force_authenticate(self.manager)
+        self.assertEqual(self.client.patch(f'/api/orders/{self.ids[0]}', {}).status_code, 400)
+        self.assertEqual(
+            self.patch(self.crew, {'orders': self.ids, 'status': 1, 'delivery_crew': self.crew.pk}).status_code, 400
+        )
+        self.assertEqual(self.patch(self.crew, {'orders': self.ids}).status_code, 400)
+        self.assertEqual(self.patch(self.customer, {'orders': self.ids, 'status': 1}).status_code, 403)
+        self.assertEqual(self.patch(self.manager, {'orders': 'all', 'status': 1, 'delivery_crew': None}).status_code,
+                         400)
+        self.assertFalse(Order.objects.filter(status=True).exists())
+
+
+@skipUnless(orjson_available(), 'orjson is not installed')
+class RendererTests(LittleLemonTestCase):
+
+    def test_same_output_as_json_renderer(self):
+        data = [{
+            'price': Decimal('12.50'), 'date': datetime(2024, 1, 1, 12, 30, 0, 123456, tzinfo=dt_timezone.utc),
+            'title': 'Caf\u00e9 \u2028 line \u2029', 'ids': (1, 2), 'empty': None, 1: 'int key',
+        }]
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+        # over 64 bits, orjson refuses it and JSONRenderer takes over
+        self.assertEqual(FastJSONRenderer().render({'big': 2 ** 70}), b'{"big":1180591620717411303424}')
+
+    def test_indent_falls_back(self):
+        rendered = FastJSONRenderer().render({'a': 1}, 'application/json; indent=2')
+        self.assertEqual(rendered, JSONRenderer().render({'a': 1}, 'application/json; indent=2'))
+        self.assertIn(b'\n  "a": 1', rendered)
+
+    def test_api_responses(self):
+        self.client.force_authenticate(self.customer)
+        expected = self.client.get('/api/menu-items/')
+        self.assertEqual(expected['Content-Type'], 'application/json')
+        self.assertEqual(expected.content, JSONRenderer().render(expected.data))
+        # async views render with it too
+        token = Token.objects.create(user=self.customer)
+        response = async_to_sync(self.async_client.get)('/api/async/menu-items/',
+                                                        headers={'Authorization': f'Token {token.key}'})
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.content, expected.content)
@@ -0,0 +1,103 @@
+import random
+import time
+
+from django.conf import settings
+from rest_framework.throttling import UserRateThrottle
+
+from .sqlite_store import connect
+
+# Token buckets shared by every worker process of the host, in their own SQLite file so throttling never waits on
+# the app database's write lock. One row per (scope, user or ip): memory does not grow with the request rate.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS throttle_bucket (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,   -- requests left
+    updated REAL NOT NULL,  -- unix time of the last refill
+    full_at REAL NOT NULL,  -- unix time the bucket is full again, rows past it are useless
+    allowed INTEGER NOT NULL
+) WITHOUT ROWID
+"""
+
+# Refill for the time elapsed, capped at the capacity, then take one token if there is a whole one.
+# A single statement, so concurrent requests from different processes can't both take the last token.
+TAKE = """
+INSERT INTO throttle_bucket (key, tokens, updated, full_at, allowed)
+VALUES (:key, :capacity - 1, :now, :now + 1 / :rate, 1)
+ON CONFLICT (key) DO UPDATE SET
+    tokens = MIN(:capacity, tokens + (:now - updated) * :rate)
+             - (MIN(:capacity, tokens + (:now - updated) * :rate) >= 1),
+    allowed = MIN(:capacity, tokens + (:now - updated) * :rate) >= 1,
+    full_at = :now + (:capacity - MIN(:capacity, tokens + (:now - updated) * :rate)
+                      + (MIN(:capacity, tokens + (:now - updated) * :rate) >= 1)) / :rate,
+    updated = :now
+RETURNING allowed, tokens
+"""
+
+# fraction of the requests that also delete the buckets that are full again
+CLEANUP_PROBABILITY = 0.001
+
+
+def throttle_db():
+    return str(getattr(settings, 'THROTTLE_DB', settings.BASE_DIR / 'throttle.sqlite3'))
+
+
+def _connection():
+    return connect(throttle_db(), SCHEMA)
+
+
+def take_token(key, capacity, rate, now=None):
+    """
+    Token bucket holding at most `capacity` tokens, refilled at `rate` tokens per second.
+    :return: (allowed, tokens left)
+    """
+    now = time.time() if now is None else now
+    connection = _connection()
+    allowed, tokens = connection.execute(
+        TAKE, {'key': key, 'capacity': capacity, 'rate': rate, 'now': now}
+    ).fetchone()
+    if random.random() < CLEANUP_PROBABILITY:
+        connection.execute('DELETE FROM throttle_bucket WHERE full_at < ?', (now,))
+    return bool(allowed), tokens
+
+
+def reset_throttles():
+    _connection().execute('DELETE FROM throttle_bucket')
+
+
+class SharedRateThrottle(UserRateThrottle):
+    """
+    UserRateThrottle backed by a token bucket shared by every process of the host, see take_token().
+    A rate of 10/minute lets a user burst 10 requests then one more every 6 seconds, whatever the number of
+    gunicorn workers.
+    Rates come from DEFAULT_THROTTLE_RATES by scope. `methods` restricts the throttle to some HTTP methods.
+    """
+    methods = None
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        if self.methods is not None and request.method not in self.methods:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        allowed, self.tokens = take_token(key, self.num_requests, self.num_requests / self.duration)
+        return allowed
+
+    def wait(self):
+        # time until the next whole token
+        return max(1 - self.tokens, 0) * self.duration / self.num_requests
+
+
+class MenuRateThrottle(SharedRateThrottle):
+    scope = 'menu'
+
+
+class OrderRateThrottle(SharedRateThrottle):
+    scope = 'orders'
+    methods = ('GET',)
+
+
+class CheckoutRateThrottle(SharedRateThrottle):
+    scope = 'checkout'
+    methods = ('POST',)
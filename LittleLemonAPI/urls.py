@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import views, async_views
 
 urlpatterns = [
     # User management and Authentication urls. Some urls are provided by djoser
@@ -15,9 +15,19 @@ urlpatterns = [
     # menu items endpoints
     path('menu-items/', views.menu_items),
     path('menu-items/<int:pk>', views.single_menu_item),
+    path('menu-items/import', views.menu_items_import),  # bulk create/update. Managers only
     # cart endpoints
     path('cart/menu-items', views.cart),
     # order management endpoints
     path('orders/', views.order_manager),
     path('orders/<int:pk>', views.single_order_manager),
+    path('orders/bulk', views.orders_bulk_update),  # status/delivery crew of many orders at once
+    path('orders/export', views.orders_export),  # CSV/NDJSON download for reporting. Managers only
+    # reporting endpoints
+    path('reports/sales', views.sales_report),
+    # async read only endpoints for ASGI deployments. Same responses as their sync counterparts above
+    path('async/menu-items/', async_views.menu_items),
+    path('async/menu-items/<int:pk>', async_views.single_menu_item),
+    path('async/cart/menu-items', async_views.cart),
+    path('async/orders/', async_views.order_manager),
 ]
@@ -1,17 +1,35 @@
 # Create your views here.
-from django.utils import timezone
+import io
+import operator
+from datetime import datetime, timedelta
 
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.shortcuts import get_object_or_404
-from django.http import Http404
+from django.http import Http404, StreamingHttpResponse
+from django.db.models import Sum
 from rest_framework import status
 from rest_framework.response import Response
+from rest_framework.exceptions import NotFound
 from rest_framework.decorators import api_view, permission_classes, throttle_classes
-from rest_framework.throttling import UserRateThrottle
 
-from django.core.paginator import Paginator, EmptyPage
+from django.core.paginator import Paginator, InvalidPage
 
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from .permissions import IsManager, IsCustomer
+from .routers import read_from_replica, CATALOG_PIN
+from .idempotency import idempotent
+from .throttling import MenuRateThrottle, OrderRateThrottle, CheckoutRateThrottle
+from .roles import MANAGER, DELIVERY_CREW, request_roles, is_manager, is_delivery_crew, is_customer
+from .checkout import checkout
+from .order_updates import bulk_update_orders, UPDATED
+from .rollups import delete_order
+from .carts import add_to_cart, set_cart_quantities
+from .pagination import KeysetPaginator, MAX_PAGE_SIZE
+from .filters import filter_menu_items
+from .menu_cache import menu_cache, menu_cache_key
+from .menu_import import import_menu, ImportFormatError, CONTENT_TYPES
+from .exports import export_orders, EXPORT_FORMATS
 
 # import models
 from .models import (
@@ -19,15 +37,24 @@ from .models import (
     Category,
     Cart,
     Order,
-    OrderItem
+    ArchivedOrder,
+    DailySales,
+    DailyMenuItemSales,
 )
 
 from .serializers import (
     MenuItemSerializer,
     UserSerializer,
     CartSerializer,
+    CartLineSerializer,
+    CartQuantitySerializer,
+    CartSummarySerializer,
     OrderItemSerializer,
     OrderSerializer,
+    OrderBulkUpdateSerializer,
+    OrderDetailSerializer,
+    DailySalesSerializer,
+    MenuItemSalesSerializer,
 )
 
 from django.contrib.auth.models import User, Group
@@ -185,9 +212,10 @@ def unassign_deliver_crew(request, pk):  # Endpoint/groups/delivery-crew/users/<
         return Response({"message": f"<{user.username}> is not delivery crew."}, status.HTTP_404_NOT_FOUND)
 
 
+@read_from_replica(unless_pinned=CATALOG_PIN)  # not from a replica behind the last menu change
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
-@throttle_classes([UserRateThrottle])
+@throttle_classes([MenuRateThrottle])
 def menu_items(request):  # /api/menu-items/
     """
     Manages menu items via this FBV (Function-Based View).
@@ -196,6 +224,16 @@ def menu_items(request):  # /api/menu-items/
 
     GET:
     Returns a list of all menu items.All users can list
+    Responses are cached per query until the menu changes. See menu_cache.py
+    Query params:
+    - price, price_min, price_max: price equal to, at least, at most
+    - category: category id or slug
+    - featured: true or false
+    - ordering: one of id, price, title. Prefix with - to reverse
+    - search: matches words of the title starting with the given words, most relevant first
+    - page, perpage (max 100): page based pagination. Returns a list
+    - pagination=cursor or cursor=<from next/previous links>: cursor pagination. Returns
+      {"next": url, "previous": url, "results": [...]}
 
     POST:
     Creates a new menu item. Only Managers can POST
@@ -206,7 +244,8 @@ def menu_items(request):  # /api/menu-items/
     Returns:
     - 200 OK: If the GET request is successful, it returns a list of all menu items.
     - 201 Created: If the POST request is successful, it returns the created menu item.
-    - 400 Bad Request: If the POST request data is invalid, it returns an error response.
+    - 400 Bad Request: If the POST request data is invalid, or page/perpage is not a number.
+    - 404 Not Found: If the page is past the last one.
 
     Example POST Data:
     {
@@ -221,41 +260,53 @@ def menu_items(request):  # /api/menu-items/
     - Use the 'category' field to specify the category ID to which the menu item belongs.
     """
     if request.method == 'GET':
-        menuitems = MenuItem.objects.select_related('category').all()
-
-        # implement filtering of menu items using title
-        price = request.query_params.get('price')
-        if price:  # filter by title
-            menuitems = menuitems.filter(title=price)
-
-            # Fetch search criteria passed as a query param
-        search = request.query_params.get('search')
-        if search:  # implement searching
-            # menuitems = menuitems.filter(title__istartswith=search) # 'i' makes the search case-insensitive
-            menuitems = menuitems.filter(title__icontains=search)  # 'i' makes the search case-insensitive
-
-            # Fetch ordering criteria passed as a query param
-        ordering = request.query_params.get('ordering')
-        if ordering:  # implement ordering
-            menuitems = menuitems.order_by(ordering)
-                # ordering with multiple criteria
-            # ordering_fields = ordering.split(",")  # split the query string
-            # menuitems = menuitems.order_by(*ordering_fields)  # such by unpacking the list
-
-            # pagination
-        perpage = request.query_params.get('perpage', default=2)  #
-        page = request.query_params.get('page', default=1)  #
-        paginator = Paginator(menuitems, per_page=perpage)
-        try:
-            menuitems = paginator.page(number=page)
-        except EmptyPage:  # Deal with an empty page
-            menuitems = []
-
-        serialized_menu_items = MenuItemSerializer(menuitems, many=True)
-        return Response(serialized_menu_items.data, status.HTTP_200_OK)
+        # Serve from the catalog cache when the same query was answered for the current menu version
+        cache_key = menu_cache_key('list', request.query_params)
+        data = menu_cache.get(cache_key)
+        if data is None:
+            menuitems = MenuItem.objects.select_related('category').all()
+
+            # implement filtering of menu items: price, price_min, price_max, category (id or slug), featured
+            # and searching. Each filter and ordering is backed by an index. See filters.py
+            menuitems, filterset, ranked = filter_menu_items(menuitems, request.query_params)
+
+            # page size of both pagination modes
+            try:
+                perpage = min(max(int(request.query_params.get('perpage', default=2)), 1), MAX_PAGE_SIZE)
+            except ValueError:
+                return Response({'error': 'perpage must be a number.'}, status.HTTP_400_BAD_REQUEST)
+
+            # cursor pagination. Opaque next/previous cursors over indexed columns, no COUNT(*) or OFFSET
+            if request.query_params.get('pagination') == 'cursor' or 'cursor' in request.query_params:
+                paginator = KeysetPaginator(ordering=filterset.get_ordering(), page_size=perpage)
+                menuitems = paginator.paginate(menuitems, request)
+                serialized_menu_items = MenuItemSerializer(menuitems, many=True)
+                data = paginator.get_paginated_data(list(serialized_menu_items.data))
+                menu_cache.set(cache_key, data)
+                return Response(data, status.HTTP_200_OK)
+
+            # Fetch ordering criteria passed as a query param. Only allowed orderings, most relevant first when
+            # searching without one
+            menuitems = menuitems.order_by(*filterset.get_ordering(default=('search_rank', 'id') if ranked else None))
+
+                # pagination
+            try:
+                page = int(request.query_params.get('page', default=1))
+            except ValueError:
+                return Response({'error': 'page must be a number.'}, status.HTTP_400_BAD_REQUEST)
+            paginator = Paginator(menuitems, per_page=perpage)
+            try:
+                menuitems = paginator.page(number=page)
+            except InvalidPage:  # Deal with an empty or invalid page
+                raise NotFound(f'Invalid page. There are {paginator.num_pages} pages.')
+
+            serialized_menu_items = MenuItemSerializer(menuitems, many=True)
+            data = list(serialized_menu_items.data)
+            menu_cache.set(cache_key, data)
+        return Response(data, status.HTTP_200_OK)
 
     if request.method == 'POST':
-        if not request.user.groups.filter(name='Manager').exists():
+        if not is_manager(request):
             return Response({'error': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
 
         serialized_menuitem = MenuItemSerializer(data=request.data)  # Deserialize the JSON data
@@ -264,6 +315,42 @@ def menu_items(request):  # /api/menu-items/
         return Response(serialized_menuitem.data, status.HTTP_201_CREATED)
 
 
+@api_view(['POST'])
+@permission_classes([IsManager])
+def menu_items_import(request):
+    """
+    Bulk creates or updates menu items. Managers only.
+    Endpoint: /api/menu-items/import
+
+    POST:
+    The request body is the file itself, its format is taken from the Content-Type header:
+    - application/json: array of objects
+    - application/x-ndjson: one object per line
+    - text/csv: header row then one item per row
+    Each item has title, price, featured (optional, false by default) and category (id or slug).
+    An item with the same title in the same category is updated, otherwise it is created.
+
+    The body is streamed and imported in batches so large catalogs don't have to fit in memory.
+    Invalid rows are skipped and reported.
+
+    Returns:
+    - 200 OK: {"created": 10, "updated": 2, "failed": 1, "errors": [{"row": 4, "errors": {...}}]}
+    - 400 Bad Request: the body can't be parsed any further. Includes the report of the rows imported before.
+    - 415 Unsupported Media Type: unknown Content-Type
+    """
+    fmt = CONTENT_TYPES.get(request.content_type.split(';')[0].strip().lower())
+    if fmt is None:
+        return Response({'error': f"Content-Type must be one of {', '.join(CONTENT_TYPES)}."},
+                        status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    stream = request.stream or io.BytesIO()  # no stream for an empty body
+    try:
+        report = import_menu(stream, fmt)
+    except ImportFormatError as error:
+        return Response({'error': str(error), **error.report.as_dict()}, status.HTTP_400_BAD_REQUEST)
+    return Response(report.as_dict(), status.HTTP_200_OK)
+
+
 @api_view(['GET', 'PUT', 'PATCH', 'DELETE'])
 @permission_classes([IsAuthenticated])
 def single_menu_item(request, pk):
@@ -313,15 +400,21 @@ def single_menu_item(request, pk):
     - Use the 'category' field to specify the category ID to which the menu item belongs.
     - Ensure the JSON data adheres to field constraints and data types defined in your model.
     """
+    if request.method == 'GET':
+        cache_key = menu_cache_key('item', pk=pk)
+        data = menu_cache.get(cache_key)
+        if data is None:
+            menu_item = get_object_or_404(MenuItem.objects.select_related('category'), pk=pk)
+            data = dict(MenuItemSerializer(menu_item).data)
+            menu_cache.set(cache_key, data)
+        return Response(data, status.HTTP_200_OK)
+
     menu_item = get_object_or_404(MenuItem, pk=pk)  # better way to query with error handling
     # menu_item = MenuItem.objects.get(pk=pk) # requires manual error handling incase pk doesn't exist
-    if request.method == 'GET':
-        serialized_menu_item = MenuItemSerializer(menu_item)
-        return Response(serialized_menu_item.data, status.HTTP_200_OK)
 
     # Only Manager can PUT, PATCH and DELETE menu items
     # Stop further execution if user is not a manager
-    if not request.user.groups.filter(name='Manager').exists():
+    if not is_manager(request):
         return Response({'error': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
 
     if request.method == 'PUT':
@@ -343,44 +436,77 @@ def single_menu_item(request, pk):
         return Response({'message': 'Resource deleted successfully.'}, status=status.HTTP_204_NO_CONTENT)
 
 
-@api_view(['GET', 'POST', 'DELETE'])
+def parse_cart_lines(request, serializer_class, merge):
+    """
+    Validates a cart payload that is either one {menuitem, quantity} object or a list of them.
+    :param merge: how to combine a menu item listed twice, e.g. add the quantities
+    :return: (dict menuitem id -> quantity, True if a list was sent)
+    """
+    many = isinstance(request.data, list)
+    if many:
+        serializer = serializer_class(data=request.data, many=True, allow_empty=False)
+    else:
+        serializer = serializer_class(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    lines = {}
+    for line in (serializer.validated_data if many else [serializer.validated_data]):
+        menuitem = line['menuitem']
+        lines[menuitem] = merge(lines[menuitem], line['quantity']) if menuitem in lines else line['quantity']
+    return lines, many
+
+
+@api_view(['GET', 'POST', 'PUT', 'PATCH', 'DELETE'])
 @permission_classes([IsCustomer])
+@idempotent  # POST retries with the same Idempotency-Key don't add the items twice
 def cart(request):
     """
     Endpoint: /api/cart/menu-items
     GET: Fetches all Cart items for the Current user.
-    POST: Allows Current user to add menu items to their Cart
+         With ?summary=true returns {"items": [...], "item_count": 3, "subtotal": "24.50"} where each item embeds
+         its menu item (title, price, category), so no follow up request per line is needed.
+    POST: Allows Current user to add menu items to their Cart. Adding a menu item already in the cart increases
+          its quantity. Send a list to add many items at once.
           Example POST payload:
               {
                 "menuitem":"10",
                 "quantity":"10"
               }
+          or
+              [{"menuitem": 10, "quantity": 2}, {"menuitem": 4, "quantity": 1}]
+          Send an Idempotency-Key header to retry safely, see idempotency.py
+    PATCH: Sets the quantity of the given items (same payloads as POST). A quantity of 0 removes the item.
+    PUT: Replaces the whole Cart with the given items.
+    DELETE: Empties the Cart.
+    Whatever the number of items sent, the prices are fetched in one query and the cart is updated in bulk.
     :param request:
     :return: JSON() and Status Codes.
     """
     if request.method == 'GET':
         # Fetch cart items for the current user
         user_cart_items = Cart.objects.filter(user=request.user)
+        if request.query_params.get('summary', '').lower() in ('1', 'true'):
+            # menu items embedded with a join, totals computed by the db in one aggregate
+            summary = user_cart_items.aggregate(item_count=Sum('quantity', default=0),
+                                                subtotal=Sum('price', default=0))
+            summary['items'] = user_cart_items.select_related('menuitem__category').order_by('id')
+            return Response(CartSummarySerializer(summary).data, status.HTTP_200_OK)
         user_cart_items_serialized = CartSerializer(user_cart_items, many=True)
         return Response(user_cart_items_serialized.data, status.HTTP_200_OK)
 
     if request.method == "POST":
-        serialized_cart_items = CartSerializer(data=request.data,
-                                               context={
-                                                   'request': request})  # Deserialize the JSON data and pass the ...
-        # ...authenticated user to the serializer
+        lines, many = parse_cart_lines(request, CartLineSerializer, merge=operator.add)
+        user_cart_items = add_to_cart(request.user, lines)  # existing lines get their quantity increased
 
-        # catch if user tries to add duplicates to their cart. This constraint is defined in the Cart model.
-        try:
-            serialized_cart_items.is_valid(raise_exception=True)  # validate data and throw an error if invalid
-            serialized_cart_items.save()  # Throws an error if unique constraint is not followed. ...
-            # ... This prevents duplicates
-            # Error thrown during saving because, the constraint is set on the db schema
-        except Http404:
-            menu_item = get_object_or_404(MenuItem, pk=request.data.get('menuitem'))
-            return Response({"Error": f"No duplicates allowed. You already have {menu_item} in your cart, increase "
-                                      f"quantity instead."}, status.HTTP_400_BAD_REQUEST)
-        return Response(serialized_cart_items.data, status.HTTP_201_CREATED)
+        # reply with what was sent: the line for a single item, the lines for a list
+        if many:
+            return Response(CartSerializer(user_cart_items, many=True).data, status.HTTP_201_CREATED)
+        return Response(CartSerializer(user_cart_items.get()).data, status.HTTP_201_CREATED)
+
+    if request.method in ('PUT', 'PATCH'):
+        lines, _ = parse_cart_lines(request, CartQuantitySerializer, merge=lambda first, last: last)
+        set_cart_quantities(request.user, lines, replace=request.method == 'PUT')
+        user_cart_items = Cart.objects.filter(user=request.user).order_by('id')
+        return Response(CartSerializer(user_cart_items, many=True).data, status.HTTP_200_OK)
 
     if request.method == 'DELETE':
         # Fetch cart items for the current user
@@ -389,9 +515,11 @@ def cart(request):
         return Response({"Message": "All Items have been deleted from the Cart."}, status.HTTP_204_NO_CONTENT)
 
 
+@read_from_replica
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
-@throttle_classes([UserRateThrottle])
+@throttle_classes([OrderRateThrottle, CheckoutRateThrottle])  # browsing and checkout have their own budgets
+@idempotent  # POST retries with the same Idempotency-Key don't place the order twice
 def order_manager(request):
     """
     ndpoint: /api/orders/
@@ -399,65 +527,146 @@ def order_manager(request):
         1. Manager: Returns all orders with order items by all users.
         2. Customers: Returns their orders and items in each order
         3. Delivery crew: Returns orders and items contained for orders assigned to them
+        Results are paginated newest first: {"next": url, "previous": url, "results": [...]}
+        Query params: perpage (max 100), cursor (taken from the next/previous links),
+        history=true to include the archived orders (delivered orders moved out after a while, see archive.py)
     POST:
         1. Customers: Place the order of items in their cart
+        Send an Idempotency-Key header to retry safely: the same key gets the first response back, see idempotency.py
     :param request:
     :return:
     """
     if request.method == 'GET':
-        if request.user.groups.filter(name='Manager').exists():
+        history = request.query_params.get('history', '').lower() in ('1', 'true')
+        tables = (Order, ArchivedOrder) if history else (Order,)
+        if is_manager(request):
             # For a manager, display order items for all users
-            orders = Order.objects.all()
-        elif request.user.groups.filter(name='Delivery crew').exists():
+            querysets = [model.objects.all() for model in tables]
+        elif is_delivery_crew(request):
             # For a delivery crew, display orders assigned to them
-            orders = Order.objects.filter(delivery_crew=request.user)
+            querysets = [model.objects.filter(delivery_crew=request.user) for model in tables]
         else:
             # For a normal user, display items in their orders
-            orders = Order.objects.filter(user=request.user)
+            querysets = [model.objects.filter(user=request.user) for model in tables]
 
-        # Serialize order details for manager and Delivery crew
-        serialized_orders = []
-        for order in orders:
-            user_order_items = OrderItem.objects.filter(order=order)
-            serialized_order_items = OrderItemSerializer(user_order_items, many=True)
-            serialized_orders.append({'order_id': order.id, 'order_items': serialized_order_items.data})
+        # Serialize order details for manager and Delivery crew.
+        # Items are prefetched for the whole page and pages are seeked on (date, id), newest first.
+        # Archived orders keep their id so both tables page together.
+        paginator = KeysetPaginator(ordering=('-date', '-id'))
+        page = paginator.paginate_many([orders.with_items() for orders in querysets], request)
+        serialized_orders = OrderDetailSerializer(page, many=True)
 
-        return Response(serialized_orders, status=status.HTTP_200_OK)
+        return Response(paginator.get_paginated_data(serialized_orders.data), status=status.HTTP_200_OK)
 
     if request.method == 'POST':  # order creation
         # Carts only belongs to Customers.
         # Enforce in cart creation endpoint i.e. /api/cart/menu-items
-        user_cart_items = Cart.objects.filter(user=request.user)
-        if user_cart_items.exists():
-            # Create a new order
-            new_order = Order.objects.create(user=request.user, status=False, total=0, date=timezone.now())
-            total_price = 0
-
-            # Create OrderItems and associate them with the new order
-            for cart_item in user_cart_items:
-                # Populate order items with all items from the cart
-                order_item = OrderItem.objects.create(
-                    order=new_order,
-                    menuitem=cart_item.menuitem,
-                    quantity=cart_item.quantity,
-                    unit_price=cart_item.unit_price,
-                    price=cart_item.price
-                )
-                total_price += cart_item.price
-
-            # Update the total price for the new order
-            new_order.total = total_price
-            new_order.save()
-
-            # Delete Cart items after adding to the order
-            user_cart_items.delete()
-
+        # The whole cart -> order move runs in one transaction with a fixed number of queries. See checkout.py
+        new_order = checkout(request.user)
+        if new_order is not None:
             return Response({"Message": "Order created"}, status=status.HTTP_201_CREATED)
         else:
             return Response({"Message": "Your cart is empty. Add items to Cart to proceed."},
                             status=status.HTTP_400_BAD_REQUEST)
 
 
+def parse_date_param(value, end=False):
+    """
+    Parses a date (2024-01-31) or datetime (2024-01-31T18:00:00Z) query param into an aware datetime.
+    A plain date used as the end of a range includes that whole day.
+    :raises ValueError: the value is not a date or datetime
+    """
+    try:
+        day = parse_date(value)
+        moment = parse_datetime(value) if day is None else None
+    except ValueError:  # well formatted but invalid e.g. 2024-02-30
+        raise ValueError(value)
+    if day is not None:
+        moment = datetime.combine(day + timedelta(days=1) if end else day, datetime.min.time())
+    elif moment is None:
+        raise ValueError(value)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+@read_from_replica
+@api_view(['GET'])
+@permission_classes([IsManager])
+def orders_export(request):
+    """
+    Streams orders and their items for reporting. Managers only.
+    Endpoint: /api/orders/export
+
+    GET query params:
+    - output: csv (default, one line per order item) or ndjson (one order per line with its items nested)
+    - start: orders placed on/after this date or datetime e.g. 2024-01-01
+    - end: orders placed up to this date (inclusive) or before this datetime e.g. 2024-01-31
+
+    Rows are read from the db in chunks and written out as they come, so memory use doesn't depend on
+    the size of the range.
+    """
+    output = request.query_params.get('output', 'csv')
+    if output not in EXPORT_FORMATS:
+        return Response({'error': f"output must be one of {', '.join(EXPORT_FORMATS)}."},
+                        status.HTTP_400_BAD_REQUEST)
+    try:
+        start = request.query_params.get('start')
+        start = parse_date_param(start) if start else None
+        end = request.query_params.get('end')
+        end = parse_date_param(end, end=True) if end else None
+    except ValueError as error:
+        return Response({'error': f"Invalid date '{error}'. Use YYYY-MM-DD or an ISO 8601 datetime."},
+                        status.HTTP_400_BAD_REQUEST)
+
+    response = StreamingHttpResponse(export_orders(output, start, end), content_type=EXPORT_FORMATS[output])
+    extension = 'csv' if output == 'csv' else 'jsonl'
+    response['Content-Disposition'] = f'attachment; filename="orders.{extension}"'
+    return response
+
+
+@api_view(['PATCH'])
+@permission_classes([IsAuthenticated])
+def orders_bulk_update(request):
+    """
+    Endpoint: /api/orders/bulk
+    PATCH: Same update as /api/orders/{orderId} applied to many orders at once, with the same rules:
+        1. Manager: sets status and/or delivery_crew (null to unassign) on any order
+        2. Delivery crew: sets status on the orders assigned to them
+        Example PATCH LOAD:
+            {
+                "orders": [12, 13, 14],
+                "status": 1
+            }
+        Replies with the result of every id, in the order sent:
+            {"updated": 2, "results": [{"order_id": 12, "result": "updated"}, {"order_id": 13, "result": "updated"},
+                                       {"order_id": 14, "result": "not_assigned"}]}
+        result is updated, not_found or not_assigned (delivery crew only). At most 1000 orders per request.
+        The roles are resolved once and the orders are updated with a single UPDATE, see order_updates.py
+    :param request:
+    :return: JSON and Status Code
+    """
+    groups = request_roles(request)
+    if not {MANAGER, DELIVERY_CREW}.intersection(groups):
+        return Response(
+            {"message": "Access Forbidden. Manager or Delivery crew privileges required to access."},
+            status=status.HTTP_403_FORBIDDEN)
+
+    serialized_input = OrderBulkUpdateSerializer(data=request.data, context={'request': request})
+    serialized_input.is_valid(raise_exception=True)
+    changes = {field: value for field, value in serialized_input.validated_data.items() if field != 'orders'}
+    results = bulk_update_orders(
+        serialized_input.validated_data['orders'],
+        changes,
+        # delivery crew members only update their own deliveries
+        crew=None if MANAGER in groups else request.user,
+    )
+    return Response({
+        'updated': sum(result == UPDATED for _, result in results),
+        'results': [{'order_id': order_id, 'result': result} for order_id, result in results],
+    }, status=status.HTTP_200_OK)
+
+
 @api_view(['GET', 'PATCH', 'DELETE'])
 @permission_classes([IsAuthenticated])
 def single_order_manager(request, pk):
@@ -489,13 +698,17 @@ def single_order_manager(request, pk):
     :param request:
     :return: JSON and Status Code
     """
-    order = get_object_or_404(Order, pk=pk)  # get order by id
     if request.method == 'GET':
-        if not request.user.groups.exists():
+        # delivered orders are moved to the archive after a while (see archive.py) and can still be read
+        order = Order.objects.filter(pk=pk).first() or get_object_or_404(ArchivedOrder, pk=pk)
+    else:
+        order = get_object_or_404(Order, pk=pk)  # get order by id. Archived orders are read only
+    if request.method == 'GET':
+        if is_customer(request):
             # Only own orders and can list items in their orders
             # check if the orders belongs to the request user
             if order.user == request.user:
-                order_items = OrderItem.objects.filter(order=order)
+                order_items = order.orderitem_set.all()
                 serialized_order_items = OrderItemSerializer(order_items, many=True)
                 serialized_orders = [{'order_id': order.id, 'order_items': serialized_order_items.data}]
                 return Response(serialized_orders, status.HTTP_200_OK)
@@ -505,9 +718,8 @@ def single_order_manager(request, pk):
             return Response({"message": "Only Customer users can have orders."}, status=status.HTTP_403_FORBIDDEN)
 
     if request.method == 'PATCH':
-        user = request.user  # Fetch user
-        groups = user.groups.values_list('name', flat=True)  # Fetch group fo the user
-        allowed_groups = {'Manager', 'Delivery crew'}
+        groups = request_roles(request)  # Fetch group fo the user
+        allowed_groups = {MANAGER, DELIVERY_CREW}
 
         # True if no intersection(no group).
         # False if there is an intersection(group either manager or Delivery crew)
@@ -528,6 +740,58 @@ def single_order_manager(request, pk):
         return Response(serialized_input.data, status=status.HTTP_200_OK)
 
     if request.method == 'DELETE':
-        if request.user.groups.filter(name='Manager').exists():
-            order.delete()
+        if is_manager(request):
+            delete_order(order)  # also takes the order out of the sales rollups
             return Response({"message": f"Order {pk} deleted."}, status=status.HTTP_204_NO_CONTENT)
+
+
+@read_from_replica
+@api_view(['GET'])
+@permission_classes([IsManager])
+def sales_report(request):
+    """
+    Sales figures read from the rollup tables. Managers only.
+    Endpoint: /api/reports/sales
+
+    GET query params:
+    - group: day (default) or menuitem
+    - start, end: first and last day to include e.g. 2024-01-01
+
+    group=day returns one row per day with orders:
+        [{"date": "2024-01-01", "order_count": 12, "items_sold": 30, "revenue": "240.00"}]
+    group=menuitem returns one row per menu item sold in the range, best selling first:
+        [{"menuitem": 3, "title": "Greek Salad", "quantity": 14, "revenue": "112.00"}]
+    """
+    group = request.query_params.get('group', 'day')
+    if group not in ('day', 'menuitem'):
+        return Response({'error': 'group must be day or menuitem.'}, status.HTTP_400_BAD_REQUEST)
+
+    dates = {}
+    for param in ('start', 'end'):
+        value = request.query_params.get(param)
+        if value:
+            try:
+                dates[param] = parse_date(value)
+            except ValueError:
+                dates[param] = None
+            if dates[param] is None:
+                return Response({'error': f"Invalid {param} date '{value}'. Use YYYY-MM-DD."},
+                                status.HTTP_400_BAD_REQUEST)
+
+    rollups = DailySales.objects.all() if group == 'day' else DailyMenuItemSales.objects.all()
+    if 'start' in dates:
+        rollups = rollups.filter(date__gte=dates['start'])
+    if 'end' in dates:
+        rollups = rollups.filter(date__lte=dates['end'])
+
+    if group == 'day':
+        serialized_rollups = DailySalesSerializer(rollups.order_by('date'), many=True)
+    else:
+        rollups = (
+            rollups.values('menuitem_id', 'menuitem__title')
+            .annotate(quantity=Sum('quantity'), revenue=Sum('revenue'))
+            .filter(quantity__gt=0)  # items of deleted orders only
+            .order_by('-revenue', 'menuitem_id')
+        )
+        serialized_rollups = MenuItemSalesSerializer(rollups, many=True)
+    return Response(serialized_rollups.data, status.HTTP_200_OK)
@@ -45,15 +45,27 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'LittleLemonAPI.instrumentation.ServerTimingMiddleware',  # first so it times everything. See SERVER_TIMING
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'LittleLemonAPI.routers.ReplicaRoutingMiddleware',  # primary/replica routing per request
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per request SQL/view/serializer/permission timings sent as Server-Timing headers and logged as JSON lines.
+# Off by default, the middleware removes itself when False
+SERVER_TIMING = False
+
+# cProfile the DRF views of LittleLemonAPI: a fraction of the requests and/or the ones sent with X-Profile: 1.
+# Profiles are written to PROFILE_DIR, see `manage.py profile_report`
+PROFILE_SAMPLE_RATE = 0
+PROFILE_HEADER_TRIGGER = False
+PROFILE_DIR = BASE_DIR / 'profiles'
+
 ROOT_URLCONF = 'LittleLemonAPI_Final_Project.urls'
 
 TEMPLATES = [
@@ -82,9 +94,26 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # Read replica stand-in: a copy of the primary refreshed with `manage.py sync_replica`.
+    # Only used once listed in DATABASE_REPLICAS
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'replica.sqlite3',
+    },
 }
 
+# Menu listing, order listing and reports read from these aliases, see LittleLemonAPI/routers.py
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['LittleLemonAPI.routers.ReplicaRouter']
+# After a write, the client reads from the primary for this long so replica lag never hides its own writes
+REPLICA_STICKY_SECONDS = 5
+
+# Delivered orders older than this are moved to the archive tables by `manage.py archive_orders`,
+# ARCHIVE_BATCH_SIZE orders per transaction. See LittleLemonAPI/archive.py
+ARCHIVE_AFTER_DAYS = 90
+ARCHIVE_BATCH_SIZE = 500
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -126,14 +155,48 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',  # Token authentication in DRF
+        # Token authentication in DRF, with the token -> user lookup cached. See LittleLemonAPI/authentication.py
+        'LittleLemonAPI.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',  # Works with browsable API. Deactivate when done
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        # application/json rendered with orjson when installed, same output as DRF's. See LittleLemonAPI/renderers.py
+        'LittleLemonAPI.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_THROTTLE_RATES': {
-                'user': '10/minute'
+                'user': '10/minute',
+                # per endpoint budgets, shared by all worker processes. See LittleLemonAPI/throttling.py
+                'menu': '10/minute',
+                'orders': '10/minute',
+                'checkout': '10/minute',
                 }
 }
 
+# SQLite file holding the rate limit token buckets of every worker process on this host
+THROTTLE_DB = BASE_DIR / 'throttle.sqlite3'
+
+# SQLite file holding the version counters shared by every worker process on this host, e.g. the menu catalog
+# version. See LittleLemonAPI/shared_state.py
+SHARED_STATE_DB = BASE_DIR / 'shared_state.sqlite3'
+
+# Responses kept for the POST requests sent with an Idempotency-Key header, see LittleLemonAPI/idempotency.py
+IDEMPOTENCY_DB = BASE_DIR / 'idempotency.sqlite3'
+IDEMPOTENCY_TTL = 24 * 60 * 60  # seconds a key is remembered
+IDEMPOTENCY_LOCK_TIMEOUT = 60  # seconds after which a key held by a request that never finished can be reused
+IDEMPOTENCY_MAX_KEYS = 100000
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'LittleLemonAPI.timing': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 # DJOSER = {
 #     "USER_ID_FIELD": "username",  # sets username as pk. This is the default
 #     "LOGIN_FIELD": "email"  # sets email as PK